@@ -0,0 +1,36 @@
+"""Long-soak memory check for the processors' dedup set.
+
+Simulates a judge pod seeing an endless stream of new test IDs, each
+acknowledged shortly after it is queued, and prints traced memory as the
+stream goes on. Memory should level off once entries start expiring.
+
+Usage: python benchmarks/dedup_soak.py [total_ids]
+"""
+import sys
+import time
+import tracemalloc
+
+from guardrails_simlab_client.dedup import ExpiringDedupSet
+
+
+def main(total: int = 1_000_000, report_every: int = 200_000):
+    # Short TTLs so the soak covers many expiry cycles in a few seconds
+    dedup = ExpiringDedupSet(ttl=0.5, ack_ttl=0.05, max_size=50_000)
+    tracemalloc.start()
+    start = time.monotonic()
+    for i in range(1, total + 1):
+        test_id = f"test-{i}"
+        dedup.add(test_id)
+        if i % 10 != 0:
+            dedup.acknowledge(test_id)
+        # Every tenth test fails and is never acknowledged; TTL reclaims it
+        if i % report_every == 0:
+            current, peak = tracemalloc.get_traced_memory()
+            print(
+                f"{i:>10} ids  entries={len(dedup):>6}  traced={current / 1e6:6.2f} MB"
+                f"  peak={peak / 1e6:6.2f} MB  elapsed={time.monotonic() - start:5.1f}s"
+            )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,161 @@
+"""End-to-end throughput of simlab_connect and custom_judge against a local fake control plane.
+
+Each scenario runs in a fresh process. It starts a FakeControlPlane,
+runs the decorator with a synthetic function that sleeps for
+``--fn-latency`` seconds, and waits for every test to be answered or
+evaluated. It then reports:
+
+- tests/s
+- p50 and p99 end-to-end latency, from a test becoming available to its
+  result reaching the server
+- CPU used while idle for ``--idle`` seconds after the work is done
+- peak RSS
+
+Compare the output between releases to catch regressions.
+
+Run it from a checkout after ``pip install -e .``.
+
+Usage: python benchmarks/end_to_end.py [--scenario NAME] [--experiments N] [--tests N] [--turns N]
+       [--fn-latency S] [--server-latency S] [--error-rate P] [--workers N] [--idle S] [--json]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+SCENARIOS = ("simlab_connect", "custom_judge", "simlab_connect_batched", "custom_judge_batched")
+
+
+def percentile(values: list, fraction: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def run_scenario(args: argparse.Namespace) -> dict:
+    os.environ.setdefault("GUARDRAILS_TOKEN", "benchmark")
+    os.environ.setdefault("GUARDRAILS_APP_ID", "benchmark")
+    from guardrails_simlab_client import JudgeResult, custom_judge, simlab_connect
+    from guardrails_simlab_client.testing.fake_control_plane import FakeControlPlane
+
+    judging = args.scenario.startswith("custom_judge")
+    batch_size = 16 if args.scenario.endswith("_batched") else None
+    control_plane = FakeControlPlane(
+        experiments=args.experiments,
+        tests_per_experiment=args.tests,
+        turns=1 if judging else args.turns,
+        risks=["benchmark"],
+        answered=judging,
+        latency=args.server_latency,
+        error_rate=args.error_rate,
+        seed=0,
+    ).start()
+    options = dict(
+        control_plane_host=control_plane.url,
+        max_workers=args.workers,
+        min_poll_interval=0.1,
+        max_poll_interval=1.0,
+        max_failure_duration=None,
+        batch_size=batch_size,
+    )
+
+    if judging:
+        if batch_size:
+            @custom_judge(risk_name="benchmark", **options)
+            def judge(user_messages, bot_responses, messages):
+                time.sleep(args.fn_latency)
+                return [JudgeResult(triggered=False, justification="ok") for _ in user_messages]
+        else:
+            @custom_judge(risk_name="benchmark", **options)
+            def judge(user_message, bot_response, messages):
+                time.sleep(args.fn_latency)
+                return JudgeResult(triggered=False, justification="ok")
+        wrapped = judge
+        expected = {"evaluated": len(control_plane.tests)}
+    else:
+        if batch_size:
+            @simlab_connect(**options)
+            def application(histories):
+                time.sleep(args.fn_latency)
+                return ["ok" for _ in histories]
+        else:
+            @simlab_connect(**options)
+            def application(messages):
+                time.sleep(args.fn_latency)
+                return "ok"
+        wrapped = application
+        expected = {"answered": len(control_plane.tests)}
+
+    start = time.monotonic()
+    threading.Thread(target=wrapped, daemon=True).start()
+    finished = control_plane.wait_for(timeout=args.timeout, **expected)
+    elapsed = time.monotonic() - start
+    done = control_plane.evaluated if judging else control_plane.answered
+    latencies = control_plane.evaluation_latencies() if judging else control_plane.response_latencies()
+
+    cpu_start = time.process_time()
+    time.sleep(args.idle)
+    idle_cpu = (time.process_time() - cpu_start) / args.idle
+
+    return {
+        "scenario": args.scenario,
+        "tests": done,
+        "finished": finished,
+        "seconds": elapsed,
+        "tests_per_second": done / elapsed,
+        "p50_latency": percentile(latencies, 0.5),
+        "p99_latency": percentile(latencies, 0.99),
+        "idle_cpu_percent": 100 * idle_cpu,
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "requests": sum(control_plane.requests.values()),
+        "errors_injected": control_plane.errors_injected,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", choices=SCENARIOS, help="run one scenario in this process")
+    parser.add_argument("--experiments", type=int, default=4)
+    parser.add_argument("--tests", type=int, default=250, help="conversations per experiment")
+    parser.add_argument("--turns", type=int, default=1, help="turns per conversation")
+    parser.add_argument("--fn-latency", type=float, default=0.01, help="seconds per call of the synthetic function")
+    parser.add_argument("--server-latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail with a 503")
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--idle", type=float, default=5.0, help="seconds to measure idle CPU for")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--json", action="store_true", help="print one JSON object per scenario")
+    args = parser.parse_args()
+
+    if args.scenario:
+        print(json.dumps(run_scenario(args)))
+        return
+
+    forwarded = [arg for arg in sys.argv[1:] if arg != "--json"]
+    for scenario in SCENARIOS:
+        output = subprocess.run(
+            [sys.executable, __file__, "--scenario", scenario, *forwarded],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        if args.json:
+            print(json.dumps(result))
+            continue
+        print(
+            f"{scenario:24} {result['tests']:6d} tests {result['tests_per_second']:9.1f}/s  "
+            f"p50 {1000 * result['p50_latency']:8.1f}ms  p99 {1000 * result['p99_latency']:8.1f}ms  "
+            f"idle {result['idle_cpu_percent']:5.2f}% CPU  rss {result['peak_rss_mb']:6.1f}MB"
+            + ("" if result["finished"] else "  (timed out)")
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+"""Measure CPU burned by an idle processor dispatcher.
+
+Usage: GUARDRAILS_TOKEN=x python benchmarks/idle_cpu.py [seconds]
+"""
+import sys
+import time
+
+from guardrails_simlab_client.processors.test_processor import TestProcessor
+
+
+def main(duration: float = 10.0):
+    processor = TestProcessor("http://127.0.0.1:9", max_workers=32)
+    processor.start_processing(lambda messages: "")
+    cpu_start = time.process_time()
+    wall_start = time.monotonic()
+    time.sleep(duration)
+    cpu = time.process_time() - cpu_start
+    wall = time.monotonic() - wall_start
+    processor.stop_processing()
+    print(f"idle dispatcher: {cpu:.4f}s CPU over {wall:.1f}s wall ({100 * cpu / wall:.2f}% of a core)")
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 10.0)
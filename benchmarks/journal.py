@@ -0,0 +1,37 @@
+"""Measure what the journal adds to each test.
+
+Every test the processors work on is looked up once and journaled three
+times: claimed, completed with its result, and submitted. This times
+that sequence against a temporary file, with a result about the size of
+a typical LLM response. The per-item cost should stay well under a millisecond.
+
+Usage: python benchmarks/journal.py [items]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from guardrails_simlab_client.journal import Journal
+
+
+def main(items: int = 10_000):
+    with tempfile.TemporaryDirectory() as directory:
+        journal = Journal(os.path.join(directory, "journal.db"))
+        item = {"id": "", "prompt": "x" * 200, "persona": "default", "experiment_id": "experiment"}
+        response = "y" * 2000
+        start = time.perf_counter()
+        for index in range(items):
+            test_id = f"test-{index}"
+            item["id"] = test_id
+            journal.get("response", test_id)
+            journal.claimed("experiment", test_id, "response")
+            journal.completed("experiment", test_id, "response", item, response)
+            journal.submitted("experiment", test_id, "response")
+        elapsed = time.perf_counter() - start
+        journal.close()
+    print(f"{items} items in {elapsed:.2f}s: {1e6 * elapsed / items:.0f}us per item")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
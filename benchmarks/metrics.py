@@ -0,0 +1,41 @@
+"""Measure what stage metrics add to each call of the wrapped function.
+
+Times a no-op function through BaseProcessor._call without metrics, with
+a Metrics instance, and with a Metrics instance plus a callback. The
+per-call overhead should stay in the low microseconds either way, which
+is negligible next to any real model or judge call.
+
+Usage: python benchmarks/metrics.py [calls]
+"""
+import sys
+import time
+
+from guardrails_simlab_client.metrics import Metrics
+from guardrails_simlab_client.processors.base_processor import BaseProcessor
+
+
+class Processor(BaseProcessor):
+    journal_scope = "response"
+
+
+def per_call(metrics, calls: int) -> float:
+    processor = Processor("http://localhost", max_workers=1, submit_workers=0, metrics=metrics)
+    fn = lambda messages: messages
+    start = time.perf_counter()
+    for _ in range(calls):
+        processor._call(fn, [])
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main(calls: int = 200_000):
+    baseline = per_call(None, calls)
+    enabled = per_call(Metrics(), calls)
+    with_callback = per_call(Metrics(callback=lambda *observation: None), calls)
+    print(f"{calls} calls")
+    print(f"disabled:      {baseline:6.2f} us/call")
+    print(f"enabled:       {enabled:6.2f} us/call (+{enabled - baseline:.2f})")
+    print(f"with callback: {with_callback:6.2f} us/call (+{with_callback - baseline:.2f})")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
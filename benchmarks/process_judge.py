@@ -0,0 +1,58 @@
+"""Compare thread and process execution of a CPU-bound judge.
+
+A pure-Python scoring loop stands in for regex and small-model judges.
+The same number of worker threads call it either directly, as
+executor="thread" does, or through a ProcessJudge, as executor="process"
+does. With the GIL the thread variant stays near single-core throughput,
+while the process variant should scale with the number of cores.
+
+Usage: python benchmarks/process_judge.py [evaluations] [workers]
+"""
+from concurrent.futures import ThreadPoolExecutor
+import os
+import sys
+import time
+
+from guardrails_simlab_client.processors.process_judge import ProcessJudge, register_judge
+from guardrails_simlab_client.protocols import JudgeResult
+
+
+def cpu_judge(user_message: str, bot_response: str, messages: list) -> JudgeResult:
+    score = 0
+    for i in range(200_000):
+        score = (score * 31 + i + len(bot_response)) % 1_000_003
+    return JudgeResult(triggered=score % 2 == 0, justification=f"score={score}")
+
+
+# custom_judge does this when it decorates a judge
+register_judge(cpu_judge)
+
+
+def run(judge, evaluations: int, workers: int) -> float:
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Warm up, so process start-up isn't counted
+        list(executor.map(lambda _: judge("hi", "hello", []), range(workers)))
+        start = time.monotonic()
+        results = list(executor.map(lambda i: judge("hi", f"response {i}", []), range(evaluations)))
+        elapsed = time.monotonic() - start
+    assert all(isinstance(result, JudgeResult) for result in results)
+    return evaluations / elapsed
+
+
+def main(evaluations: int = 200, workers: int = 32):
+    threaded = run(cpu_judge, evaluations, workers)
+    process_judge = ProcessJudge(cpu_judge)
+    try:
+        pooled = run(process_judge, evaluations, workers)
+    finally:
+        process_judge.close()
+    print(f"{os.cpu_count()} cores, {workers} worker threads, {evaluations} evaluations")
+    print(f"thread:  {threaded:8.1f} evaluations/s")
+    print(f"process: {pooled:8.1f} evaluations/s ({pooled / threaded:.1f}x)")
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 200,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 32,
+    )
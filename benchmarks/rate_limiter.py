@@ -0,0 +1,54 @@
+"""Check that a shared RateLimiter holds the configured rate under contention.
+
+Several threads, standing in for the workers of two processors, call a
+no-op function through one limiter. Observed throughput should match the
+configured rate to within a few percent, after the initial burst.
+
+Usage: python benchmarks/rate_limiter.py [requests_per_second] [seconds]
+"""
+import sys
+import threading
+import time
+
+from guardrails_simlab_client.rate_limiter import RateLimiter
+
+
+def main(rate: float = 50.0, duration: float = 5.0, threads: int = 64):
+    burst = 10
+    limiter = RateLimiter(
+        requests_per_second=rate,
+        burst=burst,
+        cost_fn=lambda tokens: tokens,
+        cost_per_minute=rate * 60 * 100,
+    )
+    calls = 0
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker():
+        nonlocal calls
+        while time.monotonic() < deadline:
+            with limiter.limit(100):
+                with lock:
+                    calls += 1
+
+    start = time.monotonic()
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.monotonic() - start
+    # Discount the burst the bucket starts with
+    observed = (calls - burst) / elapsed
+    print(
+        f"configured {rate:.1f} req/s, observed {observed:.1f} req/s "
+        f"({100 * (observed - rate) / rate:+.1f}%) over {elapsed:.1f}s with {threads} threads"
+    )
+
+
+if __name__ == "__main__":
+    main(
+        float(sys.argv[1]) if len(sys.argv) > 1 else 50.0,
+        float(sys.argv[2]) if len(sys.argv) > 2 else 5.0,
+    )
@@ -1,11 +1,34 @@
 from guardrails_simlab_client.decorators.llm import tt_webhook_polling_sync
 from guardrails_simlab_client.decorators.llm import tt_webhook_polling_sync as simlab_connect
+from guardrails_simlab_client.decorators.llm_async import simlab_connect_async
 from guardrails_simlab_client.decorators.custom_judge import custom_judge
+from guardrails_simlab_client.decorators.custom_judge_async import custom_judge_async
+from guardrails_simlab_client.caching import JudgeResultCache, ResponseCache
+from guardrails_simlab_client.journal import Journal
+from guardrails_simlab_client.judge_runner import JudgeRunner
+from guardrails_simlab_client.leases import (
+    ConsistentHashSharding,
+    ServerLeaseBackend,
+    SQLiteLeaseBackend,
+)
+from guardrails_simlab_client.metrics import Metrics
 from guardrails_simlab_client.protocols import JudgeResult
+from guardrails_simlab_client.rate_limiter import RateLimiter
 
 __all__ = [
     "custom_judge",
+    "custom_judge_async",
     "tt_webhook_polling_sync",
+    "ConsistentHashSharding",
+    "Journal",
+    "JudgeResultCache",
     "JudgeResult",
-    "simlab_connect"
+    "JudgeRunner",
+    "Metrics",
+    "RateLimiter",
+    "ResponseCache",
+    "ServerLeaseBackend",
+    "SQLiteLeaseBackend",
+    "simlab_connect",
+    "simlab_connect_async",
 ]
\ No newline at end of file
@@ -0,0 +1,237 @@
+from collections import OrderedDict
+from concurrent.futures import Future
+import hashlib
+import json
+from logging import getLogger
+import sqlite3
+import threading
+import time
+from types import CodeType
+from typing import Any, Callable, Dict, Optional, Tuple
+
+LOGGER = getLogger(__name__)
+
+DEFAULT_CACHE_MAX_ENTRIES = 10_000
+DEFAULT_CACHE_TTL = 24 * 3600.0
+
+_MISSING = object()
+
+
+class ResponseCache:
+    """Memoizes the wrapped function's output per conversation.
+
+    Entries live in an in-memory LRU of ``max_entries`` and expire after
+    ``ttl`` seconds. With ``path`` set they are also written to a SQLite
+    file, which is consulted on a memory miss and survives restarts.
+    Concurrent misses for the same key share one call (single-flight).
+    Values must be JSON-serializable to use the disk tier.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_CACHE_MAX_ENTRIES,
+        ttl: Optional[float] = DEFAULT_CACHE_TTL,
+        path: Optional[str] = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        # key -> (monotonic expiry or None, value)
+        self._entries: "OrderedDict[str, Tuple[Optional[float], Any]]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # Misses answered by a call already in flight for the same key
+        self.coalesced = 0
+        self._disk: Optional[sqlite3.Connection] = None
+        self._disk_lock = threading.Lock()
+        if path is not None:
+            self._disk = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._disk.execute("PRAGMA journal_mode=WAL")
+            self._disk.execute("PRAGMA synchronous=NORMAL")
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+            )
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """Stable hash of JSON-serializable parts"""
+        encoded = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.coalesced + self.misses
+        return (self.hits + self.coalesced) / lookups if lookups else 0.0
+
+    def _get_memory(self, key: str) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._entries[key]
+            return _MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def _put_memory(self, key: str, value: Any):
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _get_disk(self, key: str) -> Any:
+        if self._disk is None:
+            return _MISSING
+        with self._disk_lock:
+            row = self._disk.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return _MISSING
+        value, expires_at = row
+        if expires_at is not None and expires_at <= time.time():
+            return _MISSING
+        return json.loads(value)
+
+    def _put_disk(self, key: str, value: Any):
+        if self._disk is None:
+            return
+        try:
+            encoded = json.dumps(value)
+        except (TypeError, ValueError) as e:
+            LOGGER.debug(f"Not caching unserializable value on disk: {e}")
+            return
+        expires_at = time.time() + self.ttl if self.ttl is not None else None
+        with self._disk_lock:
+            self._disk.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, encoded, expires_at),
+            )
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Look up ``key`` without computing it"""
+        with self._lock:
+            value = self._get_memory(key)
+        if value is _MISSING:
+            value = self._get_disk(key)
+            if value is not _MISSING:
+                with self._lock:
+                    self._put_memory(key, value)
+        with self._lock:
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: Any):
+        with self._lock:
+            self._put_memory(key, value)
+        self._put_disk(key, value)
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        """Return the cached value for ``key``, calling ``compute`` once across concurrent misses"""
+        with self._lock:
+            value = self._get_memory(key)
+            if value is not _MISSING:
+                self.hits += 1
+                return value
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not owner:
+            return future.result()
+
+        try:
+            value = self._get_disk(key)
+            if value is not _MISSING:
+                with self._lock:
+                    self.hits += 1
+                    self._put_memory(key, value)
+            else:
+                with self._lock:
+                    self.misses += 1
+                value = compute()
+                self.put(key, value)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+def _encode_const(const: Any) -> bytes:
+    """Encoding of a code constant that is the same in every process"""
+    # Nested functions and lambdas are code objects whose repr has an address
+    if isinstance(const, CodeType):
+        digest = hashlib.sha256()
+        _hash_code(const, digest)
+        return b"code:" + digest.digest()
+    if isinstance(const, tuple):
+        return b"(" + b",".join(_encode_const(member) for member in const) + b")"
+    # `x in {"a", "b"}` compiles to a frozenset, whose order depends on PYTHONHASHSEED
+    if isinstance(const, (set, frozenset)):
+        return b"{" + b",".join(sorted(_encode_const(member) for member in const)) + b"}"
+    return repr(const).encode("utf-8")
+
+
+def _hash_code(code: CodeType, digest: "hashlib._Hash"):
+    digest.update(code.co_code)
+    for const in code.co_consts:
+        digest.update(_encode_const(const))
+    digest.update(repr(code.co_names).encode("utf-8"))
+
+
+def judge_version(fn: Callable) -> str:
+    """Fingerprint of a judge's code, so editing the judge invalidates its cached results"""
+    digest = hashlib.sha256(f"{fn.__module__}.{fn.__qualname__}".encode("utf-8"))
+    code = getattr(fn, "__code__", None)
+    if code is not None:
+        _hash_code(code, digest)
+    return digest.hexdigest()[:16]
+
+
+class JudgeResultCache(ResponseCache):
+    """Caches JudgeResults per (risk, conversation, response, judge version).
+
+    The judge version is a hash of the judge function's code unless
+    ``version`` is given, e.g. to also invalidate results when a model
+    file the judge loads changes.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_CACHE_MAX_ENTRIES,
+        ttl: Optional[float] = DEFAULT_CACHE_TTL,
+        path: Optional[str] = None,
+        version: Optional[str] = None,
+    ):
+        super().__init__(max_entries=max_entries, ttl=ttl, path=path)
+        self.version = version
+
+    def version_for(self, fn: Callable) -> str:
+        return self.version or judge_version(fn)
+
+    def judge_key(
+        self,
+        version: str,
+        risk_name: str,
+        user_message: str,
+        bot_response: str,
+        messages: Any,
+    ) -> str:
+        return self.make_key(risk_name, version, user_message, bot_response, messages)
@@ -0,0 +1,94 @@
+from logging import getLogger
+import threading
+import time
+from typing import Optional
+
+LOGGER = getLogger(__name__)
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """Best-effort check for a 429 raised by a model client"""
+    for candidate in (error, getattr(error, "response", None)):
+        if candidate is None:
+            continue
+        if getattr(candidate, "status_code", None) == 429 or getattr(candidate, "status", None) == 429:
+            return True
+    return "RateLimit" in type(error).__name__ or "429" in str(error)
+
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD limit on how many calls to the wrapped function run at once.
+
+    Every healthy call raises the limit by ``1 / limit``, so it grows by
+    about one per round of calls. A rate-limit error or a latency spike
+    (``latency_tolerance`` times the smoothed healthy latency) multiplies
+    it by ``backoff_ratio``, at most once per smoothed latency so a burst
+    of concurrent 429s counts as a single signal. The limit always stays
+    within ``[min_limit, max_limit]``.
+    """
+
+    def __init__(
+        self,
+        min_limit: int = 1,
+        max_limit: int = 32,
+        initial_limit: Optional[int] = None,
+        latency_tolerance: float = 2.0,
+        backoff_ratio: float = 0.5,
+        smoothing: float = 0.1,
+    ):
+        if not 1 <= min_limit <= max_limit:
+            raise ValueError("Expected 1 <= min_limit <= max_limit")
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_tolerance = latency_tolerance
+        self.backoff_ratio = backoff_ratio
+        self.smoothing = smoothing
+        self._limit = float(initial_limit if initial_limit is not None else max_limit // 2)
+        self._limit = min(max(self._limit, min_limit), max_limit)
+        self.in_flight = 0
+        self.baseline_latency: Optional[float] = None
+        self._last_backoff = 0.0
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        """Current concurrency limit"""
+        return int(self._limit)
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        with self._condition:
+            if not self._condition.wait_for(lambda: self.in_flight < int(self._limit), timeout):
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+    def record(self, latency: float, error: Optional[BaseException] = None):
+        """Feed back the outcome of one call"""
+        with self._condition:
+            spike = (
+                self.baseline_latency is not None
+                and latency > self.baseline_latency * self.latency_tolerance
+            )
+            if (error is not None and is_rate_limit_error(error)) or (error is None and spike):
+                now = time.monotonic()
+                if now - self._last_backoff >= (self.baseline_latency or 0.0):
+                    self._last_backoff = now
+                    self._limit = max(self.min_limit, self._limit * self.backoff_ratio)
+                    LOGGER.info(f"Reducing concurrency limit to {self.limit}")
+                return
+            if error is not None:
+                # Other failures say nothing about capacity
+                return
+            if self.baseline_latency is None:
+                self.baseline_latency = latency
+            else:
+                self.baseline_latency += self.smoothing * (latency - self.baseline_latency)
+            previous = int(self._limit)
+            self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+            if int(self._limit) > previous:
+                self._condition.notify()
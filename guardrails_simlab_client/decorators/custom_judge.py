@@ -1,12 +1,29 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from logging import getLogger
-import time
 from typing import Callable, Optional
+import time
 from urllib.parse import quote_plus
 
-import requests
-from guardrails_simlab_client.env import CONTROL_PLANE_URL, _get_api_key, _get_app_id
+from guardrails_simlab_client.caching import JudgeResultCache
+from guardrails_simlab_client.env import CONTROL_PLANE_URL, _get_app_id
+from guardrails_simlab_client.http_client import DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT, error_message
+from guardrails_simlab_client.polling import (
+    DEFAULT_MAX_FAILURE_DURATION,
+    DEFAULT_MAX_POLL_INTERVAL,
+    DEFAULT_MIN_POLL_INTERVAL,
+    PollScheduler,
+)
 from guardrails_simlab_client.protocols import HttpError, JudgeResult
+from guardrails_simlab_client.journal import Journal
+from guardrails_simlab_client.leases import LeaseBackend
+from guardrails_simlab_client.metrics import DISCOVER, FETCH_HISTORY, POLL, Metrics
+from guardrails_simlab_client.rate_limiter import RateLimiter
+from guardrails_simlab_client.snapshots import PollSnapshots
+from guardrails_simlab_client.shutdown import DEFAULT_DRAIN_TIMEOUT, install_sigterm_handler
+from guardrails_simlab_client.processors.base_processor import DEFAULT_BATCH_WAIT_MS
+from guardrails_simlab_client.processors.process_judge import register_judge
 from guardrails_simlab_client.processors.risk_evaluation_processor import RiskEvaluationProcessor
+from guardrails_simlab_client.submission import DEFAULT_SUBMIT_WORKERS
 
 LOGGER = getLogger(__name__)
 
@@ -19,7 +36,30 @@ def custom_judge(
     application_id: Optional[str] = None,
     throttle_time: Optional[
         float
-    ] = None,  # Time in seconds to pause between each request to the wrapped function
+    ] = None,  # Minimum seconds between calls to the wrapped function; ignored when rate_limiter is set
+    rate_limiter: Optional[RateLimiter] = None,  # Rate/cost/concurrency limits for the wrapped function, shareable across decorators
+    adaptive_concurrency: bool = False,  # Tune concurrency between min_workers and max_workers from fn latency and 429s
+    min_workers: int = 1,  # Lower bound for adaptive concurrency
+    lease_backend: Optional[LeaseBackend] = None,  # Claims tests so replicas sharing an app don't duplicate work
+    journal: Optional[Journal] = None,  # Local record of in-flight work, so results survive a restart
+    judge_cache: Optional[JudgeResultCache] = None,  # Reuse results for identical inputs until the judge's code changes
+    submit_workers: int = DEFAULT_SUBMIT_WORKERS,  # Threads submitting results with retries; 0 submits from the judge workers
+    spill_path: Optional[str] = None,  # File for results that can't be submitted yet, retried later and after a restart
+    metrics: Optional[Metrics] = None,  # Records counters and per-stage latencies, e.g. for Metrics.serve()
+    drain_timeout: float = DEFAULT_DRAIN_TIMEOUT,  # Seconds to finish running tests and submissions on Ctrl-C or SIGTERM
+    connect_timeout: Optional[float] = DEFAULT_CONNECT_TIMEOUT,  # Seconds to wait for a connection to the control plane
+    read_timeout: Optional[float] = DEFAULT_READ_TIMEOUT,  # Seconds to wait for a control plane response
+    gzip_requests: bool = False,  # Gzip large request bodies sent to the control plane
+    min_poll_interval: float = DEFAULT_MIN_POLL_INTERVAL,  # First backoff step in seconds once polls come back empty
+    max_poll_interval: float = DEFAULT_MAX_POLL_INTERVAL,  # Ceiling in seconds for the idle/failure backoff
+    max_failure_duration: Optional[float] = DEFAULT_MAX_FAILURE_DURATION,  # Give up after polls fail for this many seconds
+    discovery_concurrency: int = 8,  # Max concurrent test list and conversation fetches per poll
+    batch_size: Optional[int] = None,  # When set, fn receives lists of user_messages, bot_responses and messages and returns a list of JudgeResults
+    batch_wait_ms: float = DEFAULT_BATCH_WAIT_MS,  # Max time to wait for a batch to fill once it has one test
+    executor: str = "thread",  # "process" runs the judge in a process pool, for CPU-bound judges
+    processes: Optional[int] = None,  # Size of the process pool; defaults to the CPU count
+    initializer: Optional[Callable] = None,  # Called once in each judge process, e.g. to load a model
+    initargs: tuple = (),  # Arguments for initializer
 ) -> Callable:
     LOGGER.info(
         f"===> Initializing RiskEvaluationProcessor with application_id: {application_id}"
@@ -29,96 +69,153 @@ def custom_judge(
         max_workers,
         application_id=application_id,
         throttle_time=throttle_time,
+        connect_timeout=connect_timeout,
+        read_timeout=read_timeout,
+        gzip_requests=gzip_requests,
+        poller_connections=discovery_concurrency + 1,
+        batch_size=batch_size,
+        batch_wait_ms=batch_wait_ms,
+        rate_limiter=rate_limiter,
+        adaptive_concurrency=adaptive_concurrency,
+        min_workers=min_workers,
+        lease_backend=lease_backend,
+        journal=journal,
+        risk_name=risk_name,
+        judge_cache=judge_cache,
+        executor=executor,
+        processes=processes,
+        initializer=initializer,
+        initargs=initargs,
+        submit_workers=submit_workers,
+        spill_path=spill_path,
+        metrics=metrics,
+        drain_timeout=drain_timeout,
     )
+    http_client = processor.http_client
+    discovery_executor = ThreadPoolExecutor(max_workers=discovery_concurrency)
+    poll_scheduler = PollScheduler(min_poll_interval, max_poll_interval, max_failure_duration)
+    # Unchanged lists come back as 304s and are served from the last response
+    snapshots = PollSnapshots()
+    stage_metrics = processor.metrics
 
     def wrap(
         fn: Callable[[str, str], JudgeResult]
     ) -> Callable[[str, str], JudgeResult]:
         LOGGER.info(f"===> Wrapping function {fn.__name__}")
+        # Lets judge processes find fn by name even though the decorator replaces it
+        register_judge(fn)
         def wrapped(*args, **kwargs):
             LOGGER.info(f"===> Wrapped function called with args: {args}, kwargs: {kwargs}")
             if enable:
                 LOGGER.info("===> Starting processing")
+                install_sigterm_handler()
                 processor.start_processing(fn)
+                app_id = _get_app_id(application_id)
+
+                def enqueue_test(experiment_id: str, test: dict) -> bool:
+                    test_id = test["id"]
+                    try:
+                        with stage_metrics.time(FETCH_HISTORY, risk_name):
+                            conversations_response = http_client.get(
+                                f"/api/experiments/{experiment_id}/tests/{test_id}/conversations?include-adaptability-messages=false"
+                            )
+                            if not conversations_response.ok:
+                                message = error_message(conversations_response)
+                                raise HttpError(status_code=conversations_response.status_code, message=message)
+                            conversations = conversations_response.json()
+                        processor.processing_queue.put(
+                            {
+                                "experiment_id": experiment_id,
+                                "test_id": test_id,
+                                "user_message": test["prompt"],
+                                "bot_response": test["response"],
+                                "risk_name": risk_name,
+                                "messages": conversations[0]["messages"],
+                            }
+                        )
+                        return True
+                    except Exception:
+                        # Let the next poll pick the test up again
+                        processor.queued_tests.release(test_id)
+                        raise
+
+                def list_tests(experiment_id: str) -> list:
+                    LOGGER.info(
+                        f"=== checking for tests for experiment {experiment_id}"
+                    )
+                    with stage_metrics.time(DISCOVER, risk_name):
+                        tests, _ = snapshots.get_json(
+                            http_client,
+                            f"/api/experiments/{experiment_id}/tests?appId={app_id}&unevaluated-risk={quote_plus(risk_name)}&include-risk-evaluations=true",
+                        )
+                        return tests
+
                 try:
-                    experiment_retries = 0
-                    test_retries = 0
                     while True:
                         LOGGER.info("===> Starting...")
+                        poll_started = time.monotonic()
+                        snapshot_mark = snapshots.mark()
+                        poll_error = None
+                        new_tests = 0
                         try:
-                            experiments_response = requests.get(
-                                f"{control_plane_host}/api/experiments?appId={_get_app_id(application_id)}&validationStatus=in%20progress",
-                                headers={"x-api-key": _get_api_key()},
+                            experiments, _ = snapshots.get_json(
+                                http_client, f"/api/experiments?appId={app_id}&validationStatus=in%20progress"
                             )
-
-                            if not experiments_response.ok:
-                                message = experiments_response.json().get("message") or experiments_response.text
-                                raise HttpError(status_code=experiments_response.status_code, message=message)
-
-                            experiments = experiments_response.json()
                             LOGGER.info(f"=== Found {len(experiments)} experiments with validation in progress")
-                            # experiments = [{"id": "123"}]
+                            list_futures = {}
                             for experiment in experiments:
-                                try:
-                                    if not risk_name in experiment.get("source_data",{}).get("evaluation_configuration", {}).keys():
-                                        LOGGER.info(f"=== Skipping experiment {experiment['id']} as it does not have risk {risk_name}")
-                                        continue
-                                    LOGGER.info(
-                                        f"=== checking for tests for experiment {experiment['id']}"
-                                    )
-                                    tests_response = requests.get(
-                                        f"{control_plane_host}/api/experiments/{experiment['id']}/tests?appId={_get_app_id(application_id)}&unevaluated-risk={quote_plus(risk_name)}&include-risk-evaluations=true",
-                                        headers={"x-api-key": _get_api_key()},
-                                    )
-
-                                    if not tests_response.ok:
-                                        message = tests_response.json().get("message") or tests_response.text
-                                        raise HttpError(status_code=tests_response.status_code, message=message)
-                                    tests = tests_response.json()
+                                if not risk_name in experiment.get("source_data",{}).get("evaluation_configuration", {}).keys():
+                                    LOGGER.info(f"=== Skipping experiment {experiment['id']} as it does not have risk {risk_name}")
+                                    continue
+                                list_futures[discovery_executor.submit(list_tests, experiment["id"])] = experiment["id"]
 
-                                    for test in tests:
-                                        test_id = test["id"]
-                                        if (
-                                            test_id not in processor.queued_tests
-                                            and test.get("response") is not None
-                                        ):
-                                            processor.queued_tests[test_id] = True
-                                            conversations_response = requests.get(
-                                                f"{control_plane_host}/api/experiments/{experiment['id']}/tests/{test_id}/conversations?include-adaptability-messages=false",
-                                                headers={
-                                                    "x-api-key": _get_api_key(),
-                                                },
-                                            )
-                                            if not conversations_response.ok:
-                                                message = conversations_response.json().get("message") or conversations_response.text
-                                                raise HttpError(status_code=conversations_response.status_code, message=message)
-                                            conversations = conversations_response.json()
-                                            processor.processing_queue.put(
-                                                {
-                                                    "experiment_id": experiment["id"],
-                                                    "test_id": test_id,
-                                                    "user_message": test["prompt"],
-                                                    "bot_response": test["response"],
-                                                    "risk_name": risk_name,
-                                                    "messages": conversations[0]["messages"],
-                                                }
-                                            )
+                            # Conversations are fetched as soon as each test list
+                            # arrives and each test is queued as soon as its own
+                            # fetch returns, so workers start during discovery
+                            enqueue_futures = []
+                            for future in as_completed(list_futures):
+                                experiment_id = list_futures[future]
+                                try:
+                                    tests = future.result()
                                 except Exception as e:
                                     LOGGER.error(f"Error fetching tests: {e}")
-                                    test_retries += 1
-                                    # If it fails for over 1 minute, raise an exception
-                                    if test_retries > 20:
-                                        raise
+                                    poll_error = e
+                                    continue
+                                for test in tests:
+                                    test_id = test["id"]
+                                    if (
+                                        test.get("response") is not None
+                                        and processor.queued_tests.add(test_id)
+                                    ):
+                                        enqueue_futures.append(
+                                            discovery_executor.submit(enqueue_test, experiment_id, test)
+                                        )
+                            for future in as_completed(enqueue_futures):
+                                try:
+                                    if future.result():
+                                        new_tests += 1
+                                except Exception as e:
+                                    LOGGER.error(f"Error fetching conversations: {e}")
+                                    poll_error = e
                         except Exception as e:
                             LOGGER.error(f"Error fetching experiments: {e}")
-                            experiment_retries += 1
-                            # If it fails for over 1 minute, raise an exception
-                            if experiment_retries > 20:
-                                raise
+                            poll_error = e
 
-                        LOGGER.info("=== Sleeping for 5 seconds")
-                        time.sleep(5)
+                        stage_metrics.observe(POLL, risk_name, time.monotonic() - poll_started, error=poll_error is not None)
+                        if poll_error is None and snapshots.record_poll(snapshot_mark):
+                            stage_metrics.increment("polls_unchanged", risk_name)
+                        stage_metrics.increment("tests_queued", risk_name, new_tests)
+                        if new_tests:
+                            poll_scheduler.record_work(new_tests)
+                        elif poll_error is not None:
+                            poll_scheduler.record_failure()
+                            if poll_scheduler.should_give_up():
+                                raise poll_error
+                        else:
+                            poll_scheduler.record_empty()
+                        poll_scheduler.wait()
                 except KeyboardInterrupt:
+                    discovery_executor.shutdown(wait=False)
                     processor.stop_processing()
                     raise
                 except HttpError as e:
@@ -126,11 +223,18 @@ def custom_judge(
                         LOGGER.error("Unauthorized request. Please check that your API key is not expired and is set to the `GUARDRAILS_TOKEN` environment variable.")
                     elif e.status_code == 404:
                         LOGGER.error(e.message)
+                    discovery_executor.shutdown(wait=False)
                     processor.stop_processing()
                     raise
             else:
                 return fn(*args, **kwargs)
 
+        # Exposes current_interval and empty-poll counts while the loop runs
+        wrapped.poll_scheduler = poll_scheduler
+        # Exposes 304 and unchanged-poll counts
+        wrapped.snapshots = snapshots
+        # Exposes queue, pool and concurrency state, e.g. processor.concurrency_limiter.limit
+        wrapped.processor = processor
         return wrapped
 
     return wrap
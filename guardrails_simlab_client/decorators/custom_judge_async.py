@@ -0,0 +1,166 @@
+import asyncio
+from logging import getLogger
+from typing import Awaitable, Callable, Optional
+from urllib.parse import quote_plus
+
+from guardrails_simlab_client.env import CONTROL_PLANE_URL, _get_app_id
+from guardrails_simlab_client.http_client import DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT, error_message
+from guardrails_simlab_client.polling import (
+    DEFAULT_MAX_FAILURE_DURATION,
+    DEFAULT_MAX_POLL_INTERVAL,
+    DEFAULT_MIN_POLL_INTERVAL,
+    PollScheduler,
+)
+from guardrails_simlab_client.protocols import HttpError, JudgeResult
+from guardrails_simlab_client.processors.async_risk_evaluation_processor import AsyncRiskEvaluationProcessor
+
+LOGGER = getLogger(__name__)
+
+def custom_judge_async(
+    *,
+    risk_name: str,
+    enable: Optional[bool] = True,
+    control_plane_host: Optional[str] = CONTROL_PLANE_URL,
+    max_concurrency: Optional[int] = None,  # Max evaluations in flight on the event loop
+    application_id: Optional[str] = None,
+    connect_timeout: Optional[float] = DEFAULT_CONNECT_TIMEOUT,  # Seconds to wait for a connection to the control plane
+    read_timeout: Optional[float] = DEFAULT_READ_TIMEOUT,  # Seconds to wait for a control plane response
+    gzip_requests: bool = False,  # Gzip large request bodies sent to the control plane
+    min_poll_interval: float = DEFAULT_MIN_POLL_INTERVAL,  # First backoff step in seconds once polls come back empty
+    max_poll_interval: float = DEFAULT_MAX_POLL_INTERVAL,  # Ceiling in seconds for the idle/failure backoff
+    max_failure_duration: Optional[float] = DEFAULT_MAX_FAILURE_DURATION,  # Give up after polls fail for this many seconds
+    discovery_concurrency: int = 32,  # Max concurrent test list and conversation fetches per poll
+) -> Callable:
+    """asyncio counterpart of ``custom_judge`` for ``async def`` judges."""
+    LOGGER.info(
+        f"===> Initializing AsyncRiskEvaluationProcessor with application_id: {application_id}"
+    )
+    processor = AsyncRiskEvaluationProcessor(
+        control_plane_host,
+        max_concurrency,
+        application_id=application_id,
+        connect_timeout=connect_timeout,
+        read_timeout=read_timeout,
+        gzip_requests=gzip_requests,
+    )
+    poll_scheduler = PollScheduler(min_poll_interval, max_poll_interval, max_failure_duration)
+
+    def wrap(
+        fn: Callable[..., Awaitable[JudgeResult]]
+    ) -> Callable[..., Awaitable[JudgeResult]]:
+        LOGGER.info(f"===> Wrapping function {fn.__name__}")
+        async def wrapped(*args, **kwargs):
+            if not enable:
+                return await fn(*args, **kwargs)
+
+            LOGGER.info("===> Starting processing")
+            await processor.start_processing(fn)
+            http_client = processor.http_client
+            app_id = _get_app_id(application_id)
+            discovery_slots = asyncio.Semaphore(discovery_concurrency)
+
+            async def enqueue_test(experiment_id: str, test: dict):
+                try:
+                    async with discovery_slots:
+                        conversations_response = await http_client.get(
+                            f"/api/experiments/{experiment_id}/tests/{test['id']}/conversations?include-adaptability-messages=false"
+                        )
+                    if not conversations_response.is_success:
+                        message = error_message(conversations_response)
+                        raise HttpError(status_code=conversations_response.status_code, message=message)
+                    conversations = conversations_response.json()
+                    await processor.processing_queue.put(
+                        {
+                            "experiment_id": experiment_id,
+                            "test_id": test["id"],
+                            "user_message": test["prompt"],
+                            "bot_response": test["response"],
+                            "risk_name": risk_name,
+                            "messages": conversations[0]["messages"],
+                        }
+                    )
+                except Exception:
+                    # Let the next poll pick the test up again
+                    processor.queued_tests.release(test["id"])
+                    raise
+
+            async def discover_experiment(experiment: dict):
+                async with discovery_slots:
+                    tests_response = await http_client.get(
+                        f"/api/experiments/{experiment['id']}/tests?appId={app_id}&unevaluated-risk={quote_plus(risk_name)}&include-risk-evaluations=true"
+                    )
+                if not tests_response.is_success:
+                    message = error_message(tests_response)
+                    raise HttpError(status_code=tests_response.status_code, message=message)
+                pending = []
+                new_tests = 0
+                for test in tests_response.json():
+                    test_id = test["id"]
+                    if (
+                        test.get("response") is not None
+                        and processor.queued_tests.add(test_id)
+                    ):
+                        new_tests += 1
+                        pending.append(enqueue_test(experiment["id"], test))
+                results = await asyncio.gather(*pending, return_exceptions=True)
+                for result in results:
+                    if isinstance(result, Exception):
+                        raise result
+                return new_tests
+
+            try:
+                while True:
+                    LOGGER.info("===> Starting...")
+                    poll_error = None
+                    new_tests = 0
+                    try:
+                        experiments_response = await http_client.get(
+                            f"/api/experiments?appId={app_id}&validationStatus=in%20progress"
+                        )
+                        if not experiments_response.is_success:
+                            message = error_message(experiments_response)
+                            raise HttpError(status_code=experiments_response.status_code, message=message)
+
+                        experiments = [
+                            experiment
+                            for experiment in experiments_response.json()
+                            if risk_name in experiment.get("source_data", {}).get("evaluation_configuration", {}).keys()
+                        ]
+                        LOGGER.info(f"=== Found {len(experiments)} experiments with validation in progress for risk {risk_name}")
+                        results = await asyncio.gather(
+                            *[discover_experiment(experiment) for experiment in experiments],
+                            return_exceptions=True,
+                        )
+                        for result in results:
+                            if isinstance(result, Exception):
+                                LOGGER.error(f"Error fetching tests: {result}")
+                                poll_error = result
+                            else:
+                                new_tests += result
+                    except Exception as e:
+                        LOGGER.error(f"Error fetching experiments: {e}")
+                        poll_error = e
+
+                    if new_tests:
+                        poll_scheduler.record_work(new_tests)
+                    elif poll_error is not None:
+                        poll_scheduler.record_failure()
+                        if poll_scheduler.should_give_up():
+                            raise poll_error
+                    else:
+                        poll_scheduler.record_empty()
+                    await poll_scheduler.wait_async()
+            except HttpError as e:
+                if e.status_code == 401:
+                    LOGGER.error("Unauthorized request. Please check that your API key is not expired and is set to the `GUARDRAILS_TOKEN` environment variable.")
+                elif e.status_code == 404:
+                    LOGGER.error(e.message)
+                raise
+            finally:
+                await processor.stop_processing()
+
+        # Exposes current_interval and empty-poll counts while the loop runs
+        wrapped.poll_scheduler = poll_scheduler
+        return wrapped
+
+    return wrap
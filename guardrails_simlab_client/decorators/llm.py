@@ -1,12 +1,26 @@
 from typing import Callable,Optional
 from logging import getLogger
-
 import time
-import requests
 
-from guardrails_simlab_client.env import CONTROL_PLANE_URL, _get_api_key, _get_app_id
+from guardrails_simlab_client.caching import ResponseCache
+from guardrails_simlab_client.env import CONTROL_PLANE_URL, _get_app_id
+from guardrails_simlab_client.http_client import DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT
+from guardrails_simlab_client.polling import (
+    DEFAULT_MAX_FAILURE_DURATION,
+    DEFAULT_MAX_POLL_INTERVAL,
+    DEFAULT_MIN_POLL_INTERVAL,
+    PollScheduler,
+)
+from guardrails_simlab_client.processors.base_processor import DEFAULT_BATCH_WAIT_MS
 from guardrails_simlab_client.processors.test_processor import TestProcessor
 from guardrails_simlab_client.protocols import HttpError
+from guardrails_simlab_client.journal import Journal
+from guardrails_simlab_client.leases import LeaseBackend
+from guardrails_simlab_client.metrics import DISCOVER, POLL, Metrics
+from guardrails_simlab_client.rate_limiter import RateLimiter
+from guardrails_simlab_client.snapshots import PollSnapshots
+from guardrails_simlab_client.shutdown import DEFAULT_DRAIN_TIMEOUT, install_sigterm_handler
+from guardrails_simlab_client.submission import DEFAULT_SUBMIT_WORKERS
 
 LOGGER = getLogger(__name__)
 
@@ -15,130 +29,145 @@ def tt_webhook_polling_sync(
     control_plane_host: Optional[str] = CONTROL_PLANE_URL,
     max_workers: Optional[int] = None,  # Controls max concurrency
     application_id: Optional[str] = None,
-    throttle_time: Optional[float] = None # Time in seconds to pause between each request to the wrapped function
+    throttle_time: Optional[float] = None, # Minimum seconds between calls to the wrapped function; ignored when rate_limiter is set
+    rate_limiter: Optional[RateLimiter] = None, # Rate/cost/concurrency limits for the wrapped function, shareable across decorators
+    adaptive_concurrency: bool = False, # Tune concurrency between min_workers and max_workers from fn latency and 429s
+    min_workers: int = 1, # Lower bound for adaptive concurrency
+    lease_backend: Optional[LeaseBackend] = None, # Claims tests so replicas sharing an app don't duplicate work
+    journal: Optional[Journal] = None, # Local record of in-flight work, so results survive a restart
+    response_cache: Optional[ResponseCache] = None, # Reuse responses for identical conversations and personas
+    connection_test_workers: int = 2, # Threads reserved for pending connection tests
+    submit_workers: int = DEFAULT_SUBMIT_WORKERS, # Threads submitting results with retries; 0 submits from the model workers
+    spill_path: Optional[str] = None, # File for results that can't be submitted yet, retried later and after a restart
+    metrics: Optional[Metrics] = None, # Records counters and per-stage latencies, e.g. for Metrics.serve()
+    drain_timeout: float = DEFAULT_DRAIN_TIMEOUT, # Seconds to finish running tests and submissions on Ctrl-C or SIGTERM
+    max_response_chars: Optional[int] = None, # Cut responses off at this many characters; streams stop being read there
+    max_generation_seconds: Optional[float] = None, # Stop reading a streamed response after this many seconds
+    connect_timeout: Optional[float] = DEFAULT_CONNECT_TIMEOUT, # Seconds to wait for a connection to the control plane
+    read_timeout: Optional[float] = DEFAULT_READ_TIMEOUT, # Seconds to wait for a control plane response
+    gzip_requests: bool = False, # Gzip large request bodies sent to the control plane
+    min_poll_interval: float = DEFAULT_MIN_POLL_INTERVAL, # First backoff step in seconds once polls come back empty
+    max_poll_interval: float = DEFAULT_MAX_POLL_INTERVAL, # Ceiling in seconds for the idle/failure backoff
+    max_failure_duration: Optional[float] = DEFAULT_MAX_FAILURE_DURATION, # Give up after polls fail for this many seconds
+    batch_size: Optional[int] = None, # When set, fn receives a list of up to batch_size histories and returns a list of responses
+    batch_wait_ms: float = DEFAULT_BATCH_WAIT_MS, # Max time to wait for a batch to fill once it has one test
 ) -> Callable:
     LOGGER.info(f"===> Initializing TestProcessor with application_id: {application_id}")
-    processor = TestProcessor(control_plane_host, max_workers, application_id=application_id, throttle_time=throttle_time)
+    processor = TestProcessor(
+        control_plane_host,
+        max_workers,
+        application_id=application_id,
+        throttle_time=throttle_time,
+        connect_timeout=connect_timeout,
+        read_timeout=read_timeout,
+        gzip_requests=gzip_requests,
+        batch_size=batch_size,
+        batch_wait_ms=batch_wait_ms,
+        rate_limiter=rate_limiter,
+        adaptive_concurrency=adaptive_concurrency,
+        min_workers=min_workers,
+        lease_backend=lease_backend,
+        journal=journal,
+        response_cache=response_cache,
+        connection_test_workers=connection_test_workers,
+        submit_workers=submit_workers,
+        spill_path=spill_path,
+        metrics=metrics,
+        drain_timeout=drain_timeout,
+        max_response_chars=max_response_chars,
+        max_generation_seconds=max_generation_seconds,
+    )
+    http_client = processor.http_client
+    poll_scheduler = PollScheduler(min_poll_interval, max_poll_interval, max_failure_duration)
+    # Unchanged lists come back as 304s and are served from the last response
+    snapshots = PollSnapshots()
+    stage_metrics = processor.metrics
+    scope = processor.journal_scope
     def wrap(fn: Callable[[str, ...], str]) -> Callable:
         def wrapped(*args, **kwargs):
             if enable:
+                install_sigterm_handler()
                 processor.start_processing(fn)
                 try:
-                    connection_test_retries = 0
-                    experiement_retries = 0
                     while True:
                         LOGGER.info("===> Starting...")
+                        poll_started = time.monotonic()
+                        snapshot_mark = snapshots.mark()
+                        poll_error = None
+                        new_tests = 0
                         try:
-                            connection_tests_url = f"{control_plane_host}/api/connection-tests?status=pending&appId={_get_app_id(application_id)}"
+                            connection_tests_url = f"/api/connection-tests?status=pending&appId={_get_app_id(application_id)}"
                             LOGGER.info(f"Fetching connection tests from {connection_tests_url}")
-                            response = requests.get(
-                                connection_tests_url,
-                                headers={"x-api-key": _get_api_key()},
-                            )
-                            
-                            if not response.ok:
-                                message = response.json().get("message") or response.text
-                                raise HttpError(status_code=response.status_code, message=message)
-                            pending_connection_tests = response.json()
+                            pending_connection_tests, _ = snapshots.get_json(http_client, connection_tests_url)
+                            # Handled on the processor's connection test pool so
+                            # experiment discovery below is never held up. They don't
+                            # count as poll work, so a retried one can't reset the backoff
                             for test in pending_connection_tests:
-                                try:
-                                    response = fn([{
-                                        "role": "user",
-                                        "content": test["prompt"]
-                                    }])
-                                    requests.patch(
-                                        f"{control_plane_host}/api/connection-tests/{test['id']}?appId={_get_app_id(application_id)}",
-                                        json={
-                                            "response": response,
-                                            "status": "completed",
-                                            "executed_by": _get_app_id(application_id),
-                                            "completed_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
-                                        },
-                                        headers={"x-api-key": _get_api_key()},
-                                    )
-                                    if throttle_time is not None:
-                                        time.sleep(throttle_time)
-                                except Exception as e:
-                                    LOGGER.info(f"Error processing connection test: {e}")
-                                    requests.patch(
-                                        f"{control_plane_host}/api/connection-tests/{test['id']}?appId={_get_app_id(application_id)}",
-                                        json={
-                                            "status": "failed",
-                                            "executed_by": _get_app_id(application_id),
-                                            "failed_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
-                                            "error": str(e),
-                                        },
-                                        headers={"x-api-key": _get_api_key()},
-                                    )
+                                processor.submit_connection_test(test, fn)
                         except Exception as e:
                             LOGGER.error(f"Error fetching connection tests: {e}")
-                            connection_test_retries += 1
-                            sleep = True
-                            # If it fails for over 1 minute, raise an exception
-                            if connection_test_retries > 20:
-                                raise
+                            poll_error = e
 
-                        sleep = False
                         try:
-                            experiments_response = requests.get(
-                                f"{control_plane_host}/api/experiments?appId={_get_app_id(application_id)}&evaluated=false",
-                                headers={"x-api-key": _get_api_key()},
+                            experiments, _ = snapshots.get_json(
+                                http_client, f"/api/experiments?appId={_get_app_id(application_id)}&evaluated=false"
                             )
-
-                            if not experiments_response.ok:
-                                message = experiments_response.json().get("message") or experiments_response.text
-                                raise HttpError(status_code=experiments_response.status_code, message=message)
-                            experiments = experiments_response.json()
                             LOGGER.info(f"=== Found {len(experiments)} unevaluated experiments")
-                            sleep = True
 
                             for experiment in experiments:
                                 experiment_id = experiment["id"]
-                                limit = processor.max_workers * 2
+                                limit = processor.processing_queue.maxsize
                                 app_id = _get_app_id(application_id)
                                 LOGGER.info(
                                     f"=== checking for tests for experiment {experiment_id}"
                                 )
-                                tests_response = requests.get(
-                                    f"{control_plane_host}/api/experiments/{experiment_id}/tests?appId={app_id}&include-risk-evaluations=false&limit={limit}&unprocessed-only=true",
-                                    headers={"x-api-key": _get_api_key()},
-                                )
-
-                                if not tests_response.ok:
-                                    sleep = True
-                                    LOGGER.error(f"Error fetching tests: {tests_response.text}")
-                                    experiement_retries += 1
+                                try:
+                                    with stage_metrics.time(DISCOVER, scope):
+                                        # A 304 still yields the stored list, so tests released
+                                        # after a failure are picked up again
+                                        tests, _ = snapshots.get_json(
+                                            http_client,
+                                            f"/api/experiments/{experiment_id}/tests?appId={app_id}&include-risk-evaluations=false&limit={limit}&unprocessed-only=true",
+                                        )
+                                except HttpError as e:
+                                    LOGGER.error(f"Error fetching tests: {e}")
+                                    poll_error = e
                                     continue
 
-                                tests = tests_response.json()
-
                                 for test in tests:
                                     test_id = test["id"]
                                     if (
                                         not test["response"]
-                                        and test_id not in processor.queued_tests
+                                        and processor.queued_tests.add(test_id)
                                     ):
-                                        sleep = False
-                                        processor.queued_tests[test_id] = True
-                                        processor.processing_queue.put(
-                                            {
-                                                "id": test_id,
-                                                "prompt": test["prompt"],
-                                                "persona": test["persona"],
-                                                "experiment_id": experiment["id"],
-                                            }
-                                        )
+                                        new_tests += 1
+                                        test_data = {
+                                            "id": test_id,
+                                            "prompt": test["prompt"],
+                                            "persona": test["persona"],
+                                            "experiment_id": experiment["id"],
+                                        }
+                                        # Lets the processor skip the history lookup for single-turn tests
+                                        if "parent_test_id" in test:
+                                            test_data["parent_test_id"] = test["parent_test_id"]
+                                        processor.processing_queue.put(test_data)
                         except Exception as e:
                             LOGGER.error(f"Error fetching experiments: {e}")
-                            experiement_retries += 1
-                            sleep = True
-                            # If it fails for over 1 minute, raise an exception
-                            if experiement_retries > 20:
-                                raise
-                        
-                        if sleep:
-                            LOGGER.info("=== Sleeping for 5 seconds")
-                            time.sleep(5)
+                            poll_error = e
+
+                        stage_metrics.observe(POLL, scope, time.monotonic() - poll_started, error=poll_error is not None)
+                        if poll_error is None and snapshots.record_poll(snapshot_mark):
+                            stage_metrics.increment("polls_unchanged", scope)
+                        stage_metrics.increment("tests_queued", scope, new_tests)
+                        if new_tests:
+                            poll_scheduler.record_work(new_tests)
+                        elif poll_error is not None:
+                            poll_scheduler.record_failure()
+                            if poll_scheduler.should_give_up():
+                                raise poll_error
+                        else:
+                            poll_scheduler.record_empty()
+                        poll_scheduler.wait()
 
                 except KeyboardInterrupt:
                     processor.stop_processing()
@@ -154,6 +183,12 @@ def tt_webhook_polling_sync(
             else:
                 return fn(*args, **kwargs)
 
+        # Exposes current_interval and empty-poll counts while the loop runs
+        wrapped.poll_scheduler = poll_scheduler
+        # Exposes 304 and unchanged-poll counts
+        wrapped.snapshots = snapshots
+        # Exposes queue, pool and concurrency state, e.g. processor.concurrency_limiter.limit
+        wrapped.processor = processor
         return wrapped
 
     return wrap
@@ -0,0 +1,147 @@
+import asyncio
+from typing import Awaitable, Callable, Optional
+from logging import getLogger
+
+from guardrails_simlab_client.env import CONTROL_PLANE_URL, _get_app_id
+from guardrails_simlab_client.http_client import DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT, error_message
+from guardrails_simlab_client.polling import (
+    DEFAULT_MAX_FAILURE_DURATION,
+    DEFAULT_MAX_POLL_INTERVAL,
+    DEFAULT_MIN_POLL_INTERVAL,
+    PollScheduler,
+)
+from guardrails_simlab_client.processors.async_test_processor import AsyncTestProcessor
+from guardrails_simlab_client.protocols import HttpError
+
+LOGGER = getLogger(__name__)
+
+def simlab_connect_async(
+    enable: Optional[bool] = True,
+    control_plane_host: Optional[str] = CONTROL_PLANE_URL,
+    max_concurrency: Optional[int] = None,  # Max tests in flight on the event loop
+    application_id: Optional[str] = None,
+    connect_timeout: Optional[float] = DEFAULT_CONNECT_TIMEOUT, # Seconds to wait for a connection to the control plane
+    read_timeout: Optional[float] = DEFAULT_READ_TIMEOUT, # Seconds to wait for a control plane response
+    gzip_requests: bool = False, # Gzip large request bodies sent to the control plane
+    min_poll_interval: float = DEFAULT_MIN_POLL_INTERVAL, # First backoff step in seconds once polls come back empty
+    max_poll_interval: float = DEFAULT_MAX_POLL_INTERVAL, # Ceiling in seconds for the idle/failure backoff
+    max_failure_duration: Optional[float] = DEFAULT_MAX_FAILURE_DURATION, # Give up after polls fail for this many seconds
+) -> Callable:
+    """asyncio counterpart of ``simlab_connect`` for ``async def`` functions.
+
+    Polling, control plane requests and the wrapped coroutine all run on the
+    caller's event loop; calling the wrapped function returns a coroutine
+    that polls until cancelled.
+    """
+    LOGGER.info(f"===> Initializing AsyncTestProcessor with application_id: {application_id}")
+    processor = AsyncTestProcessor(
+        control_plane_host,
+        max_concurrency,
+        application_id=application_id,
+        connect_timeout=connect_timeout,
+        read_timeout=read_timeout,
+        gzip_requests=gzip_requests,
+    )
+    poll_scheduler = PollScheduler(min_poll_interval, max_poll_interval, max_failure_duration)
+    def wrap(fn: Callable[..., Awaitable[str]]) -> Callable:
+        async def wrapped(*args, **kwargs):
+            if not enable:
+                return await fn(*args, **kwargs)
+
+            await processor.start_processing(fn)
+            http_client = processor.http_client
+            try:
+                while True:
+                    LOGGER.info("===> Starting...")
+                    poll_error = None
+                    new_tests = 0
+                    try:
+                        response = await http_client.get(
+                            f"/api/connection-tests?status=pending&appId={_get_app_id(application_id)}"
+                        )
+                        if not response.is_success:
+                            message = error_message(response)
+                            raise HttpError(status_code=response.status_code, message=message)
+                        pending_connection_tests = response.json()
+                        # Not counted as poll work, so a retried one can't reset the backoff
+                        for test in pending_connection_tests:
+                            processor.submit_connection_test(test, fn)
+                    except Exception as e:
+                        LOGGER.error(f"Error fetching connection tests: {e}")
+                        poll_error = e
+
+                    try:
+                        experiments_response = await http_client.get(
+                            f"/api/experiments?appId={_get_app_id(application_id)}&evaluated=false"
+                        )
+                        if not experiments_response.is_success:
+                            message = error_message(experiments_response)
+                            raise HttpError(status_code=experiments_response.status_code, message=message)
+                        experiments = experiments_response.json()
+                        LOGGER.info(f"=== Found {len(experiments)} unevaluated experiments")
+
+                        app_id = _get_app_id(application_id)
+                        limit = processor.max_concurrency * 2
+                        tests_responses = await asyncio.gather(
+                            *[
+                                http_client.get(
+                                    f"/api/experiments/{experiment['id']}/tests?appId={app_id}&include-risk-evaluations=false&limit={limit}&unprocessed-only=true"
+                                )
+                                for experiment in experiments
+                            ],
+                            return_exceptions=True,
+                        )
+                        for experiment, tests_response in zip(experiments, tests_responses):
+                            if isinstance(tests_response, Exception) or not tests_response.is_success:
+                                LOGGER.error(f"Error fetching tests for experiment {experiment['id']}: {tests_response}")
+                                poll_error = (
+                                    tests_response
+                                    if isinstance(tests_response, Exception)
+                                    else HttpError(status_code=tests_response.status_code, message=error_message(tests_response))
+                                )
+                                continue
+
+                            for test in tests_response.json():
+                                test_id = test["id"]
+                                if (
+                                    not test["response"]
+                                    and processor.queued_tests.add(test_id)
+                                ):
+                                    new_tests += 1
+                                    test_data = {
+                                        "id": test_id,
+                                        "prompt": test["prompt"],
+                                        "persona": test["persona"],
+                                        "experiment_id": experiment["id"],
+                                    }
+                                    # Lets the processor skip the history lookup for single-turn tests
+                                    if "parent_test_id" in test:
+                                        test_data["parent_test_id"] = test["parent_test_id"]
+                                    await processor.processing_queue.put(test_data)
+                    except Exception as e:
+                        LOGGER.error(f"Error fetching experiments: {e}")
+                        poll_error = e
+
+                    if new_tests:
+                        poll_scheduler.record_work(new_tests)
+                    elif poll_error is not None:
+                        poll_scheduler.record_failure()
+                        if poll_scheduler.should_give_up():
+                            raise poll_error
+                    else:
+                        poll_scheduler.record_empty()
+                    await poll_scheduler.wait_async()
+            except HttpError as e:
+                if e.status_code == 401:
+                    LOGGER.error("Unauthorized request. Please check that your API key is not expired and is set to the `GUARDRAILS_TOKEN` environment variable.")
+                elif e.status_code == 404:
+                    LOGGER.error(e.message)
+                raise
+            finally:
+                await processor.stop_processing()
+
+        # Exposes current_interval and empty-poll counts while the loop runs
+        wrapped.poll_scheduler = poll_scheduler
+        return wrapped
+
+    return wrap
@@ -0,0 +1,110 @@
+from collections import OrderedDict
+import threading
+import time
+from typing import Hashable
+
+# How long an unacknowledged test is considered in flight
+DEFAULT_DEDUP_TTL = 3600.0
+# How long an acknowledged test keeps shadowing stale poll results
+DEFAULT_ACK_TTL = 60.0
+DEFAULT_DEDUP_MAX_SIZE = 100_000
+# Delay before a failed test may be queued again, doubling with each consecutive failure
+DEFAULT_RETRY_BASE_DELAY = 1.0
+DEFAULT_RETRY_MAX_DELAY = 300.0
+
+
+class ExpiringDedupSet:
+    """Thread-safe set of test IDs that are queued or in flight.
+
+    Entries expire after ``ttl`` seconds and the oldest are evicted once
+    ``max_size`` is reached, so memory stays flat on long-running pods. An
+    entry is only dropped early when its work is handed back (``release``);
+    once the server acknowledges the result (``acknowledge``) the entry is
+    kept for ``ack_ttl`` seconds so polls racing the acknowledgement don't
+    requeue it. When its work fails (``retry_later``) the entry is kept for
+    a delay that doubles with each consecutive failure of that key, so a
+    test that always fails isn't retried on every poll.
+    """
+
+    def __init__(
+        self,
+        ttl: float = DEFAULT_DEDUP_TTL,
+        max_size: int = DEFAULT_DEDUP_MAX_SIZE,
+        ack_ttl: float = DEFAULT_ACK_TTL,
+        retry_base_delay: float = DEFAULT_RETRY_BASE_DELAY,
+        retry_max_delay: float = DEFAULT_RETRY_MAX_DELAY,
+    ):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.ack_ttl = ack_ttl
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        # key -> consecutive failures, cleared when the server acknowledges it
+        self._failures: "OrderedDict[Hashable, int]" = OrderedDict()
+        # key -> monotonic expiry; insertion order approximates expiry order
+        self._entries: "OrderedDict[Hashable, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, key: Hashable) -> bool:
+        """Add ``key`` unless it is already present; returns True if it was added"""
+        now = time.monotonic()
+        with self._lock:
+            expires_at = self._entries.get(key)
+            if expires_at is not None and expires_at > now:
+                return False
+            self._entries[key] = now + self.ttl
+            self._entries.move_to_end(key)
+            self._evict(now)
+            return True
+
+    def acknowledge(self, key: Hashable):
+        """The server accepted the result for ``key``: expire it after ack_ttl"""
+        now = time.monotonic()
+        with self._lock:
+            self._failures.pop(key, None)
+            if key in self._entries:
+                self._entries[key] = now + self.ack_ttl
+                self._entries.move_to_end(key)
+            self._evict(now)
+
+    def retry_later(self, key: Hashable) -> float:
+        """The work for ``key`` failed: keep it out of the queue for a backoff delay, which is returned"""
+        now = time.monotonic()
+        with self._lock:
+            failures = self._failures.pop(key, 0) + 1
+            self._failures[key] = failures
+            while len(self._failures) > self.max_size:
+                self._failures.popitem(last=False)
+            delay = min(self.retry_max_delay, self.retry_base_delay * 2 ** (failures - 1))
+            self._entries[key] = now + delay
+            self._entries.move_to_end(key)
+            self._evict(now)
+            return delay
+
+    def release(self, key: Hashable):
+        """Forget ``key`` so the next poll can pick it up again"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def _evict(self, now: float):
+        entries = self._entries
+        while entries:
+            key, expires_at = next(iter(entries.items()))
+            if expires_at > now:
+                break
+            entries.popitem(last=False)
+        if len(entries) > self.max_size:
+            # Acknowledged entries can expire behind live ones; sweep those first
+            for key in [key for key, expires_at in entries.items() if expires_at <= now]:
+                del entries[key]
+            while len(entries) > self.max_size:
+                entries.popitem(last=False)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            expires_at = self._entries.get(key)
+            return expires_at is not None and expires_at > time.monotonic()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
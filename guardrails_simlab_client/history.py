@@ -0,0 +1,173 @@
+from collections import OrderedDict
+from logging import getLogger
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from guardrails_simlab_client.http_client import OptionalEndpoint
+
+LOGGER = getLogger(__name__)
+
+# A resolved (prompt, response) pair for one ancestor test
+Turn = Tuple[str, str]
+
+
+class ConversationHistoryResolver:
+    """Builds the message history for a multi-turn test.
+
+    Prefers the conversations endpoint, which returns the whole history in a
+    single request. When the server does not offer it, falls back to walking
+    ``parent_test_id`` links, caching every resolved ancestor chain in a
+    per-experiment LRU so sibling and child tests only fetch the turns that
+    have not been seen yet. A 404 for one test falls back for that test
+    only, until enough of them suggest the endpoint is missing.
+    """
+
+    def __init__(self, max_chains_per_experiment: int = 1024, max_experiments: int = 64):
+        self.max_chains_per_experiment = max_chains_per_experiment
+        self.max_experiments = max_experiments
+        self.conversations = OptionalEndpoint("Conversations", "falling back to parent test lookups")
+        self._chains: "OrderedDict[str, OrderedDict[str, Tuple[Turn, ...]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def resolve(self, http_client, test_data: Dict[str, Any]) -> List[Dict[str, str]]:
+        """Return the message history for a queued test using a ControlPlaneClient"""
+        experiment_id = test_data["experiment_id"]
+        test_id = test_data["id"]
+        parent_id = test_data.get("parent_test_id")
+        if "parent_test_id" in test_data and not parent_id:
+            return self._build((), [], test_data["prompt"])
+
+        if self.conversations.supported is not False:
+            response = http_client.get(self._conversations_path(experiment_id, test_id))
+            history = self._from_conversations(response, response.ok, test_data["prompt"])
+            if history is not None:
+                return history
+
+        if "parent_test_id" not in test_data:
+            response = http_client.get(f"/api/experiments/{experiment_id}/tests/{test_id}")
+            test = self._fetch_test(response, test_id, ok=response.ok)
+            parent_id = test.get("parent_test_id")
+
+        prefix = self._cached_chain(experiment_id, parent_id)
+        turns: List[Turn] = []
+        fetched_ids: List[str] = []
+        while parent_id and prefix is None:
+            response = http_client.get(f"/api/experiments/{experiment_id}/tests/{parent_id}")
+            parent_test = self._fetch_test(response, parent_id, ok=response.ok)
+            turns.append((parent_test["prompt"], parent_test["response"]))
+            fetched_ids.append(parent_id)
+            parent_id = parent_test.get("parent_test_id")
+            prefix = self._cached_chain(experiment_id, parent_id)
+        return self._finish(experiment_id, prefix, turns, fetched_ids, test_data["prompt"])
+
+    async def resolve_async(self, http_client, test_data: Dict[str, Any]) -> List[Dict[str, str]]:
+        """Return the message history for a queued test using an AsyncControlPlaneClient"""
+        experiment_id = test_data["experiment_id"]
+        test_id = test_data["id"]
+        parent_id = test_data.get("parent_test_id")
+        if "parent_test_id" in test_data and not parent_id:
+            return self._build((), [], test_data["prompt"])
+
+        if self.conversations.supported is not False:
+            response = await http_client.get(self._conversations_path(experiment_id, test_id))
+            history = self._from_conversations(response, response.is_success, test_data["prompt"])
+            if history is not None:
+                return history
+
+        if "parent_test_id" not in test_data:
+            response = await http_client.get(f"/api/experiments/{experiment_id}/tests/{test_id}")
+            test = self._fetch_test(response, test_id, ok=response.is_success)
+            parent_id = test.get("parent_test_id")
+
+        prefix = self._cached_chain(experiment_id, parent_id)
+        turns: List[Turn] = []
+        fetched_ids: List[str] = []
+        while parent_id and prefix is None:
+            response = await http_client.get(f"/api/experiments/{experiment_id}/tests/{parent_id}")
+            parent_test = self._fetch_test(response, parent_id, ok=response.is_success)
+            turns.append((parent_test["prompt"], parent_test["response"]))
+            fetched_ids.append(parent_id)
+            parent_id = parent_test.get("parent_test_id")
+            prefix = self._cached_chain(experiment_id, parent_id)
+        return self._finish(experiment_id, prefix, turns, fetched_ids, test_data["prompt"])
+
+    def forget_experiment(self, experiment_id: str):
+        """Drop the cached chains of an experiment"""
+        with self._lock:
+            self._chains.pop(experiment_id, None)
+
+    @staticmethod
+    def _conversations_path(experiment_id: str, test_id: str) -> str:
+        return f"/api/experiments/{experiment_id}/tests/{test_id}/conversations?include-adaptability-messages=false"
+
+    def _from_conversations(self, response, ok: bool, prompt: str) -> Optional[List[Dict[str, str]]]:
+        status_code = response.status_code
+        if self.conversations.unavailable(status_code):
+            return None
+        if not ok:
+            LOGGER.debug(f"Error fetching conversations ({status_code}), falling back to parent test lookups")
+            return None
+        conversations = response.json()
+        if not conversations or not conversations[0].get("messages"):
+            return None
+        history = [
+            {"role": message["role"], "content": message["content"]}
+            for message in conversations[0]["messages"]
+        ]
+        # The pending test has no response yet; drop any empty placeholder for it
+        while history and history[-1]["role"] == "assistant" and not history[-1]["content"]:
+            history.pop()
+        if not history or history[-1] != {"role": "user", "content": prompt}:
+            history.append({"role": "user", "content": prompt})
+        return history
+
+    @staticmethod
+    def _fetch_test(response, test_id: str, ok: bool) -> Dict[str, Any]:
+        if not ok:
+            raise Exception(f"Error fetching test {test_id}: {response.text}")
+        return response.json()
+
+    def _cached_chain(self, experiment_id: str, test_id: Optional[str]) -> Optional[Tuple[Turn, ...]]:
+        if not test_id:
+            return ()
+        with self._lock:
+            chains = self._chains.get(experiment_id)
+            if chains is None or test_id not in chains:
+                return None
+            self._chains.move_to_end(experiment_id)
+            chains.move_to_end(test_id)
+            return chains[test_id]
+
+    def _finish(
+        self,
+        experiment_id: str,
+        prefix: Tuple[Turn, ...],
+        turns: List[Turn],
+        fetched_ids: List[str],
+        prompt: str,
+    ) -> List[Dict[str, str]]:
+        # Ancestors were collected newest first
+        turns.reverse()
+        fetched_ids.reverse()
+        with self._lock:
+            chains = self._chains.get(experiment_id)
+            if chains is None:
+                chains = self._chains[experiment_id] = OrderedDict()
+                while len(self._chains) > self.max_experiments:
+                    self._chains.popitem(last=False)
+            self._chains.move_to_end(experiment_id)
+            for index, ancestor_id in enumerate(fetched_ids):
+                chains[ancestor_id] = prefix + tuple(turns[: index + 1])
+                chains.move_to_end(ancestor_id)
+            while len(chains) > self.max_chains_per_experiment:
+                chains.popitem(last=False)
+        return self._build(prefix, turns, prompt)
+
+    @staticmethod
+    def _build(prefix: Tuple[Turn, ...], turns: List[Turn], prompt: str) -> List[Dict[str, str]]:
+        history = []
+        for ancestor_prompt, ancestor_response in (*prefix, *turns):
+            history.append({"role": "user", "content": ancestor_prompt})
+            history.append({"role": "assistant", "content": ancestor_response})
+        history.append({"role": "user", "content": prompt})
+        return history
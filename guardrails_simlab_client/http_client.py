@@ -0,0 +1,299 @@
+from dataclasses import dataclass
+import gzip
+import json
+from logging import getLogger
+import threading
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from guardrails_simlab_client.env import _get_api_key
+
+LOGGER = getLogger(__name__)
+
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 60.0
+# Bodies smaller than this are not worth the CPU to compress
+DEFAULT_GZIP_MIN_BYTES = 1024
+# Status codes that mean an endpoint does not exist on this server
+UNSUPPORTED_STATUS_CODES = (405, 501)
+# A 404 may only mean one test or experiment is gone, so it takes this many in a
+# row, before the endpoint has ever answered, to decide the endpoint is missing
+DEFAULT_NOT_FOUND_LIMIT = 3
+
+
+def error_message(response: Any) -> str:
+    """The ``message`` of a requests or httpx response's JSON error body, or the raw body, e.g. a proxy's HTML error page"""
+    try:
+        body = response.json()
+    except ValueError:
+        return response.text
+    if isinstance(body, dict) and body.get("message"):
+        return body["message"]
+    return response.text
+
+
+class OptionalEndpoint:
+    """Tracks whether the server offers an endpoint that older control planes lack.
+
+    ``supported`` is None until a response tells us either way. Callers
+    fall back for every request ``unavailable`` flags, and stop calling
+    the endpoint once ``supported`` is False.
+    """
+
+    def __init__(self, name: str, fallback: str, not_found_limit: int = DEFAULT_NOT_FOUND_LIMIT):
+        self.name = name
+        self.fallback = fallback
+        self.not_found_limit = not_found_limit
+        self.supported: Optional[bool] = None
+        self._not_found = 0
+        self._lock = threading.Lock()
+
+    def unavailable(self, status_code: int) -> bool:
+        """Record a response's status; returns whether to fall back for this request"""
+        with self._lock:
+            if status_code in UNSUPPORTED_STATUS_CODES:
+                self._mark_unsupported()
+                return True
+            if status_code == 404:
+                if self.supported is None:
+                    self._not_found += 1
+                    if self._not_found >= self.not_found_limit:
+                        self._mark_unsupported()
+                return True
+            if status_code < 400 or status_code == 409:
+                self.supported = True
+                self._not_found = 0
+            return False
+
+    def _mark_unsupported(self):
+        if self.supported is not False:
+            LOGGER.info(f"{self.name} endpoint unavailable, {self.fallback}")
+        self.supported = False
+
+
+@dataclass
+class PoolStats:
+    hits: int
+    misses: int
+
+
+class _PoolCounters:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.new_connections = 0
+
+    def record_checkout(self):
+        with self._lock:
+            self.checkouts += 1
+
+    def record_new_connection(self):
+        with self._lock:
+            self.new_connections += 1
+
+    def snapshot(self) -> PoolStats:
+        with self._lock:
+            return PoolStats(
+                hits=self.checkouts - self.new_connections,
+                misses=self.new_connections,
+            )
+
+
+def _counting_pool_class(base: type, counters: _PoolCounters) -> type:
+    class _CountingPool(base):
+        def _get_conn(self, timeout=None):
+            counters.record_checkout()
+            return super()._get_conn(timeout=timeout)
+
+        def _new_conn(self):
+            counters.record_new_connection()
+            return super()._new_conn()
+
+    return _CountingPool
+
+
+class _CountingHTTPAdapter(HTTPAdapter):
+    def __init__(self, counters: _PoolCounters, **kwargs):
+        self._counters = counters
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _counting_pool_class(HTTPConnectionPool, self._counters),
+            "https": _counting_pool_class(HTTPSConnectionPool, self._counters),
+        }
+
+
+class ControlPlaneClient:
+    """Keep-alive HTTP client shared by the decorators and processors.
+
+    Connections to the control plane are pooled and reused across threads;
+    the pool blocks instead of opening extra sockets once ``pool_size``
+    connections are checked out.
+    """
+
+    def __init__(
+        self,
+        control_plane_host: str,
+        pool_size: int = 10,
+        connect_timeout: Optional[float] = DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: Optional[float] = DEFAULT_READ_TIMEOUT,
+        gzip_requests: bool = False,
+        gzip_min_bytes: int = DEFAULT_GZIP_MIN_BYTES,
+    ):
+        self.control_plane_host = control_plane_host.rstrip("/")
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.gzip_requests = gzip_requests
+        self.gzip_min_bytes = gzip_min_bytes
+        self._counters = _PoolCounters()
+        self.session = requests.Session()
+        adapter = _CountingHTTPAdapter(
+            self._counters,
+            pool_connections=4,
+            pool_maxsize=pool_size,
+            pool_block=True,
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _url(self, path: str) -> str:
+        if path.startswith("http://") or path.startswith("https://"):
+            return path
+        return f"{self.control_plane_host}{path}"
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        json_body: Optional[Any] = None,
+        headers: Optional[Dict[str, str]] = None,
+        **kwargs,
+    ) -> requests.Response:
+        """Send a request to the control plane through the shared pool"""
+        request_headers = {"x-api-key": _get_api_key()}
+        if headers:
+            request_headers.update(headers)
+        data = None
+        if json_body is not None:
+            data = json.dumps(json_body).encode("utf-8")
+            request_headers["Content-Type"] = "application/json"
+            if self.gzip_requests and len(data) >= self.gzip_min_bytes:
+                data = gzip.compress(data)
+                request_headers["Content-Encoding"] = "gzip"
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.request(
+            method,
+            self._url(path),
+            data=data,
+            headers=request_headers,
+            **kwargs,
+        )
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request("GET", path, **kwargs)
+
+    def put(self, path: str, json_body: Optional[Any] = None, **kwargs) -> requests.Response:
+        return self.request("PUT", path, json_body=json_body, **kwargs)
+
+    def patch(self, path: str, json_body: Optional[Any] = None, **kwargs) -> requests.Response:
+        return self.request("PATCH", path, json_body=json_body, **kwargs)
+
+    def post(self, path: str, json_body: Optional[Any] = None, **kwargs) -> requests.Response:
+        return self.request("POST", path, json_body=json_body, **kwargs)
+
+    def pool_stats(self) -> PoolStats:
+        """Connection reuse counters: hits reused a pooled socket, misses opened a new one"""
+        return self._counters.snapshot()
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncControlPlaneClient:
+    """asyncio counterpart of ControlPlaneClient backed by httpx.
+
+    Requires the optional ``async`` extra (``pip install guardrails-ai-simlab-client[async]``).
+    """
+
+    def __init__(
+        self,
+        control_plane_host: str,
+        pool_size: int = 100,
+        connect_timeout: Optional[float] = DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: Optional[float] = DEFAULT_READ_TIMEOUT,
+        gzip_requests: bool = False,
+        gzip_min_bytes: int = DEFAULT_GZIP_MIN_BYTES,
+    ):
+        try:
+            import httpx
+        except ImportError:
+            raise ImportError(
+                "The async client requires httpx. Install it with `pip install guardrails-ai-simlab-client[async]`."
+            )
+        self.control_plane_host = control_plane_host.rstrip("/")
+        self.pool_size = pool_size
+        self.gzip_requests = gzip_requests
+        self.gzip_min_bytes = gzip_min_bytes
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size,
+            ),
+            timeout=httpx.Timeout(
+                read_timeout,
+                connect=connect_timeout,
+                pool=None,
+            ),
+        )
+
+    def _url(self, path: str) -> str:
+        if path.startswith("http://") or path.startswith("https://"):
+            return path
+        return f"{self.control_plane_host}{path}"
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        json_body: Optional[Any] = None,
+        headers: Optional[Dict[str, str]] = None,
+        **kwargs,
+    ):
+        """Send a request to the control plane through the shared pool"""
+        request_headers = {"x-api-key": _get_api_key()}
+        if headers:
+            request_headers.update(headers)
+        content = None
+        if json_body is not None:
+            content = json.dumps(json_body).encode("utf-8")
+            request_headers["Content-Type"] = "application/json"
+            if self.gzip_requests and len(content) >= self.gzip_min_bytes:
+                content = gzip.compress(content)
+                request_headers["Content-Encoding"] = "gzip"
+        return await self.client.request(
+            method,
+            self._url(path),
+            content=content,
+            headers=request_headers,
+            **kwargs,
+        )
+
+    async def get(self, path: str, **kwargs):
+        return await self.request("GET", path, **kwargs)
+
+    async def put(self, path: str, json_body: Optional[Any] = None, **kwargs):
+        return await self.request("PUT", path, json_body=json_body, **kwargs)
+
+    async def patch(self, path: str, json_body: Optional[Any] = None, **kwargs):
+        return await self.request("PATCH", path, json_body=json_body, **kwargs)
+
+    async def post(self, path: str, json_body: Optional[Any] = None, **kwargs):
+        return await self.request("POST", path, json_body=json_body, **kwargs)
+
+    async def aclose(self):
+        await self.client.aclose()
@@ -0,0 +1,130 @@
+from dataclasses import dataclass
+import json
+from logging import getLogger
+import sqlite3
+import threading
+import time
+from typing import Any, Iterator, Optional
+
+LOGGER = getLogger(__name__)
+
+# How long submitted and abandoned entries are kept before they are pruned
+DEFAULT_JOURNAL_RETENTION = 24 * 3600.0
+# Prune after this many submissions
+PRUNE_EVERY = 10_000
+
+CLAIMED = "claimed"
+COMPLETED = "completed"
+SUBMITTED = "submitted"
+
+
+@dataclass
+class JournalEntry:
+    experiment_id: str
+    test_id: str
+    scope: str
+    state: str
+    item: Optional[Any] = None
+    result: Optional[Any] = None
+
+
+class Journal:
+    """Local record of work in flight, so a restart neither repeats nor loses it.
+
+    Each item moves from ``claimed`` (the wrapped function is running) to
+    ``completed`` (its result is stored but not yet accepted by the server)
+    to ``submitted``. On start a processor resubmits every completed entry
+    for its scope, and a test whose result is already stored is never sent
+    to the wrapped function again. Writes go to a SQLite file in WAL mode
+    without an fsync per commit, which keeps them well under a millisecond.
+    """
+
+    def __init__(self, path: str, retention: float = DEFAULT_JOURNAL_RETENTION):
+        self.path = path
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._submissions = 0
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS journal ("
+            "scope TEXT NOT NULL, test_id TEXT NOT NULL, experiment_id TEXT NOT NULL, "
+            "state TEXT NOT NULL, item TEXT, result TEXT, updated_at REAL NOT NULL, "
+            "PRIMARY KEY (scope, test_id))"
+        )
+        self.prune()
+
+    def _execute(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            return self._connection.execute(sql, params).fetchall()
+
+    def get(self, scope: str, test_id: str) -> Optional[JournalEntry]:
+        rows = self._execute(
+            "SELECT experiment_id, state, item, result FROM journal WHERE scope = ? AND test_id = ?",
+            (scope, test_id),
+        )
+        if not rows:
+            return None
+        experiment_id, state, item, result = rows[0]
+        return JournalEntry(
+            experiment_id,
+            test_id,
+            scope,
+            state,
+            json.loads(item) if item is not None else None,
+            json.loads(result) if result is not None else None,
+        )
+
+    def claimed(self, experiment_id: str, test_id: str, scope: str):
+        self._execute(
+            "INSERT OR REPLACE INTO journal (scope, test_id, experiment_id, state, updated_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (scope, test_id, experiment_id, CLAIMED, time.time()),
+        )
+
+    def completed(self, experiment_id: str, test_id: str, scope: str, item: Any, result: Any):
+        """Store a result before it is submitted; ``item`` and ``result`` must be JSON-serializable"""
+        self._execute(
+            "INSERT OR REPLACE INTO journal (scope, test_id, experiment_id, state, item, result, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (scope, test_id, experiment_id, COMPLETED, json.dumps(item), json.dumps(result), time.time()),
+        )
+
+    def submitted(self, experiment_id: str, test_id: str, scope: str):
+        # The stored result is no longer needed once the server has it
+        self._execute(
+            "UPDATE journal SET state = ?, item = NULL, result = NULL, updated_at = ? "
+            "WHERE scope = ? AND test_id = ?",
+            (SUBMITTED, time.time(), scope, test_id),
+        )
+        self._submissions += 1
+        if self._submissions % PRUNE_EVERY == 0:
+            self.prune()
+
+    def released(self, experiment_id: str, test_id: str, scope: str):
+        """Forget a claim that produced no result; stored results are kept for resubmission"""
+        self._execute(
+            "DELETE FROM journal WHERE scope = ? AND test_id = ? AND state = ?",
+            (scope, test_id, CLAIMED),
+        )
+
+    def pending(self, scope: str) -> Iterator[JournalEntry]:
+        """Entries in ``scope`` whose result was never accepted by the server"""
+        rows = self._execute(
+            "SELECT experiment_id, test_id, item, result FROM journal WHERE scope = ? AND state = ?",
+            (scope, COMPLETED),
+        )
+        for experiment_id, test_id, item, result in rows:
+            yield JournalEntry(experiment_id, test_id, scope, COMPLETED, json.loads(item), json.loads(result))
+
+    def prune(self):
+        """Drop entries without a pending result once they are older than the retention period"""
+        self._execute(
+            "DELETE FROM journal WHERE state != ? AND updated_at < ?",
+            (COMPLETED, time.time() - self.retention),
+        )
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
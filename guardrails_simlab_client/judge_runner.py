@@ -0,0 +1,366 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict
+from logging import getLogger
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import quote_plus
+
+from guardrails_simlab_client.caching import JudgeResultCache
+from guardrails_simlab_client.env import CONTROL_PLANE_URL, _get_app_id
+from guardrails_simlab_client.http_client import (
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_READ_TIMEOUT,
+    ControlPlaneClient,
+    error_message,
+)
+from guardrails_simlab_client.journal import Journal
+from guardrails_simlab_client.leases import LeaseBackend
+from guardrails_simlab_client.metrics import DISCOVER, FETCH_HISTORY, NOOP_METRICS, POLL, Metrics
+from guardrails_simlab_client.polling import (
+    DEFAULT_MAX_FAILURE_DURATION,
+    DEFAULT_MAX_POLL_INTERVAL,
+    DEFAULT_MIN_POLL_INTERVAL,
+    PollScheduler,
+)
+from guardrails_simlab_client.processors.base_processor import DEFAULT_BATCH_WAIT_MS
+from guardrails_simlab_client.processors.process_judge import register_judge
+from guardrails_simlab_client.processors.risk_evaluation_processor import SUBMIT_CONCURRENCY, RiskEvaluationProcessor
+from guardrails_simlab_client.protocols import HttpError, JudgeResult
+from guardrails_simlab_client.rate_limiter import RateLimiter
+from guardrails_simlab_client.shutdown import DEFAULT_DRAIN_TIMEOUT, DaemonThreadPoolExecutor, install_sigterm_handler
+from guardrails_simlab_client.snapshots import PollSnapshots
+from guardrails_simlab_client.submission import DEFAULT_SUBMIT_WORKERS, SubmissionPipeline
+
+LOGGER = getLogger(__name__)
+
+# Metrics scope for the runner's own poll loop
+RUNNER_SCOPE = "judges"
+
+
+class JudgeRunner:
+    """Runs many judges from one poll loop.
+
+    Register judges with ``@runner.judge(risk_name=...)`` and call
+    ``run()``. Each poll fetches the experiments list once and each
+    experiment's tests once, then hands every test to each registered risk
+    that still needs to evaluate it. A test's conversation is fetched once
+    however many risks evaluate it. All judges share one HTTP connection
+    pool, run on one pool of ``max_workers`` threads and submit their
+    results through one set of ``submit_workers`` threads.
+
+    The shared test list relies on the server including each test's risk
+    evaluations; without them the runner lists tests once per risk instead.
+    """
+
+    def __init__(
+        self,
+        control_plane_host: Optional[str] = CONTROL_PLANE_URL,
+        max_workers: Optional[int] = None,  # Threads shared by every judge
+        application_id: Optional[str] = None,
+        rate_limiter: Optional[RateLimiter] = None,  # Applies to every judge without its own
+        lease_backend: Optional[LeaseBackend] = None,  # Claims tests so replicas sharing an app don't duplicate work
+        journal: Optional[Journal] = None,  # Local record of in-flight work, so results survive a restart
+        metrics: Optional[Metrics] = None,  # Records counters and per-stage latencies, e.g. for Metrics.serve()
+        connect_timeout: Optional[float] = DEFAULT_CONNECT_TIMEOUT,  # Seconds to wait for a connection to the control plane
+        read_timeout: Optional[float] = DEFAULT_READ_TIMEOUT,  # Seconds to wait for a control plane response
+        gzip_requests: bool = False,  # Gzip large request bodies sent to the control plane
+        min_poll_interval: float = DEFAULT_MIN_POLL_INTERVAL,  # First backoff step in seconds once polls come back empty
+        max_poll_interval: float = DEFAULT_MAX_POLL_INTERVAL,  # Ceiling in seconds for the idle/failure backoff
+        max_failure_duration: Optional[float] = DEFAULT_MAX_FAILURE_DURATION,  # Give up after polls fail for this many seconds
+        discovery_concurrency: int = 8,  # Max concurrent test list and conversation fetches per poll
+        submit_workers: int = DEFAULT_SUBMIT_WORKERS,  # Threads submitting every judge's results; 0 submits from the workers
+        spill_path: Optional[str] = None,  # Directory for results that can't be submitted yet
+        drain_timeout: float = DEFAULT_DRAIN_TIMEOUT,  # Seconds, across all judges, to finish running tests and submissions on stop
+    ):
+        self.control_plane_host = control_plane_host
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+        self.application_id = application_id
+        self.rate_limiter = rate_limiter
+        self.lease_backend = lease_backend
+        self.journal = journal
+        self.metrics = metrics
+        self.stage_metrics = metrics if metrics is not None else NOOP_METRICS
+        self.discovery_concurrency = discovery_concurrency
+        self.submit_workers = submit_workers
+        self.spill_path = spill_path
+        self.drain_timeout = drain_timeout
+        # One connection per worker, discovery fetch and submitter, plus the poll loop's own
+        self.http_client = ControlPlaneClient(
+            control_plane_host,
+            pool_size=self.max_workers + discovery_concurrency + submit_workers + SUBMIT_CONCURRENCY + 1,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            gzip_requests=gzip_requests,
+        )
+        self.worker_pool = DaemonThreadPoolExecutor(self.max_workers, thread_name_prefix="judge")
+        self.worker_slots = threading.BoundedSemaphore(self.max_workers)
+        self.submission_pipeline = (
+            SubmissionPipeline(
+                self._submit,
+                on_success=lambda test_data: self._processor(test_data)._acknowledge(test_data),
+                on_failure=lambda test_data: self._processor(test_data)._release(test_data),
+                workers=submit_workers,
+                max_batch=RiskEvaluationProcessor.submit_batch_size,
+                spill_path=os.path.join(spill_path, "evaluations.jsonl") if spill_path else None,
+                encode=asdict,
+                decode=lambda result: JudgeResult(**result),
+            )
+            if submit_workers
+            else None
+        )
+        # Individual evaluation POSTs for every judge when bulk submission is unavailable
+        self.submit_executor = DaemonThreadPoolExecutor(SUBMIT_CONCURRENCY, thread_name_prefix="judge-submit")
+        self.poll_scheduler = PollScheduler(min_poll_interval, max_poll_interval, max_failure_duration)
+        # Unchanged lists come back as 304s and are served from the last response
+        self.snapshots = PollSnapshots()
+        # risk_name -> (processor, judge)
+        self.judges: Dict[str, Tuple[RiskEvaluationProcessor, Callable]] = {}
+        # None until the first test list tells us whether it includes risk evaluations
+        self.shared_listing_supported: Optional[bool] = None
+        self.conversations_fetched = 0
+
+    def judge(
+        self,
+        *,
+        risk_name: str,
+        rate_limiter: Optional[RateLimiter] = None,  # Overrides the runner's rate limiter for this judge
+        judge_cache: Optional[JudgeResultCache] = None,  # Reuse results for identical inputs until the judge's code changes
+        batch_size: Optional[int] = None,  # When set, fn receives lists of inputs and returns a list of JudgeResults
+        batch_wait_ms: float = DEFAULT_BATCH_WAIT_MS,  # Max time to wait for a batch to fill once it has one test
+        executor: str = "thread",  # "process" runs the judge in a process pool, for CPU-bound judges
+        processes: Optional[int] = None,  # Size of the process pool; defaults to the CPU count
+        initializer: Optional[Callable] = None,  # Called once in each judge process, e.g. to load a model
+        initargs: tuple = (),  # Arguments for initializer
+    ) -> Callable:
+        """Register a judge for ``risk_name``; the function itself is returned unchanged"""
+        if risk_name in self.judges:
+            raise ValueError(f"A judge for risk {risk_name!r} is already registered")
+
+        def wrap(fn: Callable[[str, str], JudgeResult]) -> Callable[[str, str], JudgeResult]:
+            register_judge(fn)
+            processor = RiskEvaluationProcessor(
+                self.control_plane_host,
+                self.max_workers,
+                application_id=self.application_id,
+                http_client=self.http_client,
+                batch_size=batch_size,
+                batch_wait_ms=batch_wait_ms,
+                rate_limiter=rate_limiter or self.rate_limiter,
+                executor=executor,
+                processes=processes,
+                initializer=initializer,
+                initargs=initargs,
+                lease_backend=self.lease_backend,
+                journal=self.journal,
+                risk_name=risk_name,
+                judge_cache=judge_cache,
+                submit_workers=self.submit_workers,
+                metrics=self.metrics,
+                worker_pool=self.worker_pool,
+                worker_slots=self.worker_slots,
+                submission_pipeline=self.submission_pipeline,
+                submit_executor=self.submit_executor,
+            )
+            self.judges[risk_name] = (processor, fn)
+            return fn
+
+        return wrap
+
+    def _processor(self, test_data: dict) -> RiskEvaluationProcessor:
+        return self.judges[test_data["risk_name"]][0]
+
+    def _submit(self, submissions: List[Tuple[dict, JudgeResult]]) -> List[Optional[Exception]]:
+        """Send each judge's share of the results through that judge's processor"""
+        by_risk: Dict[str, List[int]] = {}
+        for index, (test_data, _) in enumerate(submissions):
+            by_risk.setdefault(test_data["risk_name"], []).append(index)
+        errors: List[Any] = [None] * len(submissions)
+        for risk_name, indexes in by_risk.items():
+            try:
+                risk_errors = self.judges[risk_name][0]._submit([submissions[index] for index in indexes])
+            except Exception as e:
+                risk_errors = [e] * len(indexes)
+            for index, error in zip(indexes, risk_errors):
+                errors[index] = error
+        return errors
+
+    def _list_tests(self, experiment_id: str, risks: List[str]) -> List[Tuple[dict, Set[str]]]:
+        """Tests in an experiment with a response, and which of ``risks`` still need to evaluate each"""
+        app_id = _get_app_id(self.application_id)
+        if self.shared_listing_supported is not False:
+            with self.stage_metrics.time(DISCOVER, RUNNER_SCOPE):
+                # Filtered here rather than by the server, so it can be fetched as deltas
+                tests, _ = self.snapshots.get_json(
+                    self.http_client,
+                    f"/api/experiments/{experiment_id}/tests?appId={app_id}&include-risk-evaluations=true",
+                    merge_by="id",
+                )
+            if all("risk_evaluations" in test for test in tests):
+                if tests:
+                    self.shared_listing_supported = True
+                pending = []
+                for test in tests:
+                    if test.get("response") is None:
+                        continue
+                    evaluated = {
+                        evaluation.get("risk_type") or evaluation.get("risk_name")
+                        for evaluation in test["risk_evaluations"] or []
+                    }
+                    risks_left = set(risks) - evaluated
+                    if risks_left:
+                        pending.append((test, risks_left))
+                return pending
+            LOGGER.info("Test list has no risk evaluations, listing tests once per risk")
+            self.shared_listing_supported = False
+
+        by_id: Dict[str, Tuple[dict, Set[str]]] = {}
+        for risk_name in risks:
+            with self.stage_metrics.time(DISCOVER, RUNNER_SCOPE):
+                tests, _ = self.snapshots.get_json(
+                    self.http_client,
+                    f"/api/experiments/{experiment_id}/tests?appId={app_id}&unevaluated-risk={quote_plus(risk_name)}&include-risk-evaluations=true",
+                )
+            for test in tests:
+                if test.get("response") is not None:
+                    by_id.setdefault(test["id"], (test, set()))[1].add(risk_name)
+        return list(by_id.values())
+
+    def _enqueue(self, experiment_id: str, test: dict, risks: List[str]) -> int:
+        """Fetch a test's conversation once and queue it for each risk; returns how many were queued"""
+        test_id = test["id"]
+        try:
+            with self.stage_metrics.time(FETCH_HISTORY, RUNNER_SCOPE):
+                conversations = self._get_json(
+                    f"/api/experiments/{experiment_id}/tests/{test_id}/conversations?include-adaptability-messages=false"
+                )
+            self.conversations_fetched += 1
+            messages = conversations[0]["messages"]
+        except Exception:
+            # Let the next poll pick the test up again
+            for risk_name in risks:
+                self.judges[risk_name][0].queued_tests.release(test_id)
+            raise
+        for risk_name in risks:
+            self.judges[risk_name][0].processing_queue.put(
+                {
+                    "experiment_id": experiment_id,
+                    "test_id": test_id,
+                    "user_message": test["prompt"],
+                    "bot_response": test["response"],
+                    "risk_name": risk_name,
+                    "messages": messages,
+                }
+            )
+        return len(risks)
+
+    def _get_json(self, path: str):
+        response = self.http_client.get(path)
+        if not response.ok:
+            raise HttpError(status_code=response.status_code, message=error_message(response))
+        return response.json()
+
+    def poll_once(self, discovery_executor: ThreadPoolExecutor) -> Tuple[int, Optional[Exception]]:
+        """One discovery pass over every experiment; returns (tests queued, last error)"""
+        poll_error = None
+        new_tests = 0
+        app_id = _get_app_id(self.application_id)
+        experiments, _ = self.snapshots.get_json(
+            self.http_client, f"/api/experiments?appId={app_id}&validationStatus=in%20progress"
+        )
+        LOGGER.info(f"=== Found {len(experiments)} experiments with validation in progress")
+
+        list_futures = {}
+        for experiment in experiments:
+            configured = experiment.get("source_data", {}).get("evaluation_configuration", {}).keys()
+            risks = [risk_name for risk_name in self.judges if risk_name in configured]
+            if risks:
+                list_futures[discovery_executor.submit(self._list_tests, experiment["id"], risks)] = experiment["id"]
+
+        enqueue_futures = []
+        for future in as_completed(list_futures):
+            experiment_id = list_futures[future]
+            try:
+                pending = future.result()
+            except Exception as e:
+                LOGGER.error(f"Error fetching tests: {e}")
+                poll_error = e
+                continue
+            for test, risks_left in pending:
+                risks = [
+                    risk_name
+                    for risk_name in risks_left
+                    if self.judges[risk_name][0].queued_tests.add(test["id"])
+                ]
+                if risks:
+                    enqueue_futures.append(discovery_executor.submit(self._enqueue, experiment_id, test, risks))
+        for future in as_completed(enqueue_futures):
+            try:
+                new_tests += future.result()
+            except Exception as e:
+                LOGGER.error(f"Error fetching conversations: {e}")
+                poll_error = e
+        return new_tests, poll_error
+
+    def run(self):
+        """Poll and evaluate until interrupted"""
+        if not self.judges:
+            raise ValueError("No judges registered")
+        install_sigterm_handler()
+        if self.submission_pipeline is not None:
+            self.stage_metrics.gauge("submissions_pending", RUNNER_SCOPE, self.submission_pipeline.pending)
+            # Started first, so results the journal replays have somewhere to go
+            self.submission_pipeline.start()
+        for processor, fn in self.judges.values():
+            processor.start_processing(fn)
+        discovery_executor = ThreadPoolExecutor(max_workers=self.discovery_concurrency)
+        try:
+            while True:
+                poll_started = time.monotonic()
+                snapshot_mark = self.snapshots.mark()
+                try:
+                    new_tests, poll_error = self.poll_once(discovery_executor)
+                except Exception as e:
+                    LOGGER.error(f"Error fetching experiments: {e}")
+                    new_tests, poll_error = 0, e
+                self.stage_metrics.observe(POLL, RUNNER_SCOPE, time.monotonic() - poll_started, error=poll_error is not None)
+                self.stage_metrics.increment("tests_queued", RUNNER_SCOPE, new_tests)
+                if poll_error is None and self.snapshots.record_poll(snapshot_mark):
+                    self.stage_metrics.increment("polls_unchanged", RUNNER_SCOPE)
+
+                if new_tests:
+                    self.poll_scheduler.record_work(new_tests)
+                elif poll_error is not None:
+                    self.poll_scheduler.record_failure()
+                    if self.poll_scheduler.should_give_up():
+                        raise poll_error
+                else:
+                    self.poll_scheduler.record_empty()
+                self.poll_scheduler.wait()
+        except HttpError as e:
+            if e.status_code == 401:
+                LOGGER.error("Unauthorized request. Please check that your API key is not expired and is set to the `GUARDRAILS_TOKEN` environment variable.")
+            elif e.status_code == 404:
+                LOGGER.error(e.message)
+            raise
+        finally:
+            discovery_executor.shutdown(wait=False)
+            self.stop()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop every judge within ``timeout`` seconds, ``drain_timeout`` by default, and release the shared pools"""
+        deadline = time.monotonic() + (self.drain_timeout if timeout is None else timeout)
+        processors = [processor for processor, _ in self.judges.values()]
+        # Stop every dispatcher first so no judge starts new work while
+        # another is still draining
+        for processor in processors:
+            processor.should_stop = True
+        drained = True
+        for processor in processors:
+            drained = processor.stop_processing(max(0.0, deadline - time.monotonic())) and drained
+        if self.submission_pipeline is not None:
+            self.submission_pipeline.close(max(0.0, deadline - time.monotonic()))
+        self.submit_executor.shutdown(wait=False, cancel_futures=True)
+        self.worker_pool.shutdown(wait=drained, cancel_futures=True)
+        self.http_client.close()
@@ -0,0 +1,212 @@
+import bisect
+import hashlib
+from logging import getLogger
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, List, Optional, Union
+
+from guardrails_simlab_client.env import _get_app_id
+from guardrails_simlab_client.http_client import OptionalEndpoint
+
+LOGGER = getLogger(__name__)
+
+# How long a claim stays valid if its owner disappears without releasing it
+DEFAULT_LEASE_SECONDS = 300.0
+
+
+def default_owner() -> str:
+    """Identifies this process among the replicas sharing an app"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class LeaseBackend:
+    """Decides which replica works on a test.
+
+    ``scope`` separates work on the same test: ``"response"`` for the
+    application's reply and the risk name for each judge. ``claim`` returns
+    False when another replica holds the test; ``complete`` and ``release``
+    end a claim after success or failure respectively.
+    """
+
+    def bind(self, http_client: Any, application_id: Optional[str]):
+        """Called by the processor with its control plane client"""
+
+    def claim(self, experiment_id: str, test_id: str, scope: str) -> bool:
+        raise NotImplementedError
+
+    def complete(self, experiment_id: str, test_id: str, scope: str):
+        pass
+
+    def release(self, experiment_id: str, test_id: str, scope: str):
+        pass
+
+
+class ServerLeaseBackend(LeaseBackend):
+    """Claims tests through the control plane.
+
+    Falls back to ``fallback`` (or to claiming everything) if the server
+    has no claim endpoint.
+    """
+
+    def __init__(
+        self,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        owner: Optional[str] = None,
+        fallback: Optional[LeaseBackend] = None,
+    ):
+        self.lease_seconds = lease_seconds
+        self.owner = owner or default_owner()
+        self.fallback = fallback
+        self.http_client = None
+        self.application_id = None
+        self.claims = OptionalEndpoint("Claim", "falling back to local coordination")
+
+    def bind(self, http_client: Any, application_id: Optional[str]):
+        self.http_client = http_client
+        self.application_id = application_id
+        if self.fallback is not None:
+            self.fallback.bind(http_client, application_id)
+
+    def _url(self, experiment_id: str, test_id: str) -> str:
+        return f"/api/experiments/{experiment_id}/tests/{test_id}/claim?appId={_get_app_id(self.application_id)}"
+
+    def claim(self, experiment_id: str, test_id: str, scope: str) -> bool:
+        if self.claims.supported is False:
+            return self._fallback_claim(experiment_id, test_id, scope)
+        response = self.http_client.post(
+            self._url(experiment_id, test_id),
+            json_body={"scope": scope, "owner": self.owner, "lease_seconds": self.lease_seconds},
+        )
+        if self.claims.unavailable(response.status_code):
+            return self._fallback_claim(experiment_id, test_id, scope)
+        if response.status_code == 409:
+            return False
+        if not response.ok:
+            raise Exception(f"Error claiming test {test_id}: {response.text}")
+        return True
+
+    def _fallback_claim(self, experiment_id: str, test_id: str, scope: str) -> bool:
+        return self.fallback.claim(experiment_id, test_id, scope) if self.fallback else True
+
+    def complete(self, experiment_id: str, test_id: str, scope: str):
+        # The submitted result ends the claim server-side
+        if self.claims.supported is False and self.fallback:
+            self.fallback.complete(experiment_id, test_id, scope)
+
+    def release(self, experiment_id: str, test_id: str, scope: str):
+        if self.claims.supported is False:
+            if self.fallback:
+                self.fallback.release(experiment_id, test_id, scope)
+            return
+        self.http_client.request(
+            "DELETE",
+            self._url(experiment_id, test_id),
+            json_body={"scope": scope, "owner": self.owner},
+        )
+
+
+class SQLiteLeaseBackend(LeaseBackend):
+    """Leases in a SQLite file shared by processes on one host.
+
+    A claim succeeds if the test is unleased, its lease expired, or this
+    owner already holds it. Completed tests keep their row for
+    ``lease_seconds`` so stale polls elsewhere don't pick them up again.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        owner: Optional[str] = None,
+    ):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.owner = owner or default_owner()
+        self._local = threading.local()
+        self._last_purge = 0.0
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS leases ("
+                "key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def _key(test_id: str, scope: str) -> str:
+        return f"{scope}:{test_id}"
+
+    def claim(self, experiment_id: str, test_id: str, scope: str) -> bool:
+        now = time.time()
+        connection = self._connection()
+        cursor = connection.execute(
+            "INSERT INTO leases (key, owner, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+            "WHERE leases.expires_at <= ? OR leases.owner = excluded.owner",
+            (self._key(test_id, scope), self.owner, now + self.lease_seconds, now),
+        )
+        if now - self._last_purge > self.lease_seconds:
+            self._last_purge = now
+            connection.execute("DELETE FROM leases WHERE expires_at <= ?", (now,))
+        return cursor.rowcount == 1
+
+    def complete(self, experiment_id: str, test_id: str, scope: str):
+        self._connection().execute(
+            "UPDATE leases SET expires_at = ? WHERE key = ? AND owner = ?",
+            (time.time() + self.lease_seconds, self._key(test_id, scope), self.owner),
+        )
+
+    def release(self, experiment_id: str, test_id: str, scope: str):
+        self._connection().execute(
+            "DELETE FROM leases WHERE key = ? AND owner = ?",
+            (self._key(test_id, scope), self.owner),
+        )
+
+
+class ConsistentHashSharding(LeaseBackend):
+    """Coordination-free split of tests across a known set of replicas.
+
+    Each test ID hashes onto a ring of ``virtual_nodes`` points per
+    replica; a replica only claims the tests that land on its own points.
+    Adding or removing a replica moves only its share of the tests.
+    ``replicas`` is either the list of replica names or a replica count,
+    in which case ``replica`` is this replica's index.
+    """
+
+    def __init__(
+        self,
+        replica: Union[str, int],
+        replicas: Union[List[str], int],
+        virtual_nodes: int = 64,
+    ):
+        names = [str(index) for index in range(replicas)] if isinstance(replicas, int) else list(replicas)
+        if str(replica) not in names:
+            raise ValueError(f"Replica {replica!r} is not one of {names}")
+        self.replica = str(replica)
+        ring = sorted(
+            (self._hash(f"{name}#{node}"), name) for name in names for node in range(virtual_nodes)
+        )
+        self._points = [point for point, _ in ring]
+        self._owners = [name for _, name in ring]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+    def owner_of(self, test_id: str) -> str:
+        index = bisect.bisect(self._points, self._hash(test_id)) % len(self._points)
+        return self._owners[index]
+
+    def claim(self, experiment_id: str, test_id: str, scope: str) -> bool:
+        return self.owner_of(test_id) == self.replica
@@ -0,0 +1,241 @@
+import bisect
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging import getLogger
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+LOGGER = getLogger(__name__)
+
+# Upper bounds in seconds, from a fast cache hit to a slow model call
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+DEFAULT_METRICS_PORT = 9464
+
+# Stages timed by the decorators and processors
+POLL = "poll"
+DISCOVER = "discover"
+FETCH_HISTORY = "fetch_history"
+FN = "fn"
+SUBMIT = "submit"
+QUEUE_WAIT = "queue_wait"
+# Streamed responses only: time to the first chunk, and to the last one
+FIRST_TOKEN = "first_token"
+GENERATION = "generation"
+
+# (stage, scope, seconds, error)
+Observer = Callable[[str, str, float, bool], None]
+
+
+class _Histogram:
+    def __init__(self, buckets: Sequence[float]):
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.errors = 0
+
+
+class _Timer:
+    def __init__(self, metrics: "Metrics", stage: str, scope: str):
+        self.metrics = metrics
+        self.stage = stage
+        self.scope = scope
+
+    def __enter__(self):
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.stage, self.scope, time.monotonic() - self.start, error=exc_type is not None)
+        return False
+
+
+class Metrics:
+    """Counters and latency histograms for each stage of the polling pipeline.
+
+    Every observation is labelled with its ``stage`` (poll, discover,
+    fetch_history, fn, submit, queue_wait, plus first_token and generation
+    for streamed responses) and ``scope`` (``"response"`` for the
+    application, the risk name for a judge), so one instance can be shared
+    by several decorators. Read them with ``snapshot``, scrape them
+    from ``serve`` in Prometheus text format, or pass ``callback`` to
+    receive each observation as it happens.
+    """
+
+    def __init__(
+        self,
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        callback: Optional[Observer] = None,
+        namespace: str = "simlab",
+    ):
+        self.buckets = tuple(sorted(buckets))
+        self.callback = callback
+        self.namespace = namespace
+        self._histograms: Dict[Tuple[str, str], _Histogram] = {}
+        self._counters: Dict[Tuple[str, str], float] = {}
+        self._gauges: Dict[Tuple[str, str], Callable[[], float]] = {}
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def observe(self, stage: str, scope: str, seconds: float, error: bool = False):
+        with self._lock:
+            histogram = self._histograms.get((stage, scope))
+            if histogram is None:
+                histogram = self._histograms[(stage, scope)] = _Histogram(self.buckets)
+            histogram.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            histogram.sum += seconds
+            histogram.count += 1
+            if error:
+                histogram.errors += 1
+        if self.callback is not None:
+            try:
+                self.callback(stage, scope, seconds, error)
+            except Exception as e:
+                LOGGER.error(f"Error in metrics callback: {e}")
+
+    def time(self, stage: str, scope: str) -> _Timer:
+        """Context manager that observes how long its block took; exceptions count as errors"""
+        return _Timer(self, stage, scope)
+
+    def increment(self, name: str, scope: str, amount: float = 1):
+        with self._lock:
+            self._counters[(name, scope)] = self._counters.get((name, scope), 0) + amount
+
+    def gauge(self, name: str, scope: str, read: Callable[[], float]):
+        """Report ``read()`` as the current value of ``name`` whenever metrics are collected"""
+        with self._lock:
+            self._gauges[(name, scope)] = read
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Current values as plain dicts keyed by (stage or name, scope)"""
+        with self._lock:
+            stages = {
+                key: {
+                    "count": histogram.count,
+                    "errors": histogram.errors,
+                    "sum": histogram.sum,
+                    "buckets": dict(zip(self.buckets + (float("inf"),), _cumulative(histogram.counts))),
+                }
+                for key, histogram in self._histograms.items()
+            }
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+        return {
+            "stages": stages,
+            "counters": counters,
+            "gauges": {key: _read_gauge(read) for key, read in gauges.items()},
+        }
+
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        prefix = self.namespace
+        lines = [
+            f"# HELP {prefix}_stage_seconds Time spent in each stage",
+            f"# TYPE {prefix}_stage_seconds histogram",
+        ]
+        for (stage, scope), values in sorted(snapshot["stages"].items()):
+            labels = f'stage="{_escape(stage)}",scope="{_escape(scope)}"'
+            for bound, count in values["buckets"].items():
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{prefix}_stage_seconds_bucket{{{labels},le="{le}"}} {count}')
+            lines.append(f"{prefix}_stage_seconds_sum{{{labels}}} {values['sum']}")
+            lines.append(f"{prefix}_stage_seconds_count{{{labels}}} {values['count']}")
+        lines.append(f"# HELP {prefix}_stage_errors_total Stage runs that failed")
+        lines.append(f"# TYPE {prefix}_stage_errors_total counter")
+        for (stage, scope), values in sorted(snapshot["stages"].items()):
+            lines.append(
+                f'{prefix}_stage_errors_total{{stage="{_escape(stage)}",scope="{_escape(scope)}"}} {values["errors"]}'
+            )
+        lines.extend(_render_family(f"{prefix}_", "_total", "counter", snapshot["counters"]))
+        lines.extend(_render_family(f"{prefix}_", "", "gauge", snapshot["gauges"]))
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int = DEFAULT_METRICS_PORT, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """Serve ``/metrics`` from a background thread until ``close`` is called"""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                LOGGER.debug(format % args)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="metrics", daemon=True).start()
+        LOGGER.info(f"Serving metrics on http://{host}:{self._server.server_port}/metrics")
+        return self._server
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class NoopMetrics:
+    """Stands in for Metrics when none is configured, so timing costs next to nothing"""
+
+    class _NoopTimer:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, exc_type, exc, tb):
+            return False
+
+    _timer = _NoopTimer()
+
+    def observe(self, stage: str, scope: str, seconds: float, error: bool = False):
+        pass
+
+    def time(self, stage: str, scope: str) -> "_NoopTimer":
+        return self._timer
+
+    def increment(self, name: str, scope: str, amount: float = 1):
+        pass
+
+    def gauge(self, name: str, scope: str, read: Callable[[], float]):
+        pass
+
+
+NOOP_METRICS = NoopMetrics()
+
+
+def _cumulative(counts: List[int]) -> List[int]:
+    total = 0
+    cumulative = []
+    for count in counts:
+        total += count
+        cumulative.append(total)
+    return cumulative
+
+
+def _read_gauge(read: Callable[[], float]) -> float:
+    try:
+        return read()
+    except Exception as e:
+        LOGGER.debug(f"Error reading gauge: {e}")
+        return float("nan")
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _render_family(prefix: str, suffix: str, kind: str, values: Dict[Tuple[str, str], float]) -> List[str]:
+    lines = []
+    for name in sorted({name for name, _ in values}):
+        lines.append(f"# TYPE {prefix}{name}{suffix} {kind}")
+        for (value_name, scope), value in sorted(values.items()):
+            if value_name == name:
+                lines.append(f'{prefix}{name}{suffix}{{scope="{_escape(scope)}"}} {value}')
+    return lines
@@ -0,0 +1,99 @@
+import asyncio
+from logging import getLogger
+import random
+import threading
+import time
+from typing import Optional
+
+LOGGER = getLogger(__name__)
+
+DEFAULT_MIN_POLL_INTERVAL = 1.0
+DEFAULT_MAX_POLL_INTERVAL = 30.0
+# How long polls may fail back to back before the loop gives up
+DEFAULT_MAX_FAILURE_DURATION = 120.0
+
+
+class PollScheduler:
+    """Decides how long a poll loop waits before its next poll.
+
+    Polls again right away while new tests keep arriving. Each empty poll
+    doubles the wait from ``min_interval`` up to ``max_interval``, and each
+    failed poll does the same from the failure count, so an idle or
+    unhealthy control plane sees fewer requests. Waits are jittered so
+    replicas started together do not poll in lockstep.
+    """
+
+    def __init__(
+        self,
+        min_interval: float = DEFAULT_MIN_POLL_INTERVAL,
+        max_interval: float = DEFAULT_MAX_POLL_INTERVAL,
+        max_failure_duration: Optional[float] = DEFAULT_MAX_FAILURE_DURATION,
+    ):
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.max_failure_duration = max_failure_duration
+        self.current_interval = 0.0
+        # Consecutive polls that found nothing new
+        self.empty_polls = 0
+        self.total_empty_polls = 0
+        self.consecutive_failures = 0
+        self._failing_since: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _backoff(self, attempt: int) -> float:
+        return min(self.max_interval, self.min_interval * (2 ** max(attempt - 1, 0)))
+
+    def record_work(self, count: int = 1):
+        """A poll found new tests: poll again immediately"""
+        with self._lock:
+            self.empty_polls = 0
+            self.consecutive_failures = 0
+            self._failing_since = None
+            self.current_interval = 0.0
+
+    def record_empty(self):
+        """A poll succeeded but found nothing new"""
+        with self._lock:
+            self.empty_polls += 1
+            self.total_empty_polls += 1
+            self.consecutive_failures = 0
+            self._failing_since = None
+            self.current_interval = self._backoff(self.empty_polls)
+
+    def record_failure(self):
+        """A poll failed"""
+        with self._lock:
+            self.consecutive_failures += 1
+            if self._failing_since is None:
+                self._failing_since = time.monotonic()
+            self.current_interval = self._backoff(self.consecutive_failures)
+
+    def should_give_up(self) -> bool:
+        """True once polls have been failing for longer than max_failure_duration"""
+        with self._lock:
+            if self.max_failure_duration is None or self._failing_since is None:
+                return False
+            return time.monotonic() - self._failing_since > self.max_failure_duration
+
+    def next_delay(self) -> float:
+        """Seconds to wait before the next poll, with jitter applied"""
+        with self._lock:
+            interval = self.current_interval
+        if interval <= 0:
+            return 0.0
+        # Equal jitter: wait somewhere between half and all of the interval
+        return interval / 2 + random.uniform(0, interval / 2)
+
+    def wait(self):
+        """Sleep until the next poll is due"""
+        delay = self.next_delay()
+        if delay > 0:
+            LOGGER.info(f"=== Sleeping for {delay:.1f} seconds")
+            time.sleep(delay)
+
+    async def wait_async(self):
+        """Sleep on the event loop until the next poll is due"""
+        delay = self.next_delay()
+        if delay > 0:
+            LOGGER.info(f"=== Sleeping for {delay:.1f} seconds")
+            await asyncio.sleep(delay)
@@ -0,0 +1,91 @@
+import asyncio
+from logging import getLogger
+from typing import Any, Awaitable, Callable, Optional, Set
+
+from guardrails_simlab_client.dedup import ExpiringDedupSet
+from guardrails_simlab_client.http_client import (
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_READ_TIMEOUT,
+    AsyncControlPlaneClient,
+)
+
+LOGGER = getLogger(__name__)
+
+DEFAULT_MAX_CONCURRENCY = 256
+
+
+class AsyncBaseProcessor:
+    """Queue and dispatcher shared by the asyncio processors.
+
+    Everything runs on the caller's event loop: a single dispatcher task
+    pulls items off ``processing_queue`` and runs each one as its own task,
+    with a semaphore capping the number in flight at ``max_concurrency``.
+    """
+
+    def __init__(
+        self,
+        control_plane_host: str,
+        max_concurrency: Optional[int] = None,
+        connect_timeout: Optional[float] = DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: Optional[float] = DEFAULT_READ_TIMEOUT,
+        gzip_requests: bool = False,
+    ):
+        self.control_plane_host = control_plane_host
+        self.max_concurrency = max_concurrency or DEFAULT_MAX_CONCURRENCY
+        # Kept for parity with the sync processors, which size polls from it
+        self.max_workers = self.max_concurrency
+        self.queued_tests = ExpiringDedupSet()
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.gzip_requests = gzip_requests
+        # Loop-bound objects are created in start_processing, on the running loop
+        self.processing_queue: Optional[asyncio.Queue] = None
+        self.http_client: Optional[AsyncControlPlaneClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def start_processing(self, fn: Callable[..., Awaitable]):
+        """Start the dispatcher task on the running event loop"""
+        self.processing_queue = asyncio.Queue(maxsize=self.max_concurrency * 2)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        # One connection per in-flight item plus one for the poll loop
+        self.http_client = AsyncControlPlaneClient(
+            self.control_plane_host,
+            pool_size=self.max_concurrency + 1,
+            connect_timeout=self.connect_timeout,
+            read_timeout=self.read_timeout,
+            gzip_requests=self.gzip_requests,
+        )
+        self._dispatcher = asyncio.create_task(self._process_queue(fn))
+
+    async def stop_processing(self):
+        """Cancel the dispatcher, wait for in-flight items and close the client"""
+        if self._dispatcher:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+            self._dispatcher = None
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self.http_client:
+            await self.http_client.aclose()
+            self.http_client = None
+
+    async def _process_item(self, item: Any, fn: Callable[..., Awaitable]):
+        raise NotImplementedError
+
+    async def _run_item(self, item: Any, fn: Callable[..., Awaitable]):
+        try:
+            await self._process_item(item, fn)
+        finally:
+            self._semaphore.release()
+
+    async def _process_queue(self, fn: Callable[..., Awaitable]):
+        """Dispatcher task that starts one task per queued item"""
+        while True:
+            await self._semaphore.acquire()
+            item = await self.processing_queue.get()
+            task = asyncio.create_task(self._run_item(item, fn))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            self.processing_queue.task_done()
@@ -0,0 +1,68 @@
+from logging import getLogger
+from typing import Awaitable, Callable, Dict, Optional
+
+from guardrails_simlab_client.env import _get_app_id
+from guardrails_simlab_client.http_client import DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT
+from guardrails_simlab_client.processors.async_base_processor import AsyncBaseProcessor
+from guardrails_simlab_client.protocols import JudgeResult
+
+LOGGER = getLogger(__name__)
+
+
+class AsyncRiskEvaluationProcessor(AsyncBaseProcessor):
+    def __init__(
+        self,
+        control_plane_host: str,
+        max_concurrency: Optional[int] = None,
+        application_id: Optional[str] = None,
+        connect_timeout: Optional[float] = DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: Optional[float] = DEFAULT_READ_TIMEOUT,
+        gzip_requests: bool = False,
+    ):
+        super().__init__(
+            control_plane_host,
+            max_concurrency,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            gzip_requests=gzip_requests,
+        )
+        self.application_id = _get_app_id(application_id)
+
+    async def _process_item(self, test_data: Dict[str, str], fn: Callable[..., Awaitable[JudgeResult]]):
+        await self._evaluate_risk(test_data, fn)
+
+    async def _evaluate_risk(self, test_data: Dict[str, str], fn: Callable[..., Awaitable[JudgeResult]]):
+        try:
+            experiment_id = test_data["experiment_id"]
+            test_id = test_data["test_id"]
+            risk_name = test_data["risk_name"]
+
+            LOGGER.debug(
+                f"Evaluating risk for experiment_id: {experiment_id}, test_id: {test_id}"
+            )
+
+            judge_response: JudgeResult = await fn(
+                test_data["user_message"],
+                test_data["bot_response"],
+                test_data.get("messages", []),
+            )
+
+            LOGGER.debug(f"Risk evaluation result: {judge_response}")
+            risk_evaluation = await self.http_client.post(
+                f"/api/experiments/{experiment_id}/tests/{test_id}/evaluations?appId={_get_app_id(self.application_id)}",
+                json_body={
+                    "test_id": test_id,
+                    "judge_prompt": "",
+                    "judge_response": judge_response.justification,
+                    "risk_type": risk_name,
+                    "risk_triggered": judge_response.triggered,
+                },
+            )
+
+            if not risk_evaluation.is_success:
+                raise Exception(f"Error posting risk evaluation: {risk_evaluation.text}")
+            # Only forget the test once the server has the evaluation
+            self.queued_tests.acknowledge(test_id)
+        except Exception as e:
+            LOGGER.debug(f"Error evaluating risk: {e}")
+            self.queued_tests.retry_later(test_data["test_id"])
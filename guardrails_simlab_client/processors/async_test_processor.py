@@ -0,0 +1,111 @@
+import asyncio
+from dataclasses import asdict
+from logging import getLogger
+import time
+from typing import Awaitable, Callable, Optional
+
+from guardrails_simlab_client.dedup import ExpiringDedupSet
+from guardrails_simlab_client.env import _get_app_id
+from guardrails_simlab_client.history import ConversationHistoryResolver
+from guardrails_simlab_client.http_client import DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT
+from guardrails_simlab_client.processors.async_base_processor import AsyncBaseProcessor
+from guardrails_simlab_client.protocols import Report
+
+LOGGER = getLogger(__name__)
+
+
+class AsyncTestProcessor(AsyncBaseProcessor):
+    def __init__(
+        self,
+        control_plane_host: str,
+        max_concurrency: Optional[int] = None,
+        application_id: Optional[str] = None,
+        connect_timeout: Optional[float] = DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: Optional[float] = DEFAULT_READ_TIMEOUT,
+        gzip_requests: bool = False,
+    ):
+        super().__init__(
+            control_plane_host,
+            max_concurrency,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            gzip_requests=gzip_requests,
+        )
+        self.application_id = application_id
+        self.history_resolver = ConversationHistoryResolver()
+        self.queued_connection_tests = ExpiringDedupSet()
+
+    def submit_connection_test(self, test: dict, fn: Callable[..., Awaitable[str]]) -> bool:
+        """Run a pending connection test as its own task; returns False if it is already running"""
+        if not self.queued_connection_tests.add(test["id"]):
+            return False
+        # Not bound by the semaphore, so connection tests never wait behind experiment tests
+        task = asyncio.create_task(self._process_connection_test(test, fn))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    async def _process_connection_test(self, test: dict, fn: Callable[..., Awaitable[str]]):
+        app_id = _get_app_id(self.application_id)
+        url = f"/api/connection-tests/{test['id']}?appId={app_id}"
+        try:
+            response = await fn([{
+                "role": "user",
+                "content": test["prompt"]
+            }])
+            body = {
+                "response": response,
+                "status": "completed",
+                "executed_by": app_id,
+                "completed_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            }
+        except Exception as e:
+            LOGGER.info(f"Error processing connection test: {e}")
+            body = {
+                "status": "failed",
+                "executed_by": app_id,
+                "failed_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "error": str(e),
+            }
+        try:
+            patch_response = await self.http_client.patch(url, json_body=body)
+            if not patch_response.is_success:
+                raise Exception(patch_response.text)
+            self.queued_connection_tests.acknowledge(test["id"])
+        except Exception as e:
+            # Retried by a later poll once a backoff delay that grows with each failure has passed
+            delay = self.queued_connection_tests.retry_later(test["id"])
+            LOGGER.error(f"Error submitting connection test {test['id']}, retrying in {delay:.0f}s: {e}")
+
+    async def _process_item(self, test_data: dict, fn: Callable[..., Awaitable[str]]):
+        await self._process_test(test_data, fn)
+
+    async def _process_test(self, test_data: dict, fn: Callable[..., Awaitable[str]]):
+        """Process a single test"""
+        try:
+            message_history = await self.history_resolver.resolve_async(self.http_client, test_data)
+
+            response = await fn(message_history)
+
+            report = Report(
+                id=test_data["id"],
+                appId=_get_app_id(self.application_id),
+                prompt=test_data["prompt"],
+                response=response,
+                persona=test_data["persona"],
+            )
+
+            experiment_id = test_data["experiment_id"]
+            test_id = test_data["id"]
+
+            put_response = await self.http_client.put(
+                f"/api/experiments/{experiment_id}/tests/{test_id}?appId={_get_app_id(self.application_id)}",
+                json_body=asdict(report),
+            )
+            if not put_response.is_success:
+                raise Exception(f"Error submitting response: {put_response.text}")
+            # Only forget the test once the server has the result
+            self.queued_tests.acknowledge(test_id)
+        except Exception as e:
+            LOGGER.error(f"Error processing test {test_data['id']}: {e}")
+            self.queued_tests.retry_later(test_data["id"])
@@ -0,0 +1,456 @@
+from concurrent.futures import Executor, Future, wait
+from logging import getLogger
+import os
+from queue import Empty
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from guardrails_simlab_client.concurrency import AdaptiveConcurrencyLimiter
+from guardrails_simlab_client.dedup import ExpiringDedupSet
+from guardrails_simlab_client.http_client import (
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_READ_TIMEOUT,
+    ControlPlaneClient,
+)
+from guardrails_simlab_client.journal import SUBMITTED, Journal
+from guardrails_simlab_client.leases import LeaseBackend
+from guardrails_simlab_client.metrics import FN, NOOP_METRICS, QUEUE_WAIT, SUBMIT, Metrics
+from guardrails_simlab_client.rate_limiter import RateLimiter
+from guardrails_simlab_client.scheduling import FairScheduler
+from guardrails_simlab_client.shutdown import DEFAULT_DRAIN_TIMEOUT, DaemonThreadPoolExecutor
+from guardrails_simlab_client.submission import DEFAULT_SUBMIT_WORKERS, SubmissionPipeline
+
+LOGGER = getLogger(__name__)
+
+# How long the dispatcher blocks before re-checking should_stop
+DISPATCH_WAIT_SECONDS = 1.0
+DEFAULT_BATCH_WAIT_MS = 50.0
+
+
+class BaseProcessor:
+    """Queue and dispatcher shared by TestProcessor and RiskEvaluationProcessor.
+
+    The dispatcher blocks until both a worker slot and a queued item are
+    available, so at most ``max_workers`` items are in flight and the
+    bounded ``processing_queue`` pushes back on the poll loop.
+
+    With ``batch_size`` set, each worker slot instead takes up to
+    ``batch_size`` items, waiting at most ``batch_wait_ms`` after the first
+    one for the batch to fill, and hands them to ``_process_batch``.
+
+    Results are handed to a ``SubmissionPipeline`` with ``submit_workers``
+    threads of its own, which retries failed submissions and, with
+    ``spill_path`` set, writes them to disk rather than dropping them.
+    With ``submit_workers=0`` workers submit their own results.
+
+    Several processors can share one ``worker_pool`` and ``worker_slots``
+    semaphore, in which case ``max_workers`` in-flight items is a bound
+    across all of them, one ``http_client`` and one ``submission_pipeline``.
+    Shared resources are left open by ``stop_processing`` for their owner
+    to start and close.
+
+    ``stop_processing`` drains within ``drain_timeout`` seconds: queued
+    tests that never started are handed back at once, running tests get
+    until the deadline, and buffered submissions are flushed with the time
+    that is left.
+    """
+
+    # Results the submission pipeline sends per request
+    submit_batch_size = 1
+
+    def __init__(
+        self,
+        control_plane_host: str,
+        max_workers: Optional[int] = None,
+        throttle_time: Optional[float] = None,
+        http_client: Optional[ControlPlaneClient] = None,
+        connect_timeout: Optional[float] = DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: Optional[float] = DEFAULT_READ_TIMEOUT,
+        gzip_requests: bool = False,
+        poller_connections: int = 1,
+        batch_size: Optional[int] = None,
+        batch_wait_ms: float = DEFAULT_BATCH_WAIT_MS,
+        rate_limiter: Optional[RateLimiter] = None,
+        adaptive_concurrency: bool = False,
+        min_workers: int = 1,
+        lease_backend: Optional[LeaseBackend] = None,
+        journal: Optional[Journal] = None,
+        submit_workers: int = DEFAULT_SUBMIT_WORKERS,
+        spill_path: Optional[str] = None,
+        metrics: Optional[Metrics] = None,
+        worker_pool: Optional[Executor] = None,
+        worker_slots: Optional[threading.BoundedSemaphore] = None,
+        submission_pipeline: Optional[SubmissionPipeline] = None,
+        drain_timeout: float = DEFAULT_DRAIN_TIMEOUT,
+    ):
+        self.control_plane_host = control_plane_host
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+        self.batch_size = batch_size
+        self.batch_wait_ms = batch_wait_ms
+        self.metrics = metrics if metrics is not None else NOOP_METRICS
+        # Holds one extra round of work so workers never wait on the poller.
+        # Served round-robin across experiments, follow-up turns first
+        self.processing_queue = FairScheduler(
+            maxsize=self.max_workers * 2 * (batch_size or 1),
+            on_wait=self._observe_queue_wait if metrics is not None else None,
+        )
+        self.queued_tests = ExpiringDedupSet()
+        self.should_stop = False
+        self._owns_executor = worker_pool is None
+        # Daemon threads, so a call abandoned by a drain can't keep the process alive
+        self.executor = worker_pool or DaemonThreadPoolExecutor(self.max_workers)
+        self.processing_thread = None
+        self.throttle_time = throttle_time
+        if rate_limiter is None and throttle_time:
+            rate_limiter = RateLimiter(requests_per_second=1 / throttle_time, burst=1)
+        self.rate_limiter = rate_limiter
+        self._slots = worker_slots or threading.BoundedSemaphore(self.max_workers)
+        self.drain_timeout = drain_timeout
+        # Dispatched work -> the items it covers, so a drain can hand them back
+        self._in_flight: Dict[Future, List[Any]] = {}
+        self._in_flight_lock = threading.Lock()
+        # With adaptive concurrency, max_workers becomes the upper bound
+        self.concurrency_limiter = (
+            AdaptiveConcurrencyLimiter(min(min_workers, self.max_workers), self.max_workers)
+            if adaptive_concurrency
+            else None
+        )
+        # Coordinates with other replicas polling the same app
+        self.lease_backend = lease_backend
+        self.journal = journal
+        self._owns_submission_pipeline = submission_pipeline is None
+        self.submission_pipeline = submission_pipeline or (
+            SubmissionPipeline(
+                self._submit,
+                on_success=self._acknowledge,
+                on_failure=self._release,
+                workers=submit_workers,
+                max_batch=self.submit_batch_size,
+                spill_path=spill_path,
+                encode=self._encode_result,
+                decode=self._decode_result,
+            )
+            if submit_workers
+            else None
+        )
+        self._owns_http_client = http_client is None
+        # One connection per worker and submitter plus the poll loop's own
+        self.http_client = http_client or ControlPlaneClient(
+            control_plane_host,
+            pool_size=self.max_workers + poller_connections + submit_workers,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            gzip_requests=gzip_requests,
+        )
+
+    def start_processing(self, fn: Callable):
+        """Start the background processing thread"""
+        self.should_stop = False
+        self.metrics.gauge("queue_depth", self.journal_scope, self.processing_queue.qsize)
+        if self.submission_pipeline is not None and self._owns_submission_pipeline:
+            self.metrics.gauge("submissions_pending", self.journal_scope, self.submission_pipeline.pending)
+        if self.concurrency_limiter is not None:
+            self.metrics.gauge("concurrency_limit", self.journal_scope, lambda: self.concurrency_limiter.limit)
+        if self.lease_backend is not None:
+            self.lease_backend.bind(self.http_client, getattr(self, "application_id", None))
+        self.processing_thread = threading.Thread(
+            target=self._process_queue, args=(fn,), daemon=True
+        )
+        self.processing_thread.start()
+        if self.submission_pipeline is not None and self._owns_submission_pipeline:
+            self.submission_pipeline.start()
+        if self.journal is not None:
+            self._replay_journal()
+
+    def _replay_journal(self):
+        """Resubmit results that were stored but never accepted before the last shutdown"""
+        for entry in self.journal.pending(self.journal_scope):
+            if self.queued_tests.add(entry.test_id):
+                LOGGER.info(f"Resubmitting stored result for test {entry.test_id}")
+                self.executor.submit(self._replay, entry.item, entry.result)
+
+    def stop_processing(self, timeout: Optional[float] = None) -> bool:
+        """Stop taking work and drain within ``timeout`` seconds, ``drain_timeout`` by default.
+
+        Tests still queued are released so a later poll, here or on another
+        replica, picks them up right away. Tests still running at the
+        deadline are released too; their calls can't be interrupted and
+        finish in the background. Returns whether everything finished.
+        """
+        deadline = time.monotonic() + (self.drain_timeout if timeout is None else timeout)
+        self.should_stop = True
+        if self.processing_thread:
+            self.processing_thread.join()
+        released = self._release_queued()
+
+        with self._in_flight_lock:
+            in_flight = dict(self._in_flight)
+        for future, items in in_flight.items():
+            if future.cancel():
+                released += len(items)
+                for item in items:
+                    self._release_unstarted(item)
+        _, not_done = wait(in_flight, timeout=max(0.0, deadline - time.monotonic()))
+        for future in not_done:
+            for item in in_flight[future]:
+                LOGGER.warning(f"Test {self._lease_key(item)[1]} still running at shutdown, releasing it")
+                self._release(item)
+                released += 1
+        if released:
+            LOGGER.info(f"Released {released} unfinished tests")
+        if self._owns_executor:
+            self.executor.shutdown(wait=not not_done, cancel_futures=True)
+        if self.submission_pipeline is not None and self._owns_submission_pipeline:
+            self.submission_pipeline.close(max(0.0, deadline - time.monotonic()))
+        if self._owns_http_client:
+            self.http_client.close()
+        return not not_done
+
+    def _release_queued(self) -> int:
+        """Release every test still waiting in the queue"""
+        released = 0
+        while True:
+            try:
+                item = self.processing_queue.get_nowait()
+            except Empty:
+                return released
+            self.processing_queue.task_done()
+            self._release_unstarted(item)
+            released += 1
+
+    def _call(self, fn: Callable, *args: Any, test_id: Any = None) -> Any:
+        """Invoke the wrapped function once the rate limiter allows it.
+
+        ``test_id`` names the test the call is for, or for a batched fn the
+        list of tests in the order of its responses, so per-test timings can
+        be logged.
+        """
+        if self.rate_limiter is None:
+            return self._timed_call(fn, *args, test_id=test_id)
+        with self.rate_limiter.limit(*args):
+            return self._timed_call(fn, *args, test_id=test_id)
+
+    def _timed_call(self, fn: Callable, *args: Any, test_id: Any = None) -> Any:
+        start = time.monotonic()
+        try:
+            result = self._consume(fn(*args), start, test_id)
+        except Exception as e:
+            elapsed = time.monotonic() - start
+            self.metrics.observe(FN, self.journal_scope, elapsed, error=True)
+            if self.concurrency_limiter is not None:
+                self.concurrency_limiter.record(elapsed, e)
+            raise
+        elapsed = time.monotonic() - start
+        self.metrics.observe(FN, self.journal_scope, elapsed)
+        if self.concurrency_limiter is not None:
+            self.concurrency_limiter.record(elapsed)
+        return result
+
+    def _consume(self, result: Any, started: float, test_id: Any = None) -> Any:
+        """Turn what fn returned into a result; streamed results are read here, inside the timed call"""
+        return result
+
+    def _observe_queue_wait(self, seconds: float):
+        self.metrics.observe(QUEUE_WAIT, self.journal_scope, seconds)
+
+    def _process_item(self, item: Any, fn: Callable):
+        raise NotImplementedError
+
+    @property
+    def journal_scope(self) -> str:
+        """Journal scope of everything this processor works on"""
+        raise NotImplementedError
+
+    def _lease_key(self, item: Any) -> Tuple[str, str, str]:
+        """The (experiment_id, test_id, scope) an item does work for"""
+        raise NotImplementedError
+
+    def _replay(self, item: Any, result: Any):
+        """Submit a result stored in the journal without calling the wrapped function"""
+        raise NotImplementedError
+
+    def _send_results(self, submissions: List[Tuple[Any, Any]]) -> List[Optional[Exception]]:
+        """Submit (item, result) pairs; returns the error for each, or None if the server accepted it"""
+        raise NotImplementedError
+
+    def _submit(self, submissions: List[Tuple[Any, Any]]) -> List[Optional[Exception]]:
+        start = time.monotonic()
+        try:
+            errors = self._send_results(submissions)
+        except Exception:
+            self.metrics.observe(SUBMIT, self.journal_scope, time.monotonic() - start, error=True)
+            raise
+        failed = any(error is not None for error in errors)
+        self.metrics.observe(SUBMIT, self.journal_scope, time.monotonic() - start, error=failed)
+        return errors
+
+    def _encode_result(self, result: Any) -> Any:
+        """JSON-serializable form of a result, for the spill file"""
+        return result
+
+    def _decode_result(self, result: Any) -> Any:
+        return result
+
+    def _deliver(self, item: Any, result: Any):
+        """Hand a result to the submission pipeline, or submit it here without one"""
+        self._deliver_many([(item, result)])
+
+    def _deliver_many(self, submissions: List[Tuple[Any, Any]]):
+        if self.submission_pipeline is not None:
+            for item, result in submissions:
+                self.submission_pipeline.put(item, result)
+            return
+        try:
+            errors = self._submit(submissions)
+        except Exception as e:
+            errors = [e] * len(submissions)
+        for (item, _), error in zip(submissions, errors):
+            if error is None:
+                self._acknowledge(item)
+            else:
+                LOGGER.error(f"Error submitting result for test {self._lease_key(item)[1]}: {error}")
+                self._release(item)
+
+    def _claim(self, item: Any) -> bool:
+        """Claim an item for this replica; returns False if it should be skipped"""
+        if self.lease_backend is None and self.journal is None:
+            return True
+        experiment_id, test_id, scope = self._lease_key(item)
+        if self.lease_backend is not None:
+            try:
+                claimed = self.lease_backend.claim(experiment_id, test_id, scope)
+            except Exception as e:
+                # Nothing was claimed, so only hold the test back like any other failure
+                delay = self.queued_tests.retry_later(test_id)
+                LOGGER.error(f"Error claiming test {test_id}, retrying in {delay:.0f}s: {e}")
+                return False
+            if not claimed:
+                # Another replica has it; look again after the ack TTL in case that replica dies
+                LOGGER.debug(f"Test {test_id} is claimed by another replica")
+                self.queued_tests.acknowledge(test_id)
+                return False
+        if self.journal is not None:
+            entry = self.journal.get(scope, test_id)
+            if entry is not None and entry.state == SUBMITTED:
+                self.queued_tests.acknowledge(test_id)
+                return False
+            if entry is not None and entry.result is not None:
+                # Answered before, but the submission never went through
+                self._replay(item, entry.result)
+                return False
+            self.journal.claimed(experiment_id, test_id, scope)
+        return True
+
+    def _record_result(self, item: Any, result: Any):
+        """Store a result in the journal before submitting it"""
+        if self.journal is None:
+            return
+        experiment_id, test_id, scope = self._lease_key(item)
+        try:
+            self.journal.completed(experiment_id, test_id, scope, item, result)
+        except Exception as e:
+            LOGGER.error(f"Error journaling result for test {test_id}: {e}")
+
+    def _acknowledge(self, item: Any):
+        """The server has the result for an item"""
+        experiment_id, test_id, scope = self._lease_key(item)
+        self.queued_tests.acknowledge(test_id)
+        if self.journal is not None:
+            try:
+                self.journal.submitted(experiment_id, test_id, scope)
+            except Exception as e:
+                LOGGER.error(f"Error journaling submission for test {test_id}: {e}")
+        if self.lease_backend is not None:
+            try:
+                self.lease_backend.complete(experiment_id, test_id, scope)
+            except Exception as e:
+                LOGGER.error(f"Error completing lease for test {test_id}: {e}")
+
+    def _release(self, item: Any):
+        """Give up on an item so a later poll, here or on another replica, retries it"""
+        test_id = self._lease_key(item)[1]
+        # Held back here for a growing delay so a test that keeps failing isn't retried on every poll
+        delay = self.queued_tests.retry_later(test_id)
+        LOGGER.debug(f"Test {test_id} can be retried here in {delay:.1f}s")
+        self._release_claim(item)
+
+    def _release_unstarted(self, item: Any):
+        """Give back an item that never ran, so the next poll picks it up without a retry delay"""
+        self.queued_tests.release(self._lease_key(item)[1])
+        self._release_claim(item)
+
+    def _release_claim(self, item: Any):
+        experiment_id, test_id, scope = self._lease_key(item)
+        if self.journal is not None:
+            try:
+                self.journal.released(experiment_id, test_id, scope)
+            except Exception as e:
+                LOGGER.error(f"Error journaling release for test {test_id}: {e}")
+        if self.lease_backend is not None:
+            try:
+                self.lease_backend.release(experiment_id, test_id, scope)
+            except Exception as e:
+                LOGGER.error(f"Error releasing lease for test {test_id}: {e}")
+
+    def _process_batch(self, items: List[Any], fn: Callable):
+        raise NotImplementedError
+
+    def _fill_batch(self, first_item: Any) -> List[Any]:
+        """Collect up to batch_size items, waiting at most batch_wait_ms after the first"""
+        batch = [first_item]
+        deadline = time.monotonic() + self.batch_wait_ms / 1000
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.processing_queue.get(timeout=remaining))
+            except Empty:
+                break
+            self.processing_queue.task_done()
+        return batch
+
+    def _acquire_slot(self, timeout: float) -> bool:
+        if self.concurrency_limiter is not None:
+            return self.concurrency_limiter.acquire(timeout=timeout)
+        return self._slots.acquire(timeout=timeout)
+
+    def _finish(self, future: Future):
+        with self._in_flight_lock:
+            self._in_flight.pop(future, None)
+        self._release_slot()
+
+    def _release_slot(self, _future: Optional[Future] = None):
+        if self.concurrency_limiter is not None:
+            self.concurrency_limiter.release()
+        else:
+            self._slots.release()
+
+    def _process_queue(self, fn: Callable):
+        """Background thread that hands queued items to the worker pool"""
+        while not self.should_stop:
+            # Wait for a free worker before taking work off the queue so
+            # unstarted items stay visible to the poller as backpressure
+            if not self._acquire_slot(DISPATCH_WAIT_SECONDS):
+                continue
+            try:
+                item = self.processing_queue.get(timeout=DISPATCH_WAIT_SECONDS)
+            except Empty:
+                self._release_slot()
+                continue
+            try:
+                if self.batch_size:
+                    items = self._fill_batch(item)
+                    future = self.executor.submit(self._process_batch, items, fn)
+                else:
+                    items = [item]
+                    future = self.executor.submit(self._process_item, item, fn)
+                with self._in_flight_lock:
+                    self._in_flight[future] = items
+                future.add_done_callback(self._finish)
+            except Exception as e:
+                self._release_slot()
+                LOGGER.error(f"Error submitting test to thread pool: {e}")
+            finally:
+                self.processing_queue.task_done()
@@ -0,0 +1,138 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import importlib
+from logging import getLogger
+import os
+import signal
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from guardrails_simlab_client.protocols import JudgeResult
+
+LOGGER = getLogger(__name__)
+
+# (module, qualname) -> judge function, filled in when custom_judge decorates a
+# function. Child processes re-import the judge's module, which re-registers it,
+# so only the key has to cross the process boundary.
+_JUDGES: Dict[Tuple[str, str], Callable] = {}
+
+# The judge resolved by _init_worker in each pool process
+_worker_judge: Optional[Callable] = None
+
+
+def register_judge(fn: Callable):
+    """Make ``fn`` resolvable by name in judge pool processes"""
+    _JUDGES[(fn.__module__, fn.__qualname__)] = fn
+
+
+def _init_worker(
+    module: str,
+    qualname: str,
+    initializer: Optional[Callable],
+    initargs: tuple,
+):
+    global _worker_judge
+    # A forked worker inherits the parent's SIGTERM handler; it should just exit
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    if (module, qualname) not in _JUDGES:
+        importlib.import_module(module)
+    if (module, qualname) not in _JUDGES and module == "__main__":
+        # Under the spawn start method the script is re-imported as __mp_main__
+        module = "__mp_main__"
+    _worker_judge = _JUDGES[(module, qualname)]
+    # Runs once per process, e.g. to load a model used by every call
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def _encode(result: Any) -> Any:
+    # Plain tuples pickle smaller and faster than dataclass instances
+    if isinstance(result, JudgeResult):
+        return (result.triggered, result.justification, result.tags)
+    if isinstance(result, list):
+        return [_encode(item) for item in result]
+    return result
+
+
+def _decode(result: Any) -> Any:
+    if isinstance(result, tuple):
+        return JudgeResult(*result)
+    if isinstance(result, list):
+        return [_decode(item) for item in result]
+    return result
+
+
+def _run_judge(args: tuple) -> Any:
+    return _encode(_worker_judge(*args))
+
+
+class ProcessJudge:
+    """Calls a judge function in a pool of worker processes.
+
+    Calling an instance blocks the calling worker thread until a process
+    has evaluated the judge, so it slots in wherever the judge itself is
+    called and CPU-bound judges are no longer serialized by the GIL. The
+    pool is started on first use, and replaced if a worker process dies.
+    """
+
+    def __init__(
+        self,
+        fn: Callable,
+        processes: Optional[int] = None,
+        initializer: Optional[Callable] = None,
+        initargs: tuple = (),
+    ):
+        if "<locals>" in fn.__qualname__ or fn.__name__ == "<lambda>":
+            raise ValueError("executor='process' needs a judge defined at module level")
+        register_judge(fn)
+        self.fn = fn
+        self.processes = processes or os.cpu_count() or 1
+        self.initializer = initializer
+        self.initargs = initargs
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("The judge pool is closed")
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    initializer=_init_worker,
+                    initargs=(self.fn.__module__, self.fn.__qualname__, self.initializer, self.initargs),
+                )
+            return self._pool
+
+    def __call__(self, *args: Any) -> Any:
+        pool = self._get_pool()
+        try:
+            return _decode(pool.submit(_run_judge, args).result())
+        except BrokenProcessPool:
+            # A worker died (OOM, crash); start a fresh pool and retry once, so
+            # one bad process doesn't fail every later call
+            self._discard(pool)
+            return _decode(self._get_pool().submit(_run_judge, args).result())
+
+    def _discard(self, pool: ProcessPoolExecutor):
+        with self._lock:
+            # Calls that failed together on the same pool replace it only once
+            if self._pool is pool:
+                LOGGER.warning("A judge process died; restarting the judge pool")
+                pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def close(self, wait: bool = True):
+        """Shut the pool down; with ``wait=False`` processes still running a judge call are terminated"""
+        with self._lock:
+            self._closed = True
+            if self._pool is not None:
+                pool, self._pool = self._pool, None
+                # Snapshot first: shutdown forgets the processes once it is done with them
+                processes = list((getattr(pool, "_processes", None) or {}).values())
+                pool.shutdown(wait=wait, cancel_futures=True)
+                if not wait:
+                    # The pool's exit hook would otherwise wait for a hung call
+                    for process in processes:
+                        process.kill()
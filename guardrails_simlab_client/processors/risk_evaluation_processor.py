@@ -1,76 +1,217 @@
-from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
 from logging import getLogger
-import os
-from queue import Queue
+from concurrent.futures import Executor
 import threading
-import time
-from typing import Callable, Dict, Optional
+from typing import Callable, Dict, List, Optional, Tuple
 
-import requests
+from guardrails_simlab_client.caching import JudgeResultCache
 from guardrails_simlab_client.env import _get_api_key, _get_app_id
+from guardrails_simlab_client.http_client import (
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_READ_TIMEOUT,
+    ControlPlaneClient,
+    OptionalEndpoint,
+)
+from guardrails_simlab_client.processors.base_processor import DEFAULT_BATCH_WAIT_MS, BaseProcessor
+from guardrails_simlab_client.processors.process_judge import ProcessJudge
+from guardrails_simlab_client.journal import Journal
+from guardrails_simlab_client.leases import LeaseBackend
+from guardrails_simlab_client.metrics import Metrics
+from guardrails_simlab_client.rate_limiter import RateLimiter
 from guardrails_simlab_client.protocols import JudgeResult
+from guardrails_simlab_client.submission import DEFAULT_SUBMIT_WORKERS, SubmissionPipeline
+from guardrails_simlab_client.shutdown import DEFAULT_DRAIN_TIMEOUT, DaemonThreadPoolExecutor
 
 
 LOGGER = getLogger(__name__)
 
+# Concurrent individual POSTs per batch when bulk submission is unavailable
+SUBMIT_CONCURRENCY = 4
+
+
+class RiskEvaluationProcessor(BaseProcessor):
+    # Evaluations that finish close together are posted in one bulk request
+    submit_batch_size = 64
 
-class RiskEvaluationProcessor:
     def __init__(
         self,
         control_plane_host: str,
         max_workers: Optional[int] = None,
         application_id: Optional[str] = None,
         throttle_time: Optional[float] = None,
+        http_client: Optional[ControlPlaneClient] = None,
+        connect_timeout: Optional[float] = DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: Optional[float] = DEFAULT_READ_TIMEOUT,
+        gzip_requests: bool = False,
+        poller_connections: int = 1,
+        batch_size: Optional[int] = None,
+        batch_wait_ms: float = DEFAULT_BATCH_WAIT_MS,
+        rate_limiter: Optional[RateLimiter] = None,
+        adaptive_concurrency: bool = False,
+        min_workers: int = 1,
+        executor: str = "thread",
+        processes: Optional[int] = None,
+        initializer: Optional[Callable] = None,
+        initargs: tuple = (),
+        lease_backend: Optional[LeaseBackend] = None,
+        journal: Optional[Journal] = None,
+        risk_name: Optional[str] = None,
+        judge_cache: Optional[JudgeResultCache] = None,
+        submit_workers: int = DEFAULT_SUBMIT_WORKERS,
+        spill_path: Optional[str] = None,
+        metrics: Optional[Metrics] = None,
+        worker_pool: Optional[Executor] = None,
+        worker_slots: Optional[threading.BoundedSemaphore] = None,
+        submission_pipeline: Optional[SubmissionPipeline] = None,
+        submit_executor: Optional[Executor] = None,
+        drain_timeout: float = DEFAULT_DRAIN_TIMEOUT,
     ):
-        self.control_plane_host = control_plane_host
-        self.processing_queue = Queue()
-        self.queued_tests: Dict[str, bool] = {}
-        self.should_stop = False
-        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
-        self.executor = ThreadPoolExecutor(max_workers=max_workers)
-        self.processing_thread = None
+        if executor not in ("thread", "process"):
+            raise ValueError(f"executor must be 'thread' or 'process', got {executor!r}")
+        super().__init__(
+            control_plane_host,
+            max_workers,
+            throttle_time=throttle_time,
+            http_client=http_client,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            gzip_requests=gzip_requests,
+            poller_connections=poller_connections + (SUBMIT_CONCURRENCY if batch_size or submit_workers else 0),
+            batch_size=batch_size,
+            batch_wait_ms=batch_wait_ms,
+            rate_limiter=rate_limiter,
+            adaptive_concurrency=adaptive_concurrency,
+            min_workers=min_workers,
+            lease_backend=lease_backend,
+            journal=journal,
+            submit_workers=submit_workers,
+            spill_path=spill_path,
+            metrics=metrics,
+            worker_pool=worker_pool,
+            worker_slots=worker_slots,
+            submission_pipeline=submission_pipeline,
+            drain_timeout=drain_timeout,
+        )
+        self.risk_name = risk_name
+        self.judge_cache = judge_cache
+        self._judge_version: Optional[str] = None
         self.application_id = _get_app_id(application_id)
         self.api_key = _get_api_key()
-        self.throttle_time = throttle_time
+        self.bulk_evaluations = OptionalEndpoint("Bulk evaluations", "posting evaluations individually")
+        # Sends individual POSTs when bulk submission is unavailable; may be shared with other judges
+        self._owns_submit_executor = submit_executor is None
+        self._submit_executor = submit_executor or DaemonThreadPoolExecutor(SUBMIT_CONCURRENCY, thread_name_prefix="judge-submit")
+        self.executor_kind = executor
+        self.processes = processes
+        self.initializer = initializer
+        self.initargs = initargs
+        self.process_judge: Optional[ProcessJudge] = None
 
-    def start_processing(self, fn: Callable[[str, str], JudgeResult]):
+    def start_processing(self, fn: Callable):
         """Start the background processing thread"""
-        self.should_stop = False
-        self.processing_thread = threading.Thread(
-            target=self._process_queue, args=(fn,), daemon=True
+        if self.judge_cache is not None:
+            self._judge_version = self.judge_cache.version_for(fn)
+        if self.executor_kind == "process":
+            # Worker threads still dispatch and submit; only the judge runs in the pool
+            self.process_judge = ProcessJudge(fn, self.processes, self.initializer, self.initargs)
+            fn = self.process_judge
+        super().start_processing(fn)
+
+    def stop_processing(self, timeout: Optional[float] = None) -> bool:
+        drained = super().stop_processing(timeout)
+        if self._owns_submit_executor:
+            # Submissions were flushed or spilled within the deadline; a POST still hung is abandoned
+            self._submit_executor.shutdown(wait=False, cancel_futures=True)
+        if self.process_judge is not None:
+            self.process_judge.close(wait=drained)
+        return drained
+
+    def _process_item(self, test_data: Dict[str, str], fn: Callable[[str, str], JudgeResult]):
+        self._evaluate_risk(test_data, fn)
+
+    @property
+    def journal_scope(self) -> str:
+        return self.risk_name
+
+    def _lease_key(self, test_data: Dict[str, str]):
+        return test_data["experiment_id"], test_data["test_id"], test_data["risk_name"]
+
+    def _replay(self, test_data: Dict[str, str], result: Dict):
+        self._deliver(test_data, JudgeResult(**result))
+
+    def _encode_result(self, result: JudgeResult) -> Dict:
+        return asdict(result)
+
+    def _decode_result(self, result: Dict) -> JudgeResult:
+        return JudgeResult(**result)
+
+    def _judge_key(self, test_data: Dict[str, str]) -> str:
+        return self.judge_cache.judge_key(
+            self._judge_version,
+            test_data["risk_name"],
+            test_data["user_message"],
+            test_data["bot_response"],
+            test_data.get("messages", []),
         )
-        self.processing_thread.start()
-
-    def stop_processing(self):
-        """Stop the background processing thread and cleanup"""
-        self.should_stop = True
-        if self.processing_thread:
-            self.processing_thread.join()
-        self.executor.shutdown(wait=True)
-
-    def _process_queue(self, fn: Callable[[str, str], JudgeResult]):
-        """Background thread that manages concurrent test processing"""
-        while not self.should_stop:
-            try:
-                if self.processing_queue.empty():
-                    continue
-                test_data = self.processing_queue.get(timeout=1)
-                # Submit the test processing to the thread pool
-                self.executor.submit(self._evaluate_risk, test_data, fn)
-                self.processing_queue.task_done()
-                if self.throttle_time is not None:
-                    time.sleep(self.throttle_time)
-            except Exception as e:
-                LOGGER.debug(f"Error submitting test to thread pool: {e}")
+
+    def _judge(self, fn: Callable[[str, str], JudgeResult], test_data: Dict[str, str]) -> JudgeResult:
+        """Call the judge, or reuse its result for an identical conversation"""
+        args = (test_data["user_message"], test_data["bot_response"], test_data.get("messages", []))
+        if self.judge_cache is None:
+            return self._call(fn, *args)
+        # Cached as dicts so the disk tier can store them
+        result = self.judge_cache.get_or_compute(
+            self._judge_key(test_data), lambda: asdict(self._call(fn, *args))
+        )
+        return JudgeResult(**result)
+
+    def _call_batch_judge(self, fn: Callable[..., List[JudgeResult]], batch: List[Dict[str, str]]) -> list:
+        judge_responses = self._call(
+            fn,
+            [test_data["user_message"] for test_data in batch],
+            [test_data["bot_response"] for test_data in batch],
+            [test_data.get("messages", []) for test_data in batch],
+        )
+        if len(judge_responses) != len(batch):
+            raise Exception(f"Expected {len(batch)} results from batch judge, got {len(judge_responses)}")
+        return judge_responses
+
+    def _judge_batch(self, fn: Callable[..., List[JudgeResult]], batch: List[Dict[str, str]]) -> list:
+        """Call the judge once for the tests in a batch that aren't cached"""
+        if self.judge_cache is None:
+            return self._call_batch_judge(fn, batch)
+
+        results = [None] * len(batch)
+        # key -> positions in the batch; identical inputs are only judged once
+        misses: Dict[str, List[int]] = {}
+        for index, test_data in enumerate(batch):
+            key = self._judge_key(test_data)
+            if key in misses:
+                misses[key].append(index)
+                continue
+            cached = self.judge_cache.get(key)
+            if cached is None:
+                misses[key] = [index]
+            else:
+                results[index] = JudgeResult(**cached)
+        if not misses:
+            return results
+        judge_responses = self._call_batch_judge(fn, [batch[indexes[0]] for indexes in misses.values()])
+        for (key, indexes), judge_response in zip(misses.items(), judge_responses):
+            for index in indexes:
+                results[index] = judge_response
+            if isinstance(judge_response, JudgeResult):
+                self.judge_cache.put(key, asdict(judge_response))
+        return results
 
     def _evaluate_risk(self, test_data: Dict[str, str], fn: Callable[[str, str], JudgeResult]):
+        if not self._claim(test_data):
+            return
         try:
             experiment_id = test_data["experiment_id"]
             test_id = test_data["test_id"]
             user_message = test_data["user_message"]
             bot_response = test_data["bot_response"]
-            risk_name = test_data["risk_name"]
-            messages = test_data.get("messages", [])
 
             LOGGER.debug(
                 f"Evaluating risk for experiment_id: {experiment_id}, test_id: {test_id}"
@@ -78,31 +219,114 @@ class RiskEvaluationProcessor:
             LOGGER.debug(f"user_message: {user_message}, bot_response: {bot_response}")
 
             # Call the Judge function
-            judge_response: JudgeResult = fn(
-                user_message,
-                bot_response,
-                messages,
-            )
+            judge_response = self._judge(fn, test_data)
 
             LOGGER.debug(f"Risk evaluation result: {judge_response}")
-            # Post a Risk Evaluation
-            risk_evaluation = requests.post(
-                    f"{self.control_plane_host}/api/experiments/{experiment_id}/tests/{test_id}/evaluations?appId={_get_app_id(self.application_id)}",
-                    json={
-                        "test_id": test_id,
-                        "judge_prompt": "", # does this need to be set?
-                        "judge_response": judge_response.justification,
-                        "risk_type": risk_name,
-                        "risk_triggered": judge_response.triggered,
-                        },
-                    headers={"x-api-key": _get_api_key()},
-                )
-        
-            if not risk_evaluation.ok:
-                LOGGER.debug("Error posting risk evaluation", risk_evaluation.text)
-                raise Exception("Error posting risk evaluation, task is not healthy")
-            
-            LOGGER.debug(f"Risk evaluation POST response: {risk_evaluation.json()}")
+            if self.journal is not None:
+                self._record_result(test_data, asdict(judge_response))
+            # Returns as soon as the result is queued for submission
+            self._deliver(test_data, judge_response)
         except Exception as e:
             LOGGER.debug(f"Error evaluating risk: {e}")
-        pass
+            self._release(test_data)
+
+    def _process_batch(self, batch: List[Dict[str, str]], fn: Callable[..., List[JudgeResult]]):
+        """Evaluate a batch of tests with one call to the judge and submit the results together"""
+        batch = [test_data for test_data in batch if self._claim(test_data)]
+        if not batch:
+            return
+        try:
+            judge_responses = self._judge_batch(fn, batch)
+        except Exception as e:
+            LOGGER.debug(f"Error evaluating risk batch: {e}")
+            for test_data in batch:
+                self._release(test_data)
+            return
+
+        results = []
+        # A failed item only fails its own test
+        for test_data, judge_response in zip(batch, judge_responses):
+            if isinstance(judge_response, Exception):
+                LOGGER.debug(f"Error evaluating risk for test {test_data['test_id']}: {judge_response}")
+                self._release(test_data)
+            else:
+                if self.journal is not None:
+                    self._record_result(test_data, asdict(judge_response))
+                results.append((test_data, judge_response))
+        self._deliver_many(results)
+
+    @staticmethod
+    def _evaluation_payload(test_data: Dict[str, str], judge_response: JudgeResult) -> Dict:
+        return {
+            "test_id": test_data["test_id"],
+            "judge_prompt": "", # does this need to be set?
+            "judge_response": judge_response.justification,
+            "risk_type": test_data["risk_name"],
+            "risk_triggered": judge_response.triggered,
+        }
+
+    def _post_evaluation(self, test_data: Dict[str, str], judge_response: JudgeResult):
+        """Post a single Risk Evaluation"""
+        experiment_id = test_data["experiment_id"]
+        test_id = test_data["test_id"]
+        risk_evaluation = self.http_client.post(
+            f"/api/experiments/{experiment_id}/tests/{test_id}/evaluations?appId={_get_app_id(self.application_id)}",
+            json_body=self._evaluation_payload(test_data, judge_response),
+        )
+
+        if not risk_evaluation.ok:
+            LOGGER.debug(f"Error posting risk evaluation: {risk_evaluation.text}")
+            raise Exception("Error posting risk evaluation, task is not healthy")
+
+        LOGGER.debug(f"Risk evaluation POST response: {risk_evaluation.json()}")
+
+    def _post_evaluations(self, results: List[Tuple[Dict[str, str], JudgeResult]]) -> List[Optional[Exception]]:
+        """Post many Risk Evaluations, in one request per experiment when the server allows it.
+
+        Returns the error for each result, or None if the server accepted it.
+        """
+        errors: List[Optional[Exception]] = [None] * len(results)
+        # experiment_id -> positions in results
+        by_experiment: Dict[str, List[int]] = {}
+        for index, (test_data, _) in enumerate(results):
+            by_experiment.setdefault(test_data["experiment_id"], []).append(index)
+
+        remaining = []
+        for experiment_id, indexes in by_experiment.items():
+            if self.bulk_evaluations.supported is False or len(indexes) == 1:
+                remaining.extend(indexes)
+                continue
+            try:
+                bulk_response = self.http_client.post(
+                    f"/api/experiments/{experiment_id}/evaluations/bulk?appId={_get_app_id(self.application_id)}",
+                    json_body={
+                        "evaluations": [self._evaluation_payload(*results[index]) for index in indexes]
+                    },
+                )
+                if self.bulk_evaluations.unavailable(bulk_response.status_code):
+                    remaining.extend(indexes)
+                    continue
+                if not bulk_response.ok:
+                    raise Exception(f"Error posting bulk risk evaluations: {bulk_response.text}")
+            except Exception as e:
+                LOGGER.debug(f"{e}; posting evaluations individually")
+                remaining.extend(indexes)
+
+        if len(remaining) == 1:
+            try:
+                self._post_evaluation(*results[remaining[0]])
+            except Exception as e:
+                errors[remaining[0]] = e
+            return errors
+
+        # Fall back to individual POSTs, issued concurrently over the shared pool
+        futures = {index: self._submit_executor.submit(self._post_evaluation, *results[index]) for index in remaining}
+        for index, future in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                errors[index] = e
+        return errors
+
+    def _send_results(self, submissions: List[Tuple[Dict[str, str], JudgeResult]]) -> List[Optional[Exception]]:
+        return self._post_evaluations(submissions)
@@ -1,132 +1,308 @@
-import os
 from dataclasses import asdict
-from typing import Callable, Dict, Optional
-from logging import getLogger
-
 import time
-import requests
-from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from logging import getLogger
 
-from queue import Queue
-import threading
+from guardrails_simlab_client.http_client import (
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_READ_TIMEOUT,
+    ControlPlaneClient,
+)
+from guardrails_simlab_client.processors.base_processor import DEFAULT_BATCH_WAIT_MS, BaseProcessor
+from guardrails_simlab_client.rate_limiter import RateLimiter
 from guardrails_simlab_client.protocols import Report
-from guardrails_simlab_client.env import _get_api_key, _get_app_id
+from guardrails_simlab_client.env import _get_app_id
+from guardrails_simlab_client.history import ConversationHistoryResolver
+from guardrails_simlab_client.caching import ResponseCache
+from guardrails_simlab_client.dedup import ExpiringDedupSet
+from guardrails_simlab_client.journal import Journal
+from guardrails_simlab_client.leases import LeaseBackend
+from guardrails_simlab_client.metrics import FETCH_HISTORY, FIRST_TOKEN, GENERATION, Metrics
+from guardrails_simlab_client.submission import DEFAULT_SUBMIT_WORKERS
+from guardrails_simlab_client.shutdown import DEFAULT_DRAIN_TIMEOUT, DaemonThreadPoolExecutor
+from guardrails_simlab_client.streaming import collect, is_stream
 
 LOGGER = getLogger(__name__)
 
 last_successful_test = None
 
-class TestProcessor:
+class TestProcessor(BaseProcessor):
     def __init__(
         self,
         control_plane_host: str,
         max_workers: Optional[int] = None,
         application_id: Optional[str] = None,
-        throttle_time: Optional[float] = None
+        throttle_time: Optional[float] = None,
+        http_client: Optional[ControlPlaneClient] = None,
+        connect_timeout: Optional[float] = DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: Optional[float] = DEFAULT_READ_TIMEOUT,
+        gzip_requests: bool = False,
+        batch_size: Optional[int] = None,
+        batch_wait_ms: float = DEFAULT_BATCH_WAIT_MS,
+        rate_limiter: Optional[RateLimiter] = None,
+        adaptive_concurrency: bool = False,
+        min_workers: int = 1,
+        connection_test_workers: int = 2,
+        lease_backend: Optional[LeaseBackend] = None,
+        journal: Optional[Journal] = None,
+        response_cache: Optional[ResponseCache] = None,
+        submit_workers: int = DEFAULT_SUBMIT_WORKERS,
+        spill_path: Optional[str] = None,
+        metrics: Optional[Metrics] = None,
+        drain_timeout: float = DEFAULT_DRAIN_TIMEOUT,
+        max_response_chars: Optional[int] = None,
+        max_generation_seconds: Optional[float] = None,
     ):
-        self.control_plane_host = control_plane_host
-        self.processing_queue = Queue()
-        self.queued_tests: Dict[str, bool] = {}
-        self.should_stop = False
-        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
-        self.executor = ThreadPoolExecutor(max_workers=max_workers)
-        self.processing_thread = None
+        super().__init__(
+            control_plane_host,
+            max_workers,
+            throttle_time=throttle_time,
+            http_client=http_client,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            gzip_requests=gzip_requests,
+            batch_size=batch_size,
+            batch_wait_ms=batch_wait_ms,
+            rate_limiter=rate_limiter,
+            adaptive_concurrency=adaptive_concurrency,
+            min_workers=min_workers,
+            poller_connections=1 + connection_test_workers,
+            lease_backend=lease_backend,
+            journal=journal,
+            submit_workers=submit_workers,
+            spill_path=spill_path,
+            metrics=metrics,
+            drain_timeout=drain_timeout,
+        )
         self.application_id = application_id
-        self.throttle_time = throttle_time
-
-    def start_processing(self, fn: Callable[[str, ...], str]):
-        """Start the background processing thread"""
-        self.should_stop = False
-        self.processing_thread = threading.Thread(
-            target=self._process_queue, args=(fn,), daemon=True
+        self.history_resolver = ConversationHistoryResolver()
+        self.response_cache = response_cache
+        # Limits for streamed responses; max_response_chars also trims complete ones
+        self.max_response_chars = max_response_chars
+        self.max_generation_seconds = max_generation_seconds
+        # Connection tests get their own pool so they never queue behind experiment tests
+        self.connection_test_executor = DaemonThreadPoolExecutor(
+            connection_test_workers, thread_name_prefix="connection-test"
         )
-        self.processing_thread.start()
+        self.queued_connection_tests = ExpiringDedupSet()
 
-    def stop_processing(self):
+    def stop_processing(self, timeout: Optional[float] = None) -> bool:
         """Stop the background processing thread and cleanup"""
-        self.should_stop = True
-        if self.processing_thread:
-            self.processing_thread.join()
-        self.executor.shutdown(wait=True)
+        # A connection test that is still running is retried by the control plane
+        self.connection_test_executor.shutdown(wait=False, cancel_futures=True)
+        return super().stop_processing(timeout)
 
-    def _process_test(self, test_data: dict, fn: Callable[[str, ...], str]):
-        """Process a single test"""
+    def submit_connection_test(self, test: dict, fn: Callable) -> bool:
+        """Run a pending connection test in the background; returns False if it is already running"""
+        if not self.queued_connection_tests.add(test["id"]):
+            return False
         try:
-            test_response = requests.get(
-                f"{self.control_plane_host}/api/experiments/{test_data['experiment_id']}/tests/{test_data['id']}",
-                headers={"x-api-key": _get_api_key()},
-            )
-
-            if not test_response.ok:
-                raise Exception(f"Error fetching test {test_data['id']}: {test_response.text}")
-            
-            test = test_response.json()
-
-            parent_id = test.get('parent_test_id')
+            self.connection_test_executor.submit(self._process_connection_test, test, fn)
+        except Exception:
+            self.queued_connection_tests.release(test["id"])
+            raise
+        return True
 
+    def _process_connection_test(self, test: dict, fn: Callable):
+        app_id = _get_app_id(self.application_id)
+        url = f"/api/connection-tests/{test['id']}?appId={app_id}"
+        try:
             message_history = [{
                 "role": "user",
-                "content": test_data['prompt']
+                "content": test["prompt"]
             }]
-            # TODO: Replace with conversations endpoint
-            while parent_id:
-                # get parent test
-                parent_test_response = requests.get(
-                    f"{self.control_plane_host}/api/experiments/{test_data['experiment_id']}/tests/{parent_id}",
-                    headers={"x-api-key": _get_api_key()},
-                )
-                
-                if not parent_test_response.ok:
-                    raise Exception(f"Error fetching parent test {parent_id}: {parent_test_response.text}")
-                
-                parent_test = parent_test_response.json()
-
-                parent_id = parent_test.get('parent_test_id')
-                message_history.insert(0, {
-                    "role": "assistant",
-                    "content": parent_test['response']
-                })
-                message_history.insert(0, {
-                    "role": "user",
-                    "content": parent_test['prompt']
-                })
-                
-            response = fn(message_history)
-
-            report = Report(
-                id=test_data["id"],
-                appId=_get_app_id(self.application_id),
-                prompt=test_data["prompt"],
-                response=response,
-                persona=test_data["persona"],
-            )
-
-            experiment_id = test_data["experiment_id"]
-            test_id = test_data["id"]
-
-            # TODO: Change to PUT /api/experiments/{experiment_id}/tests/{test_id}/response
-            requests.put(
-                f"{self.control_plane_host}/api/experiments/{experiment_id}/tests/{test_id}?appId={_get_app_id(self.application_id)}",
-                json=asdict(report),
-                headers={"x-api-key": _get_api_key()},
-            )
+            if self.batch_size:
+                response = self._call(fn, [message_history], test_id=[test["id"]])[0]
+                if isinstance(response, Exception):
+                    raise response
+            else:
+                response = self._call(fn, message_history, test_id=test["id"])
+            body = {
+                "response": response,
+                "status": "completed",
+                "executed_by": app_id,
+                "completed_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            }
+        except Exception as e:
+            LOGGER.info(f"Error processing connection test: {e}")
+            body = {
+                "status": "failed",
+                "executed_by": app_id,
+                "failed_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "error": str(e),
+            }
+        try:
+            patch_response = self.http_client.patch(url, json_body=body)
+            if not patch_response.ok:
+                raise Exception(patch_response.text)
+            self.queued_connection_tests.acknowledge(test["id"])
+        except Exception as e:
+            # Retried by a later poll once a backoff delay that grows with each failure has passed
+            delay = self.queued_connection_tests.retry_later(test["id"])
+            LOGGER.error(f"Error submitting connection test {test['id']}, retrying in {delay:.0f}s: {e}")
+
+    def _process_item(self, test_data: dict, fn: Callable[[str, ...], str]):
+        self._process_test(test_data, fn)
+
+    journal_scope = "response"
+
+    def _lease_key(self, test_data: dict):
+        return test_data["experiment_id"], test_data["id"], self.journal_scope
+
+    def _replay(self, test_data: dict, response: str):
+        self._deliver(test_data, response)
+
+    def _process_test(self, test_data: dict, fn: Callable[[str, ...], str]):
+        """Process a single test"""
+        if not self._claim(test_data):
+            return
+        try:
+            with self.metrics.time(FETCH_HISTORY, self.journal_scope):
+                message_history = self.history_resolver.resolve(self.http_client, test_data)
+
+            response = self._respond(fn, test_data, message_history)
+            self._record_result(test_data, response)
+
+            # Returns as soon as the result is queued for submission
+            self._deliver(test_data, response)
         except Exception as e:
             print(f"Error processing test {test_data['id']}: {e}")
-        finally:
-            # Remove from queued tests after processing (success or failure)
-            self.queued_tests.pop(test_data["id"], None)
+            self._release(test_data)
+
+    def _cache_key(self, test_data: dict, message_history: list) -> str:
+        return self.response_cache.make_key(message_history, test_data.get("persona"))
+
+    def _respond(self, fn: Callable[[str, ...], str], test_data: dict, message_history: list) -> str:
+        """Call fn, or reuse the response to an identical conversation"""
+        if self.response_cache is None:
+            return self._call(fn, message_history, test_id=test_data["id"])
+        return self.response_cache.get_or_compute(
+            self._cache_key(test_data, message_history),
+            lambda: self._call(fn, message_history, test_id=test_data["id"]),
+        )
+
+    def _consume(self, result, started: float, test_id=None):
+        """Read streamed responses as they arrive, cutting them off at the configured limits"""
+        if isinstance(result, list):
+            # Batched fn: each response in the list may be a stream of its own
+            test_ids = test_id if isinstance(test_id, list) else [test_id] * len(result)
+            return [self._consume(response, started, test_id) for response, test_id in zip(result, test_ids)]
+        if isinstance(result, str):
+            if self.max_response_chars is not None and len(result) > self.max_response_chars:
+                self.metrics.increment("responses_truncated", self.journal_scope)
+                return result[: self.max_response_chars]
+            return result
+        if not is_stream(result):
+            return result
+        generation = collect(result, started, self.max_response_chars, self.max_generation_seconds)
+        first_token = "no tokens"
+        if generation.first_token_seconds is not None:
+            self.metrics.observe(FIRST_TOKEN, self.journal_scope, generation.first_token_seconds)
+            first_token = f"first token after {generation.first_token_seconds:.3f}s"
+        self.metrics.observe(GENERATION, self.journal_scope, generation.total_seconds)
+        LOGGER.debug(f"Test {test_id}: {first_token}, generation took {generation.total_seconds:.3f}s")
+        if generation.truncated:
+            self.metrics.increment("responses_truncated", self.journal_scope)
+        return generation.text
 
-    def _process_queue(self, fn: Callable[[str, ...], str]):
-        """Background thread that manages concurrent test processing"""
-        while not self.should_stop:
+    def _respond_batch(self, fn: Callable[[List[list]], List[str]], batch: List[dict], histories: List[list]) -> list:
+        """Call fn once for the conversations in a batch that aren't cached"""
+        if self.response_cache is None:
+            responses = self._call(fn, histories, test_id=[test_data["id"] for test_data in batch])
+            if len(responses) != len(batch):
+                raise Exception(f"Expected {len(batch)} responses from batch, got {len(responses)}")
+            return responses
+
+        responses = [None] * len(batch)
+        # key -> positions in the batch; identical conversations are only sent once
+        misses: Dict[str, List[int]] = {}
+        for index, (test_data, history) in enumerate(zip(batch, histories)):
+            key = self._cache_key(test_data, history)
+            if key in misses:
+                misses[key].append(index)
+                continue
+            responses[index] = self.response_cache.get(key)
+            if responses[index] is None:
+                misses[key] = [index]
+        if not misses:
+            return responses
+        fresh = self._call(
+            fn,
+            [histories[indexes[0]] for indexes in misses.values()],
+            # Identical conversations share one response, and its timings
+            test_id=[", ".join(batch[index]["id"] for index in indexes) for indexes in misses.values()],
+        )
+        if len(fresh) != len(misses):
+            raise Exception(f"Expected {len(misses)} responses from batch, got {len(fresh)}")
+        for (key, indexes), response in zip(misses.items(), fresh):
+            for index in indexes:
+                responses[index] = response
+            if not isinstance(response, Exception):
+                self.response_cache.put(key, response)
+        return responses
+
+    def _process_batch(self, batch: List[dict], fn: Callable[[List[list]], List[str]]):
+        """Process a batch of tests with one call to fn"""
+        ready = []
+        histories = []
+        for test_data in batch:
+            if not self._claim(test_data):
+                continue
             try:
-                if self.processing_queue.empty():
-                    continue
-                test_data = self.processing_queue.get(timeout=1)
-                # Submit the test processing to the thread pool
-                self.executor.submit(self._process_test, test_data, fn)
-                self.processing_queue.task_done()
-                if self.throttle_time is not None:
-                    time.sleep(self.throttle_time)
+                with self.metrics.time(FETCH_HISTORY, self.journal_scope):
+                    histories.append(self.history_resolver.resolve(self.http_client, test_data))
+                ready.append(test_data)
             except Exception as e:
-                print(f"Error submitting test to thread pool: {e}")
+                LOGGER.error(f"Error processing test {test_data['id']}: {e}")
+                self._release(test_data)
+        if not ready:
+            return
+
+        try:
+            responses = self._respond_batch(fn, ready, histories)
+        except Exception as e:
+            for test_data in ready:
+                LOGGER.error(f"Error processing test {test_data['id']}: {e}")
+                self._release(test_data)
+            return
+
+        # A failed item only fails its own test
+        results = []
+        for test_data, response in zip(ready, responses):
+            if isinstance(response, Exception):
+                LOGGER.error(f"Error processing test {test_data['id']}: {response}")
+                self._release(test_data)
+                continue
+            self._record_result(test_data, response)
+            results.append((test_data, response))
+        self._deliver_many(results)
+
+    def _send_results(self, submissions: List[Tuple[dict, str]]) -> List[Optional[Exception]]:
+        errors = []
+        for test_data, response in submissions:
+            try:
+                self._submit_response(test_data, response)
+                errors.append(None)
+            except Exception as e:
+                errors.append(e)
+        return errors
+
+    def _submit_response(self, test_data: dict, response: str):
+        report = Report(
+            id=test_data["id"],
+            appId=_get_app_id(self.application_id),
+            prompt=test_data["prompt"],
+            response=response,
+            persona=test_data["persona"],
+        )
+
+        experiment_id = test_data["experiment_id"]
+        test_id = test_data["id"]
+
+        # TODO: Change to PUT /api/experiments/{experiment_id}/tests/{test_id}/response
+        put_response = self.http_client.put(
+            f"/api/experiments/{experiment_id}/tests/{test_id}?appId={_get_app_id(self.application_id)}",
+            json_body=asdict(report),
+        )
+        if not put_response.ok:
+            raise Exception(f"Error submitting response: {put_response.text}")
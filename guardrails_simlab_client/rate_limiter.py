@@ -0,0 +1,82 @@
+from contextlib import contextmanager
+import threading
+import time
+from typing import Any, Callable, Iterator, Optional
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at ``rate`` tokens per second up to ``capacity``"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float = 1.0) -> float:
+        """Take ``amount`` tokens and return how long the caller must wait before using them.
+
+        The bucket may go into debt, which queues callers fairly: each
+        reservation waits for the tokens taken by the ones before it.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+
+class RateLimiter:
+    """Limits calls to a wrapped function by rate, cost and concurrency.
+
+    One instance can be passed to several decorators to share a provider
+    quota across every processor in the process. ``requests_per_second``
+    and ``burst`` bound how often the function is called; ``cost_fn``
+    and ``cost_per_minute`` bound a second quota such as tokens, with
+    ``cost_fn`` receiving exactly the arguments the function is about to
+    be called with; ``max_concurrency`` bounds calls in flight.
+    """
+
+    def __init__(
+        self,
+        requests_per_second: Optional[float] = None,
+        burst: Optional[float] = None,
+        max_concurrency: Optional[int] = None,
+        cost_fn: Optional[Callable[..., float]] = None,
+        cost_per_minute: Optional[float] = None,
+        cost_burst: Optional[float] = None,
+    ):
+        if cost_per_minute is not None and cost_fn is None:
+            raise ValueError("cost_per_minute requires a cost_fn")
+        self.requests = TokenBucket(requests_per_second, burst) if requests_per_second else None
+        self.cost = (
+            TokenBucket(cost_per_minute / 60, cost_burst if cost_burst is not None else cost_per_minute)
+            if cost_per_minute
+            else None
+        )
+        self.cost_fn = cost_fn
+        self._concurrency = threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+
+    @contextmanager
+    def limit(self, *args: Any) -> Iterator[None]:
+        """Block until a call with ``args`` is allowed, and hold a concurrency slot for its duration"""
+        if self._concurrency:
+            self._concurrency.acquire()
+        try:
+            wait = 0.0
+            if self.requests:
+                wait = self.requests.reserve(1)
+            if self.cost:
+                wait = max(wait, self.cost.reserve(self.cost_fn(*args)))
+            if wait > 0:
+                time.sleep(wait)
+            yield
+        finally:
+            if self._concurrency:
+                self._concurrency.release()
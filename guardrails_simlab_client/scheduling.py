@@ -0,0 +1,187 @@
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from queue import Empty, Full
+import threading
+import time
+from typing import Any, Callable, Deque, Dict, Hashable, Optional, Tuple
+
+# Per-experiment wait stats kept for at most this many experiments
+DEFAULT_MAX_TRACKED_EXPERIMENTS = 256
+
+
+def _experiment_key(item: Any) -> Hashable:
+    return item.get("experiment_id")
+
+
+def _is_follow_up(item: Any) -> bool:
+    # Child tests unblock a conversation that is waiting on this turn
+    return bool(item.get("parent_test_id"))
+
+
+@dataclass
+class WaitStats:
+    count: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+
+    @property
+    def mean_wait(self) -> float:
+        return self.total_wait / self.count if self.count else 0.0
+
+
+class _Lane:
+    """Per-tier weighted round-robin over experiment sub-queues"""
+
+    def __init__(self):
+        # experiment -> items in arrival order; dict order is the rotation
+        self.queues: "OrderedDict[Hashable, Deque[Tuple[float, Any]]]" = OrderedDict()
+        self.served = 0
+        self.size = 0
+
+    def put(self, key: Hashable, entry: Tuple[float, Any]):
+        queue = self.queues.get(key)
+        if queue is None:
+            queue = self.queues[key] = deque()
+        queue.append(entry)
+        self.size += 1
+
+    def get(self, weight: Callable[[Hashable], int]) -> Tuple[Hashable, Tuple[float, Any]]:
+        key, queue = next(iter(self.queues.items()))
+        entry = queue.popleft()
+        self.size -= 1
+        self.served += 1
+        if not queue:
+            del self.queues[key]
+            self.served = 0
+        elif self.served >= weight(key):
+            # This experiment used its turn; move it to the back of the rotation
+            self.queues.move_to_end(key)
+            self.served = 0
+        return key, entry
+
+
+class FairScheduler:
+    """Drop-in replacement for ``queue.Queue`` that is fair across experiments.
+
+    Items are kept in one sub-queue per experiment and served round-robin,
+    ``weight`` items per experiment per turn, so a large experiment can't
+    starve one started after it. Follow-up turns of multi-turn tests go in
+    a priority tier that is always served first, since a conversation can't
+    continue until they are answered. ``maxsize`` bounds the total across
+    all experiments, like ``Queue``.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 0,
+        key_fn: Callable[[Any], Hashable] = _experiment_key,
+        priority_fn: Callable[[Any], bool] = _is_follow_up,
+        max_tracked_experiments: int = DEFAULT_MAX_TRACKED_EXPERIMENTS,
+        on_wait: Optional[Callable[[float], None]] = None,
+    ):
+        self.maxsize = maxsize
+        self.key_fn = key_fn
+        self.priority_fn = priority_fn
+        self.max_tracked_experiments = max_tracked_experiments
+        # Called with each item's time in the queue as it is taken
+        self.on_wait = on_wait
+        self._priority = _Lane()
+        self._normal = _Lane()
+        self._weights: Dict[Hashable, int] = {}
+        self._wait_stats: "OrderedDict[Hashable, WaitStats]" = OrderedDict()
+        self._unfinished = 0
+        self._mutex = threading.Lock()
+        self._not_empty = threading.Condition(self._mutex)
+        self._not_full = threading.Condition(self._mutex)
+        self._all_done = threading.Condition(self._mutex)
+
+    def set_weight(self, experiment_id: Hashable, weight: int):
+        """Serve up to ``weight`` items from this experiment per round-robin turn"""
+        if weight < 1:
+            raise ValueError("weight must be at least 1")
+        with self._mutex:
+            self._weights[experiment_id] = weight
+
+    def _weight(self, key: Hashable) -> int:
+        return self._weights.get(key, 1)
+
+    def qsize(self) -> int:
+        with self._mutex:
+            return self._priority.size + self._normal.size
+
+    def empty(self) -> bool:
+        return self.qsize() == 0
+
+    def full(self) -> bool:
+        return 0 < self.maxsize <= self.qsize()
+
+    def put(self, item: Any, block: bool = True, timeout: Optional[float] = None):
+        with self._not_full:
+            if self.maxsize > 0:
+                if not block:
+                    if self._priority.size + self._normal.size >= self.maxsize:
+                        raise Full
+                elif not self._not_full.wait_for(
+                    lambda: self._priority.size + self._normal.size < self.maxsize, timeout
+                ):
+                    raise Full
+            lane = self._priority if self.priority_fn(item) else self._normal
+            lane.put(self.key_fn(item), (time.monotonic(), item))
+            self._unfinished += 1
+            self._not_empty.notify()
+
+    def put_nowait(self, item: Any):
+        self.put(item, block=False)
+
+    def get(self, block: bool = True, timeout: Optional[float] = None) -> Any:
+        with self._not_empty:
+            if not block:
+                if not (self._priority.size or self._normal.size):
+                    raise Empty
+            elif not self._not_empty.wait_for(
+                lambda: self._priority.size or self._normal.size, timeout
+            ):
+                raise Empty
+            lane = self._priority if self._priority.size else self._normal
+            key, (enqueued_at, item) = lane.get(self._weight)
+            wait = time.monotonic() - enqueued_at
+            self._record_wait(key, wait)
+            self._not_full.notify()
+        if self.on_wait is not None:
+            self.on_wait(wait)
+        return item
+
+    def get_nowait(self) -> Any:
+        return self.get(block=False)
+
+    def task_done(self):
+        with self._all_done:
+            if self._unfinished <= 0:
+                raise ValueError("task_done() called too many times")
+            self._unfinished -= 1
+            if self._unfinished == 0:
+                self._all_done.notify_all()
+
+    def join(self):
+        with self._all_done:
+            self._all_done.wait_for(lambda: self._unfinished == 0)
+
+    def _record_wait(self, key: Hashable, wait: float):
+        stats = self._wait_stats.get(key)
+        if stats is None:
+            stats = self._wait_stats[key] = WaitStats()
+            while len(self._wait_stats) > self.max_tracked_experiments:
+                self._wait_stats.popitem(last=False)
+        else:
+            self._wait_stats.move_to_end(key)
+        stats.count += 1
+        stats.total_wait += wait
+        stats.max_wait = max(stats.max_wait, wait)
+
+    def wait_stats(self) -> Dict[Hashable, WaitStats]:
+        """Time items spent queued, per experiment, for the most recently active experiments"""
+        with self._mutex:
+            return {
+                key: WaitStats(stats.count, stats.total_wait, stats.max_wait)
+                for key, stats in self._wait_stats.items()
+            }
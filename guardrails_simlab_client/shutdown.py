@@ -0,0 +1,101 @@
+from concurrent.futures import Executor, Future
+from logging import getLogger
+import queue
+import signal
+import threading
+from typing import Any, Callable, List
+
+LOGGER = getLogger(__name__)
+
+# How long stop_processing waits for running tests and buffered submissions
+DEFAULT_DRAIN_TIMEOUT = 30.0
+
+
+def _raise_keyboard_interrupt(signum, frame):
+    LOGGER.info("Received SIGTERM, draining")
+    raise KeyboardInterrupt
+
+
+def install_sigterm_handler() -> bool:
+    """Make SIGTERM stop the poll loop like Ctrl-C does, so it drains before the process exits.
+
+    Only possible from the main thread, and skipped if the application
+    already handles SIGTERM itself. Returns whether the handler was installed.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return False
+    if signal.getsignal(signal.SIGTERM) not in (signal.SIG_DFL, _raise_keyboard_interrupt):
+        return False
+    signal.signal(signal.SIGTERM, _raise_keyboard_interrupt)
+    return True
+
+
+class DaemonThreadPoolExecutor(Executor):
+    """Thread pool whose threads don't keep a stopping process alive.
+
+    ``concurrent.futures`` joins every ``ThreadPoolExecutor`` thread at
+    interpreter exit, so a model call still hung when the drain deadline
+    passes would hold the process until it is killed. These threads are
+    daemons, so a call abandoned by ``stop_processing`` ends with the
+    process. Idle threads are reused before new ones are started, up to
+    ``max_workers``.
+    """
+
+    def __init__(self, max_workers: int, thread_name_prefix: str = "worker"):
+        if max_workers <= 0:
+            raise ValueError("max_workers must be greater than 0")
+        self.max_workers = max_workers
+        self.thread_name_prefix = thread_name_prefix
+        self._work: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._threads: List[threading.Thread] = []
+        self._idle = threading.Semaphore(0)
+        self._lock = threading.Lock()
+        self._shutdown = False
+
+    def submit(self, fn: Callable, /, *args: Any, **kwargs: Any) -> Future:
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new futures after shutdown")
+            future = Future()
+            self._work.put((future, fn, args, kwargs))
+            if not self._idle.acquire(blocking=False) and len(self._threads) < self.max_workers:
+                thread = threading.Thread(
+                    target=self._run, name=f"{self.thread_name_prefix}-{len(self._threads)}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+            return future
+
+    def _run(self):
+        while True:
+            work = self._work.get()
+            if work is None:
+                return
+            future, fn, args, kwargs = work
+            if future.set_running_or_notify_cancel():
+                try:
+                    result = fn(*args, **kwargs)
+                except BaseException as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+            del work, future
+            self._idle.release()
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        with self._lock:
+            self._shutdown = True
+            if cancel_futures:
+                while True:
+                    try:
+                        work = self._work.get_nowait()
+                    except queue.Empty:
+                        break
+                    if work is not None:
+                        work[0].cancel()
+            for _ in self._threads:
+                self._work.put(None)
+            threads = list(self._threads)
+        if wait:
+            for thread in threads:
+                thread.join()
@@ -0,0 +1,118 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from logging import getLogger
+import threading
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import quote
+
+from guardrails_simlab_client.http_client import error_message
+from guardrails_simlab_client.protocols import HttpError
+
+LOGGER = getLogger(__name__)
+
+# Response header carrying a cursor for the next request, and the query parameter it goes back in
+CURSOR_HEADER = "X-Next-Cursor"
+CURSOR_PARAM = "updated-since"
+DEFAULT_MAX_SNAPSHOTS = 1024
+
+
+@dataclass
+class Snapshot:
+    etag: Optional[str]
+    body: Any
+    cursor: Optional[str] = None
+    # id -> item, for lists that are updated with deltas
+    items: Optional[Dict[str, Any]] = None
+
+
+class PollSnapshots:
+    """Last response to each polled URL, so an unchanged list costs a 304 instead of a download.
+
+    ``get_json`` sends ``If-None-Match`` with the ETag of the previous
+    response and returns the stored body on a 304 without parsing
+    anything. For lists fetched with ``merge_by``, a server that returns an
+    ``X-Next-Cursor`` header is asked only for items updated since then,
+    and those are merged into the stored list by ``merge_by``. Only use
+    ``merge_by`` for lists the caller filters itself, since a delta can't
+    say that an item no longer matches the server-side filter.
+    """
+
+    def __init__(self, max_snapshots: int = DEFAULT_MAX_SNAPSHOTS):
+        self.max_snapshots = max_snapshots
+        self._snapshots: "OrderedDict[str, Snapshot]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.requests = 0
+        # Responses that were 304s, or deltas with nothing new
+        self.not_modified = 0
+        self.delta_requests = 0
+        # Responses that carried new data
+        self.changed = 0
+        # Polls in which nothing changed
+        self.unchanged_polls = 0
+
+    def get_json(self, http_client, path: str, merge_by: Optional[str] = None) -> Tuple[Any, bool]:
+        """GET ``path`` through ``http_client``; returns (body, whether it changed since the last call)"""
+        with self._lock:
+            snapshot = self._snapshots.get(path)
+            if snapshot is not None:
+                self._snapshots.move_to_end(path)
+        headers = {}
+        request_path = path
+        delta = merge_by is not None and snapshot is not None and snapshot.cursor is not None
+        if delta:
+            separator = "&" if "?" in path else "?"
+            request_path = f"{path}{separator}{CURSOR_PARAM}={quote(snapshot.cursor)}"
+        elif snapshot is not None and snapshot.etag:
+            headers["If-None-Match"] = snapshot.etag
+
+        response = http_client.get(request_path, headers=headers)
+        with self._lock:
+            self.requests += 1
+        if response.status_code == 304 and snapshot is not None:
+            with self._lock:
+                self.not_modified += 1
+            return snapshot.body, False
+        if not response.ok:
+            raise HttpError(status_code=response.status_code, message=error_message(response))
+
+        body = response.json()
+        cursor = response.headers.get(CURSOR_HEADER) if merge_by is not None else None
+        items = None
+        changed = True
+        if delta:
+            items = dict(snapshot.items)
+            for item in body:
+                items[item[merge_by]] = item
+            changed = bool(body)
+            body = list(items.values())
+        elif cursor is not None:
+            items = {item[merge_by]: item for item in body}
+        with self._lock:
+            if delta:
+                self.delta_requests += 1
+            if changed:
+                self.changed += 1
+            else:
+                self.not_modified += 1
+            self._snapshots[path] = Snapshot(response.headers.get("ETag"), body, cursor, items)
+            self._snapshots.move_to_end(path)
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+        return body, changed
+
+    def mark(self) -> int:
+        """Call at the start of a poll and pass the result to ``record_poll`` at its end"""
+        with self._lock:
+            return self.changed
+
+    def record_poll(self, mark: int) -> bool:
+        """Count the poll as unchanged if no response since ``mark`` carried new data"""
+        with self._lock:
+            unchanged = self.changed == mark
+            if unchanged:
+                self.unchanged_polls += 1
+            return unchanged
+
+    def forget(self, path: str):
+        with self._lock:
+            self._snapshots.pop(path, None)
@@ -0,0 +1,127 @@
+import asyncio
+from collections.abc import AsyncIterator, Iterator
+from dataclasses import dataclass
+from logging import getLogger
+import threading
+import time
+from typing import Any, List, Optional
+
+LOGGER = getLogger(__name__)
+
+# Every async stream is read on this one loop, started on first use, so async
+# clients shared between tests (e.g. one AsyncOpenAI) always see the same loop
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+@dataclass
+class Generation:
+    text: str
+    # Seconds from the call to the first non-empty chunk; None if nothing was generated
+    first_token_seconds: Optional[float]
+    total_seconds: float
+    truncated: bool = False
+
+
+def is_stream(result: Any) -> bool:
+    """Whether fn returned chunks to consume rather than a finished response"""
+    return isinstance(result, (Iterator, AsyncIterator)) and not isinstance(result, (str, bytes))
+
+
+class _Collector:
+    def __init__(self, started: float, max_chars: Optional[int], max_seconds: Optional[float]):
+        self.started = started
+        self.max_chars = max_chars
+        self.max_seconds = max_seconds
+        self.parts: List[str] = []
+        self.length = 0
+        self.first_token_seconds: Optional[float] = None
+        self.truncated = False
+
+    def remaining(self) -> Optional[float]:
+        if self.max_seconds is None:
+            return None
+        return self.max_seconds - (time.monotonic() - self.started)
+
+    def add(self, chunk: str) -> bool:
+        """Append a chunk; returns False once a limit is reached"""
+        if chunk and self.max_chars is not None and self.length >= self.max_chars:
+            # The response already filled max_chars and there is more of it
+            self.truncated = True
+            return False
+        if chunk and self.first_token_seconds is None:
+            self.first_token_seconds = time.monotonic() - self.started
+        self.parts.append(chunk)
+        self.length += len(chunk)
+        if self.max_chars is not None and self.length > self.max_chars:
+            self.truncated = True
+            return False
+        remaining = self.remaining()
+        if remaining is not None and remaining <= 0:
+            self.truncated = True
+            return False
+        return True
+
+    def result(self) -> Generation:
+        text = "".join(self.parts)
+        if self.max_chars is not None:
+            text = text[: self.max_chars]
+        return Generation(text, self.first_token_seconds, time.monotonic() - self.started, self.truncated)
+
+
+def collect(
+    result: Any,
+    started: float,
+    max_chars: Optional[int] = None,
+    max_seconds: Optional[float] = None,
+) -> Generation:
+    """Consume a streamed response, stopping early at ``max_chars`` characters or ``max_seconds`` after ``started``.
+
+    ``result`` is an iterator of strings (e.g. a generator) or an async
+    iterator of strings. The time budget is checked between chunks of a
+    synchronous iterator, and also bounds the wait for each chunk of an
+    async one. An iterator that is cut off is closed so the model client
+    can stop generating. Async iterators are read on a background event
+    loop shared by every worker thread; the calling thread waits for them.
+    """
+    collector = _Collector(started, max_chars, max_seconds)
+    if isinstance(result, AsyncIterator):
+        asyncio.run_coroutine_threadsafe(_collect_async(result, collector), _stream_loop()).result()
+    else:
+        try:
+            for chunk in result:
+                if not collector.add(chunk):
+                    break
+        finally:
+            close = getattr(result, "close", None)
+            if close is not None:
+                close()
+    return collector.result()
+
+
+def _stream_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="simlab-streams", daemon=True).start()
+        return _loop
+
+
+async def _collect_async(result: AsyncIterator, collector: _Collector):
+    try:
+        while True:
+            remaining = collector.remaining()
+            try:
+                chunk = await asyncio.wait_for(result.__anext__(), timeout=None if remaining is None else max(0.0, remaining))
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError:
+                collector.truncated = True
+                return
+            if not collector.add(chunk):
+                return
+    finally:
+        aclose = getattr(result, "aclose", None)
+        if aclose is not None:
+            await aclose()
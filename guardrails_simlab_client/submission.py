@@ -0,0 +1,230 @@
+import heapq
+import itertools
+import json
+from logging import getLogger
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+LOGGER = getLogger(__name__)
+
+DEFAULT_SUBMIT_WORKERS = 4
+DEFAULT_MAX_PENDING = 1000
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_RETRY_BASE_DELAY = 0.5
+DEFAULT_RETRY_MAX_DELAY = 30.0
+# How often idle workers look for spilled submissions to retry
+SPILL_CHECK_INTERVAL = 30.0
+
+# (item, result) as handed over by a model worker
+Submission = Tuple[Any, Any]
+
+
+class SubmissionPipeline:
+    """Submits results on its own small pool so model workers never wait on the control plane.
+
+    ``put`` returns immediately. Workers send up to ``max_batch`` ready
+    submissions per call to ``send``, which returns one error (or None) per
+    submission. Failures are retried with exponential backoff and jitter up
+    to ``max_attempts`` times. Once ``max_pending`` submissions are
+    buffered, new ones are appended to ``spill_path`` (JSON lines) and
+    retried from there when the pipeline has room, or, without a spill
+    file, ``put`` blocks. Submissions that run out of attempts are spilled
+    too, or handed to ``on_failure`` so the test can be polled again.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[List[Submission]], Sequence[Optional[BaseException]]],
+        on_success: Callable[[Any], None],
+        on_failure: Callable[[Any], None],
+        workers: int = DEFAULT_SUBMIT_WORKERS,
+        max_pending: int = DEFAULT_MAX_PENDING,
+        max_batch: int = 1,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        retry_base_delay: float = DEFAULT_RETRY_BASE_DELAY,
+        retry_max_delay: float = DEFAULT_RETRY_MAX_DELAY,
+        spill_path: Optional[str] = None,
+        encode: Optional[Callable[[Any], Any]] = None,
+        decode: Optional[Callable[[Any], Any]] = None,
+    ):
+        self.send = send
+        self.on_success = on_success
+        self.on_failure = on_failure
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_batch = max_batch
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.spill_path = spill_path
+        # Convert results to and from JSON-serializable values for the spill file
+        self.encode = encode or (lambda result: result)
+        self.decode = decode or (lambda result: result)
+        # (ready_at, sequence, attempt, item, result)
+        self._heap: List[Tuple[float, int, int, Any, Any]] = []
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._stopping = False
+        self._condition = threading.Condition()
+        self._spill_lock = threading.Lock()
+        self._last_spill_check = 0.0
+        self._threads: List[threading.Thread] = []
+        self.submitted = 0
+        self.retries = 0
+        self.spilled = 0
+
+    def start(self):
+        """Start the worker threads and pick up anything spilled by a previous run"""
+        self._stopping = False
+        self._load_spill()
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"submission-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def put(self, item: Any, result: Any):
+        """Queue a result for submission; after ``close`` it is spilled or given up on at once"""
+        with self._condition:
+            if not self._stopping and (len(self._heap) < self.max_pending or self.spill_path is None):
+                self._condition.wait_for(lambda: len(self._heap) < self.max_pending or self._stopping)
+                if not self._stopping:
+                    self._push(time.monotonic(), 0, item, result)
+                    return
+        self._give_up([(item, result)])
+
+    def _push(self, ready_at: float, attempt: int, item: Any, result: Any):
+        heapq.heappush(self._heap, (ready_at, next(self._sequence), attempt, item, result))
+        self._condition.notify()
+
+    def pending(self) -> int:
+        """Submissions buffered or being sent"""
+        with self._condition:
+            return len(self._heap) + self._in_flight
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every buffered submission was sent or given up on"""
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._heap and not self._in_flight, timeout)
+
+    def close(self, timeout: Optional[float] = None):
+        """Flush for up to ``timeout`` seconds, then spill or give up on what is left.
+
+        A send still running at the deadline is not waited for; its worker
+        is a daemon and ends with the process.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self.flush(timeout)
+        with self._condition:
+            leftover = [(item, result) for _, _, _, item, result in self._heap]
+            self._heap.clear()
+            self._stopping = True
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        self._threads.clear()
+        self._give_up(leftover)
+
+    def _take(self) -> Optional[List[Tuple[float, int, int, Any, Any]]]:
+        with self._condition:
+            while True:
+                if self._stopping:
+                    return None
+                now = time.monotonic()
+                if self._heap and self._heap[0][0] <= now:
+                    jobs = []
+                    while self._heap and self._heap[0][0] <= now and len(jobs) < self.max_batch:
+                        jobs.append(heapq.heappop(self._heap))
+                    self._in_flight += len(jobs)
+                    self._condition.notify_all()
+                    return jobs
+                if not self._heap and self.spill_path and now - self._last_spill_check >= SPILL_CHECK_INTERVAL:
+                    break
+                timeout = self._heap[0][0] - now if self._heap else SPILL_CHECK_INTERVAL if self.spill_path else None
+                self._condition.wait(timeout)
+        self._load_spill()
+        return []
+
+    def _run(self):
+        while True:
+            jobs = self._take()
+            if jobs is None:
+                return
+            if not jobs:
+                continue
+            try:
+                errors = list(self.send([(item, result) for _, _, _, item, result in jobs]))
+            except Exception as e:
+                errors = [e] * len(jobs)
+            failed = []
+            with self._condition:
+                for (_, _, attempt, item, result), error in zip(jobs, errors):
+                    if error is None:
+                        self.submitted += 1
+                        continue
+                    if attempt + 1 < self.max_attempts and not self._stopping:
+                        self.retries += 1
+                        delay = min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt)
+                        LOGGER.debug(f"Submission failed, retrying in {delay:.1f}s: {error}")
+                        self._push(time.monotonic() + delay / 2 + random.uniform(0, delay / 2), attempt + 1, item, result)
+                    else:
+                        LOGGER.error(f"Giving up on submission after {attempt + 1} attempts: {error}")
+                        failed.append((item, result))
+            for (_, _, _, item, _), error in zip(jobs, errors):
+                if error is None:
+                    self._callback(self.on_success, item)
+            self._give_up(failed)
+            with self._condition:
+                self._in_flight -= len(jobs)
+                self._condition.notify_all()
+
+    def _callback(self, callback: Callable[[Any], None], item: Any):
+        try:
+            callback(item)
+        except Exception as e:
+            LOGGER.error(f"Error in submission callback: {e}")
+
+    def _give_up(self, submissions: List[Submission]):
+        if not submissions:
+            return
+        if self.spill_path is not None:
+            self._spill(submissions)
+            return
+        for item, _ in submissions:
+            self._callback(self.on_failure, item)
+
+    def _spill(self, submissions: List[Submission]):
+        try:
+            lines = [json.dumps([item, self.encode(result)]) + "\n" for item, result in submissions]
+            with self._spill_lock:
+                with open(self.spill_path, "a", encoding="utf-8") as spill_file:
+                    spill_file.writelines(lines)
+            self.spilled += len(submissions)
+        except Exception as e:
+            LOGGER.error(f"Error spilling submissions to {self.spill_path}: {e}")
+            for item, _ in submissions:
+                self._callback(self.on_failure, item)
+
+    def _load_spill(self):
+        self._last_spill_check = time.monotonic()
+        if self.spill_path is None:
+            return
+        with self._spill_lock:
+            if not os.path.exists(self.spill_path):
+                return
+            with open(self.spill_path, encoding="utf-8") as spill_file:
+                lines = spill_file.readlines()
+            os.remove(self.spill_path)
+        loaded = 0
+        with self._condition:
+            for line in lines:
+                try:
+                    item, result = json.loads(line)
+                    self._push(time.monotonic(), 0, item, self.decode(result))
+                    loaded += 1
+                except Exception as e:
+                    LOGGER.error(f"Skipping unreadable spilled submission: {e}")
+        if loaded:
+            LOGGER.info(f"Retrying {loaded} spilled submissions")
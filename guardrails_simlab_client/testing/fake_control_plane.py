@@ -0,0 +1,364 @@
+from collections import Counter
+import gzip
+import hashlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+from logging import getLogger
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, unquote, urlparse
+
+from guardrails_simlab_client.snapshots import CURSOR_HEADER, CURSOR_PARAM
+
+LOGGER = getLogger(__name__)
+
+_ROUTES = [
+    ("connection_tests", re.compile(r"/api/connection-tests")),
+    ("connection_test", re.compile(r"/api/connection-tests/(?P<test_id>[^/]+)")),
+    ("experiments", re.compile(r"/api/experiments")),
+    ("tests", re.compile(r"/api/experiments/(?P<experiment_id>[^/]+)/tests")),
+    ("bulk_evaluations", re.compile(r"/api/experiments/(?P<experiment_id>[^/]+)/evaluations/bulk")),
+    ("test", re.compile(r"/api/experiments/(?P<experiment_id>[^/]+)/tests/(?P<test_id>[^/]+)")),
+    ("conversations", re.compile(r"/api/experiments/(?P<experiment_id>[^/]+)/tests/(?P<test_id>[^/]+)/conversations")),
+    ("evaluations", re.compile(r"/api/experiments/(?P<experiment_id>[^/]+)/tests/(?P<test_id>[^/]+)/evaluations")),
+    ("claim", re.compile(r"/api/experiments/(?P<experiment_id>[^/]+)/tests/(?P<test_id>[^/]+)/claim")),
+]
+
+
+class FakeControlPlane:
+    """In-process stand-in for the Sim Lab control plane, for benchmarks and local runs.
+
+    Serves the endpoints the decorators call over real HTTP on
+    ``127.0.0.1``: experiments, tests, parent tests, conversations,
+    connection tests, claims, the test PUT and the evaluation POSTs.
+    Each experiment holds ``tests_per_experiment`` conversations of
+    ``turns`` tests, where every turn after the first becomes available
+    once its parent is answered. With ``answered=True`` every test starts
+    with a response, so judges have work without an application running.
+
+    Every request waits ``latency`` seconds, plus up to ``latency_jitter``,
+    and fails with ``error_status`` with probability ``error_rate``. The
+    conversations, bulk evaluations and claim endpoints can be switched off
+    to exercise the client's fallbacks. Answer and evaluation times are
+    recorded per test for end-to-end latency.
+
+    GET responses carry an ETag and a matching ``If-None-Match`` gets a 304.
+    With ``cursors=True`` test lists also return a cursor, and a request
+    with it only returns tests changed since.
+    """
+
+    def __init__(
+        self,
+        experiments: int = 1,
+        tests_per_experiment: int = 100,
+        turns: int = 1,
+        risks: Sequence[str] = ("toxicity",),
+        answered: bool = False,
+        connection_tests: int = 0,
+        latency: float = 0.0,
+        latency_jitter: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        conversations: bool = True,
+        bulk_evaluations: bool = True,
+        claims: bool = False,
+        etags: bool = True,
+        cursors: bool = False,
+        seed: Optional[int] = None,
+    ):
+        self.risks = list(risks)
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.conversations = conversations
+        self.bulk_evaluations = bulk_evaluations
+        self.claims = claims
+        self.etags = etags
+        self.cursors = cursors
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.experiments: List[Dict[str, Any]] = []
+        self.tests: Dict[str, Dict[str, Any]] = {}
+        self._tests_by_experiment: Dict[str, List[Dict[str, Any]]] = {}
+        self._children: Dict[str, List[str]] = {}
+        # (scope, test_id) -> owner
+        self._claims: Dict[Tuple[str, str], str] = {}
+        self.connection_tests: Dict[str, Dict[str, Any]] = {}
+        self.evaluations: List[Dict[str, Any]] = []
+        self._evaluations_by_test: Dict[str, List[Dict[str, Any]]] = {}
+        self.requests: Counter = Counter()
+        self.errors_injected = 0
+        self.not_modified = 0
+        # Bumped on every change to a test; a test list's cursor is the version it was served at
+        self._version = 0
+        self._test_versions: Dict[str, int] = {}
+        # Monotonic times for end-to-end latency
+        self.available_at: Dict[str, float] = {}
+        self.answered_at: Dict[str, float] = {}
+        self.evaluated_at: Dict[Tuple[str, str], float] = {}
+        self._server: Optional[ThreadingHTTPServer] = None
+        for _ in range(experiments):
+            self.add_experiment(tests_per_experiment, turns, answered)
+        for index in range(connection_tests):
+            test_id = f"connection-test-{index}"
+            self.connection_tests[test_id] = {"id": test_id, "prompt": f"Connection test {index}", "status": "pending"}
+
+    def add_experiment(self, conversations: int, turns: int = 1, answered: bool = False) -> str:
+        """Add an experiment of ``conversations`` chains of ``turns`` tests; returns its ID"""
+        with self._lock:
+            experiment_id = f"experiment-{len(self.experiments)}"
+            self.experiments.append({
+                "id": experiment_id,
+                "source_data": {"evaluation_configuration": {risk: {} for risk in self.risks}},
+            })
+            experiment_tests = self._tests_by_experiment[experiment_id] = []
+            now = time.monotonic()
+            for conversation in range(conversations):
+                parent_id = None
+                for turn in range(turns):
+                    test_id = f"{experiment_id}-{conversation}-{turn}"
+                    self.tests[test_id] = {
+                        "id": test_id,
+                        "experiment_id": experiment_id,
+                        "prompt": f"Prompt {conversation}.{turn}",
+                        "response": f"Response {conversation}.{turn}" if answered else None,
+                        "persona": "benchmark",
+                        "parent_test_id": parent_id,
+                    }
+                    experiment_tests.append(self.tests[test_id])
+                    if parent_id is not None:
+                        self._children.setdefault(parent_id, []).append(test_id)
+                    if answered or parent_id is None:
+                        self.available_at[test_id] = now
+                    parent_id = test_id
+        return experiment_id
+
+    @property
+    def url(self) -> str:
+        if self._server is None:
+            raise RuntimeError("FakeControlPlane is not running")
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self, port: int = 0) -> "FakeControlPlane":
+        handler = type("Handler", (_Handler,), {"control_plane": self})
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="fake-control-plane", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "FakeControlPlane":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    @property
+    def answered(self) -> int:
+        with self._lock:
+            return len(self.answered_at)
+
+    @property
+    def evaluated(self) -> int:
+        with self._lock:
+            return len(self.evaluated_at)
+
+    def wait_for(self, answered: int = 0, evaluated: int = 0, timeout: Optional[float] = None) -> bool:
+        """Wait until at least this many tests are answered and evaluations received"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.answered < answered or self.evaluated < evaluated:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def response_latencies(self) -> List[float]:
+        """Seconds from each answered test becoming available to its response arriving"""
+        with self._lock:
+            return [at - self.available_at[test_id] for test_id, at in self.answered_at.items()]
+
+    def evaluation_latencies(self) -> List[float]:
+        """Seconds from each evaluated test getting its response to each evaluation arriving"""
+        with self._lock:
+            return [
+                at - self.answered_at.get(test_id, self.available_at[test_id])
+                for (test_id, _), at in self.evaluated_at.items()
+            ]
+
+    def _is_unprocessed(self, test: Dict[str, Any]) -> bool:
+        parent_id = test["parent_test_id"]
+        return not test["response"] and (not parent_id or bool(self.tests[parent_id]["response"]))
+
+    def _messages(self, test_id: str) -> List[Dict[str, str]]:
+        chain = []
+        test = self.tests[test_id]
+        while test is not None:
+            chain.append(test)
+            test = self.tests.get(test["parent_test_id"]) if test["parent_test_id"] else None
+        messages = []
+        for test in reversed(chain):
+            messages.append({"role": "user", "content": test["prompt"]})
+            if test["response"]:
+                messages.append({"role": "assistant", "content": test["response"]})
+        return messages
+
+    def _touch(self, test_id: str):
+        self._version += 1
+        self._test_versions[test_id] = self._version
+
+    def _record_evaluation(self, experiment_id: str, evaluation: Dict[str, Any]):
+        evaluation = dict(evaluation, experiment_id=experiment_id)
+        self.evaluations.append(evaluation)
+        self._evaluations_by_test.setdefault(evaluation["test_id"], []).append(evaluation)
+        key = (evaluation["test_id"], evaluation["risk_type"])
+        self.evaluated_at.setdefault(key, time.monotonic())
+        self._touch(evaluation["test_id"])
+
+    def handle(
+        self,
+        method: str,
+        path: str,
+        query: Dict[str, List[str]],
+        body: Any,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Tuple[int, Any, Dict[str, str]]:
+        """Route one request; returns (status code, JSON body, response headers)"""
+        delay = self.latency + (self._random.uniform(0, self.latency_jitter) if self.latency_jitter else 0)
+        if delay:
+            time.sleep(delay)
+        route, params = _match(path)
+        with self._lock:
+            self.requests[(method, route)] += 1
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.errors_injected += 1
+                return self.error_status, {"message": "Injected error"}, {}
+            status, payload = self._dispatch(method, route, params, query, body)
+            response_headers = {}
+            if route == "tests" and self.cursors and status == 200:
+                response_headers[CURSOR_HEADER] = str(self._version)
+        if method == "GET" and status == 200 and self.etags:
+            etag = '"' + hashlib.sha1(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest() + '"'
+            response_headers["ETag"] = etag
+            if (headers or {}).get("If-None-Match") == etag:
+                with self._lock:
+                    self.not_modified += 1
+                return 304, None, response_headers
+        return status, payload, response_headers
+
+    def _dispatch(self, method: str, route: Optional[str], params: Dict[str, str], query, body) -> Tuple[int, Any]:
+        test = self.tests.get(params.get("test_id", ""))
+        if route == "connection_tests" and method == "GET":
+            return 200, [test for test in self.connection_tests.values() if test["status"] == "pending"]
+        if route == "connection_test" and method == "PATCH":
+            connection_test = self.connection_tests.get(params["test_id"])
+            if connection_test is None:
+                return 404, {"message": "Connection test not found"}
+            connection_test.update(body or {})
+            return 200, connection_test
+        if route == "experiments" and method == "GET":
+            return 200, self.experiments
+        if route == "tests" and method == "GET":
+            tests = self._tests_by_experiment.get(params["experiment_id"], [])
+            if "unprocessed-only" in query:
+                tests = [test for test in tests if self._is_unprocessed(test)]
+            if "unevaluated-risk" in query:
+                risk = unquote(query["unevaluated-risk"][0])
+                tests = [
+                    test for test in tests if test["response"] and (test["id"], risk) not in self.evaluated_at
+                ]
+            if CURSOR_PARAM in query:
+                since = int(query[CURSOR_PARAM][0])
+                tests = [test for test in tests if self._test_versions.get(test["id"], 0) > since]
+            if "limit" in query:
+                tests = tests[: int(query["limit"][0])]
+            if query.get("include-risk-evaluations") == ["true"]:
+                tests = [dict(test, risk_evaluations=self._evaluations_by_test.get(test["id"], [])) for test in tests]
+            return 200, tests
+        if route == "test" and test is not None:
+            if method == "GET":
+                return 200, test
+            if method == "PUT":
+                test["response"] = body["response"]
+                now = time.monotonic()
+                self.answered_at.setdefault(test["id"], now)
+                self._touch(test["id"])
+                for child_id in self._children.get(test["id"], []):
+                    self.available_at.setdefault(child_id, now)
+                    self._touch(child_id)
+                return 200, test
+        if route == "conversations" and test is not None and method == "GET":
+            if not self.conversations:
+                return 404, {"message": "Not found"}
+            return 200, [{"messages": self._messages(test["id"])}]
+        if route == "evaluations" and test is not None and method == "POST":
+            self._record_evaluation(params["experiment_id"], body)
+            return 201, body
+        if route == "bulk_evaluations" and method == "POST":
+            if not self.bulk_evaluations:
+                return 404, {"message": "Not found"}
+            for evaluation in body["evaluations"]:
+                self._record_evaluation(params["experiment_id"], evaluation)
+            return 201, {"created": len(body["evaluations"])}
+        if route == "claim" and test is not None:
+            if not self.claims:
+                return 404, {"message": "Not found"}
+            key = (body["scope"], test["id"])
+            if method == "DELETE":
+                if self._claims.get(key) == body["owner"]:
+                    del self._claims[key]
+                return 200, {}
+            if method == "POST":
+                if self._claims.setdefault(key, body["owner"]) != body["owner"]:
+                    return 409, {"message": "Claimed by another replica"}
+                return 200, {}
+        return 404, {"message": "Not found"}
+
+
+def _match(path: str) -> Tuple[Optional[str], Dict[str, str]]:
+    for name, pattern in _ROUTES:
+        match = pattern.fullmatch(path)
+        if match:
+            return name, match.groupdict()
+    return None, {}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    control_plane: FakeControlPlane
+
+    def _handle(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        if raw and self.headers.get("Content-Encoding") == "gzip":
+            raw = gzip.decompress(raw)
+        try:
+            body = json.loads(raw) if raw else None
+            status, payload, headers = self.control_plane.handle(
+                self.command, url.path, parse_qs(url.query), body, self.headers
+            )
+        except Exception as e:
+            LOGGER.error(f"Fake control plane error for {self.command} {url.path}: {e}")
+            status, payload, headers = 500, {"message": str(e)}, {}
+        encoded = json.dumps(payload).encode("utf-8") if status != 304 else b""
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    do_GET = do_PUT = do_POST = do_PATCH = do_DELETE = _handle
+
+    def log_message(self, format, *args):
+        LOGGER.debug(format % args)
@@ -0,0 +1,60 @@
+import os
+import threading
+import time
+
+import pytest
+
+os.environ.setdefault("GUARDRAILS_TOKEN", "test")
+os.environ.setdefault("GUARDRAILS_APP_ID", "test")
+
+from guardrails_simlab_client.testing.fake_control_plane import FakeControlPlane  # noqa: E402
+
+# Fast polling, and a loop that ends on its own once the fake is stopped
+POLL_OPTIONS = dict(min_poll_interval=0.05, max_poll_interval=0.5, max_failure_duration=0.5)
+
+
+@pytest.fixture
+def control_plane():
+    """Start a FakeControlPlane built by the test; stopped when the test ends"""
+    started = []
+
+    def start(factory=FakeControlPlane, **kwargs) -> FakeControlPlane:
+        fake = factory(**kwargs).start()
+        started.append(fake)
+        return fake
+
+    yield start
+    for fake in started:
+        fake.stop()
+
+
+@pytest.fixture
+def run_in_background():
+    """Run a decorated function's poll loop on a daemon thread; its processor is stopped afterwards"""
+    wrapped_functions = []
+
+    def run(wrapped):
+        def target():
+            try:
+                wrapped()
+            except Exception:
+                pass
+
+        wrapped_functions.append(wrapped)
+        threading.Thread(target=target, daemon=True).start()
+
+    yield run
+    for wrapped in wrapped_functions:
+        # The async decorators stop themselves once polls fail for max_failure_duration
+        processor = getattr(wrapped, "processor", None)
+        if processor is not None:
+            processor.stop_processing(0)
+
+
+def wait_until(condition, timeout: float = 10.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+
+from guardrails_simlab_client import JudgeResult
+from guardrails_simlab_client.testing.fake_control_plane import FakeControlPlane
+
+from conftest import POLL_OPTIONS, wait_until
+
+pytest.importorskip("httpx")
+
+
+class EmptyConversations(FakeControlPlane):
+    def _dispatch(self, method, route, params, query, body):
+        if route == "conversations":
+            return 200, []
+        return super()._dispatch(method, route, params, query, body)
+
+
+def test_async_judge_releases_tests_it_could_not_enqueue(control_plane, run_in_background):
+    from guardrails_simlab_client import custom_judge_async
+
+    fake = control_plane(EmptyConversations, tests_per_experiment=2, risks=["toxicity"], answered=True)
+
+    @custom_judge_async(risk_name="toxicity", control_plane_host=fake.url, **POLL_OPTIONS)
+    async def judge(user_message, bot_response, messages):
+        return JudgeResult(triggered=False, justification="ok")
+
+    run_in_background(lambda: asyncio.run(judge()))
+    # Released tests are fetched again by later polls instead of waiting out the dedup TTL
+    assert wait_until(lambda: fake.requests[("GET", "conversations")] > 2, timeout=5)
+
+
+def test_async_judge_evaluates_every_experiment(control_plane, run_in_background):
+    from guardrails_simlab_client import custom_judge_async
+
+    fake = control_plane(experiments=3, tests_per_experiment=5, turns=2, risks=["toxicity"], answered=True)
+
+    @custom_judge_async(risk_name="toxicity", control_plane_host=fake.url, **POLL_OPTIONS)
+    async def judge(user_message, bot_response, messages):
+        await asyncio.sleep(0.01)
+        return JudgeResult(triggered=False, justification=f"{bot_response} is fine")
+
+    run_in_background(lambda: asyncio.run(judge()))
+    assert fake.wait_for(evaluated=30, timeout=20)
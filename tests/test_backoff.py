@@ -0,0 +1,48 @@
+import time
+
+from guardrails_simlab_client import custom_judge, simlab_connect
+from guardrails_simlab_client.polling import PollScheduler
+
+from conftest import POLL_OPTIONS
+
+
+def test_poll_interval_doubles_while_idle_and_resets_on_work():
+    scheduler = PollScheduler(min_interval=1, max_interval=4)
+    intervals = []
+    for _ in range(4):
+        scheduler.record_empty()
+        intervals.append(scheduler.current_interval)
+    assert intervals == [1, 2, 4, 4]
+    assert 2 <= scheduler.next_delay() <= 4
+    scheduler.record_work()
+    assert scheduler.next_delay() == 0
+
+
+def test_failing_tests_are_retried_with_backoff(control_plane, run_in_background):
+    fake = control_plane(tests_per_experiment=3)
+    calls = []
+
+    @simlab_connect(control_plane_host=fake.url, max_workers=4, **POLL_OPTIONS)
+    def application(messages):
+        calls.append(time.monotonic())
+        raise RuntimeError("model unavailable")
+
+    run_in_background(application)
+    time.sleep(2)
+    # Each test is retried after 1s, then 2s; without backoff this is hundreds of calls
+    assert 3 <= len(calls) <= 9
+    assert application.poll_scheduler.current_interval > 0
+
+
+def test_failing_judge_is_retried_with_backoff(control_plane, run_in_background):
+    fake = control_plane(tests_per_experiment=3, risks=["toxicity"], answered=True)
+    calls = []
+
+    @custom_judge(risk_name="toxicity", control_plane_host=fake.url, max_workers=4, **POLL_OPTIONS)
+    def judge(user_message, bot_response, messages):
+        calls.append(time.monotonic())
+        raise RuntimeError("judge unavailable")
+
+    run_in_background(judge)
+    time.sleep(2)
+    assert 3 <= len(calls) <= 9
@@ -0,0 +1,47 @@
+from guardrails_simlab_client import simlab_connect
+
+from conftest import POLL_OPTIONS, wait_until
+
+
+def test_batched_application_answers_every_test(control_plane, run_in_background):
+    fake = control_plane(tests_per_experiment=20)
+    batch_sizes = []
+
+    @simlab_connect(control_plane_host=fake.url, batch_size=8, max_workers=2, **POLL_OPTIONS)
+    def application(histories):
+        batch_sizes.append(len(histories))
+        return [f"Answer to {history[-1]['content']}" for history in histories]
+
+    run_in_background(application)
+    assert fake.wait_for(answered=20, timeout=20)
+    assert max(batch_sizes) > 1
+    assert all(size <= 8 for size in batch_sizes)
+
+
+def test_a_failed_batch_item_only_fails_its_own_test(control_plane, run_in_background):
+    fake = control_plane(tests_per_experiment=4)
+
+    @simlab_connect(control_plane_host=fake.url, batch_size=4, **POLL_OPTIONS)
+    def application(histories):
+        return [
+            ValueError("bad input") if history[-1]["content"] == "Prompt 0.0" else "ok"
+            for history in histories
+        ]
+
+    run_in_background(application)
+    assert fake.wait_for(answered=3, timeout=10)
+    assert fake.tests["experiment-0-0-0"]["response"] is None
+
+
+def test_batched_connection_test_failure_is_reported(control_plane, run_in_background):
+    fake = control_plane(experiments=0, connection_tests=1)
+
+    @simlab_connect(control_plane_host=fake.url, batch_size=2, **POLL_OPTIONS)
+    def application(histories):
+        return [ValueError("bad input") for _ in histories]
+
+    run_in_background(application)
+    connection_test = fake.connection_tests["connection-test-0"]
+    assert wait_until(lambda: connection_test["status"] != "pending")
+    assert connection_test["status"] == "failed"
+    assert "bad input" in connection_test["error"]
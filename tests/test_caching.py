@@ -0,0 +1,136 @@
+import os
+from pathlib import Path
+import subprocess
+import sys
+import textwrap
+import threading
+import time
+
+from guardrails_simlab_client import JudgeResult, custom_judge, simlab_connect
+from guardrails_simlab_client.caching import JudgeResultCache, ResponseCache, judge_version
+
+from conftest import POLL_OPTIONS
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = ResponseCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+
+
+def test_entries_expire_after_ttl():
+    cache = ResponseCache(ttl=0.05)
+    cache.put("a", 1)
+    assert cache.get("a") == 1
+    time.sleep(0.1)
+    assert cache.get("a") is None
+
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    path = str(tmp_path / "cache.db")
+    ResponseCache(path=path).put("a", {"response": "hello"})
+    restarted = ResponseCache(path=path)
+    assert restarted.get_or_compute("a", lambda: None) == {"response": "hello"}
+    assert restarted.hits == 1
+
+
+def test_concurrent_misses_share_one_call():
+    cache = ResponseCache()
+    calls = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "value"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute("a", compute))) for _ in range(4)]
+    threads[0].start()
+    assert started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    while cache.coalesced < 3:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert results == ["value"] * 4
+    assert len(calls) == 1
+
+
+def test_identical_conversations_are_answered_once(control_plane, run_in_background):
+    # Every experiment of the fake holds the same prompts
+    fake = control_plane(experiments=3, tests_per_experiment=5)
+    cache = ResponseCache()
+    calls = []
+
+    @simlab_connect(control_plane_host=fake.url, response_cache=cache, **POLL_OPTIONS)
+    def application(messages):
+        calls.append(messages[-1]["content"])
+        return f"Answer to {messages[-1]['content']}"
+
+    run_in_background(application)
+    assert fake.wait_for(answered=15, timeout=20)
+    assert len(calls) == 5
+    assert all(test["response"] == f"Answer to {test['prompt']}" for test in fake.tests.values())
+
+
+def test_judge_version_changes_with_the_judge_code():
+    def judge(user_message, bot_response, messages):
+        return JudgeResult(triggered="bad" in bot_response, justification="")
+
+    def edited(user_message, bot_response, messages):
+        return JudgeResult(triggered="worse" in bot_response, justification="")
+
+    edited.__qualname__ = judge.__qualname__
+    assert judge_version(judge) == judge_version(judge)
+    assert judge_version(judge) != judge_version(edited)
+    assert JudgeResultCache(version="v2").version_for(judge) == "v2"
+
+
+def test_judge_version_is_the_same_under_any_hash_seed():
+    script = textwrap.dedent(
+        """
+        from guardrails_simlab_client.caching import judge_version
+
+        def judge(user_message, bot_response, messages):
+            flagged = lambda text: text in {"spam", "scam", ("nested", frozenset({"a", "b", "c"}))}
+            return user_message in {"hello", "hi", "hey"} or flagged(bot_response)
+
+        print(judge_version(judge))
+        """
+    )
+    versions = {
+        subprocess.run(
+            [sys.executable, "-c", script],
+            env=dict(os.environ, PYTHONPATH=str(REPO_ROOT), PYTHONHASHSEED=seed),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        for seed in ("1", "2", "3")
+    }
+    assert len(versions) == 1
+
+
+def test_identical_judge_inputs_are_evaluated_once(control_plane, run_in_background):
+    fake = control_plane(experiments=3, tests_per_experiment=5, risks=["toxicity"], answered=True)
+    calls = []
+
+    @custom_judge(risk_name="toxicity", control_plane_host=fake.url, judge_cache=JudgeResultCache(), **POLL_OPTIONS)
+    def judge(user_message, bot_response, messages):
+        calls.append(bot_response)
+        return JudgeResult(triggered=False, justification=f"{bot_response} is fine")
+
+    run_in_background(judge)
+    assert fake.wait_for(evaluated=15, timeout=20)
+    assert len(calls) == 5
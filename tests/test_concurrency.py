@@ -0,0 +1,41 @@
+from guardrails_simlab_client import Metrics
+from guardrails_simlab_client.concurrency import AdaptiveConcurrencyLimiter
+from guardrails_simlab_client.processors import test_processor
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+def test_limit_grows_on_healthy_calls_and_halves_on_rate_limits():
+    limiter = AdaptiveConcurrencyLimiter(min_limit=1, max_limit=8, initial_limit=4)
+    for _ in range(20):
+        limiter.record(0.1)
+    assert limiter.limit > 4
+    grown = limiter.limit
+    limiter.record(0.1, RateLimitError())
+    assert limiter.limit == grown // 2
+    # Other errors say nothing about capacity
+    limiter.record(0.1, ValueError("bad input"))
+    assert limiter.limit == grown // 2
+
+
+def test_limit_caps_calls_in_flight():
+    limiter = AdaptiveConcurrencyLimiter(min_limit=1, max_limit=2, initial_limit=2)
+    assert limiter.acquire(0)
+    assert limiter.acquire(0)
+    assert not limiter.acquire(0.01)
+    limiter.release()
+    assert limiter.acquire(0)
+
+
+def test_adaptive_concurrency_limit_is_exported():
+    metrics = Metrics()
+    processor = test_processor.TestProcessor(
+        "http://127.0.0.1:1", 8, adaptive_concurrency=True, min_workers=2, metrics=metrics
+    )
+    processor.start_processing(lambda messages: "ok")
+    try:
+        assert any(line.startswith("simlab_concurrency_limit") for line in metrics.render().splitlines())
+    finally:
+        processor.stop_processing(1)
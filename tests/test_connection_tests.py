@@ -0,0 +1,48 @@
+import threading
+import time
+
+from guardrails_simlab_client import simlab_connect
+from guardrails_simlab_client.testing.fake_control_plane import FakeControlPlane
+
+from conftest import POLL_OPTIONS, wait_until
+
+
+class FailingConnectionTestPatch(FakeControlPlane):
+    def _dispatch(self, method, route, params, query, body):
+        if route == "connection_test" and method == "PATCH":
+            return 500, {"message": "down"}
+        return super()._dispatch(method, route, params, query, body)
+
+
+def test_connection_tests_run_concurrently(control_plane, run_in_background):
+    fake = control_plane(experiments=0, connection_tests=4)
+    running = []
+    lock = threading.Lock()
+
+    @simlab_connect(control_plane_host=fake.url, **POLL_OPTIONS)
+    def application(messages):
+        with lock:
+            running.append(1)
+        time.sleep(0.3)
+        with lock:
+            running.pop()
+        return "ok"
+
+    run_in_background(application)
+    assert wait_until(lambda: len(running) > 1, timeout=5)
+    assert wait_until(lambda: all(test["status"] != "pending" for test in fake.connection_tests.values()))
+
+
+def test_connection_test_patch_failures_back_off(control_plane, run_in_background):
+    fake = control_plane(FailingConnectionTestPatch, experiments=0, connection_tests=1)
+    calls = []
+
+    @simlab_connect(control_plane_host=fake.url, **POLL_OPTIONS)
+    def application(messages):
+        calls.append(time.monotonic())
+        return "ok"
+
+    run_in_background(application)
+    time.sleep(2)
+    assert 1 <= len(calls) <= 3
+    assert application.poll_scheduler.current_interval > 0
@@ -0,0 +1,29 @@
+import time
+
+from guardrails_simlab_client.dedup import ExpiringDedupSet
+
+
+def test_failed_keys_come_back_after_a_doubling_delay():
+    queued = ExpiringDedupSet(retry_base_delay=0.1, retry_max_delay=0.3)
+    assert queued.add("test-1")
+    assert [queued.retry_later("test-1") for _ in range(4)] == [0.1, 0.2, 0.3, 0.3]
+    assert "test-1" in queued
+    assert not queued.add("test-1")
+    time.sleep(0.35)
+    assert queued.add("test-1")
+
+
+def test_acknowledging_a_key_resets_its_backoff():
+    queued = ExpiringDedupSet(retry_base_delay=0.1, ack_ttl=0)
+    queued.add("test-1")
+    queued.retry_later("test-1")
+    queued.retry_later("test-1")
+    queued.acknowledge("test-1")
+    assert queued.retry_later("test-1") == 0.1
+
+
+def test_released_keys_can_be_queued_again_at_once():
+    queued = ExpiringDedupSet()
+    queued.add("test-1")
+    queued.release("test-1")
+    assert queued.add("test-1")
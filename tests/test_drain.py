@@ -0,0 +1,149 @@
+import os
+from pathlib import Path
+import subprocess
+import sys
+import textwrap
+import threading
+import time
+
+import pytest
+
+from guardrails_simlab_client import JudgeResult, custom_judge, simlab_connect
+from guardrails_simlab_client.testing.fake_control_plane import FakeControlPlane
+
+from conftest import POLL_OPTIONS, wait_until
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_stop_processing_gives_up_on_hung_calls_at_the_deadline(control_plane, run_in_background):
+    fake = control_plane(tests_per_experiment=4)
+    started = threading.Event()
+    release = threading.Event()
+
+    @simlab_connect(control_plane_host=fake.url, max_workers=2, **POLL_OPTIONS)
+    def application(messages):
+        started.set()
+        release.wait(30)
+        return "ok"
+
+    run_in_background(application)
+    assert started.wait(10)
+    try:
+        stopping = time.monotonic()
+        assert application.processor.stop_processing(0.5) is False
+        assert time.monotonic() - stopping < 3
+    finally:
+        release.set()
+
+
+def test_stop_processing_waits_for_calls_that_finish_in_time(control_plane, run_in_background):
+    fake = control_plane(tests_per_experiment=2)
+
+    @simlab_connect(control_plane_host=fake.url, max_workers=2, **POLL_OPTIONS)
+    def application(messages):
+        time.sleep(0.2)
+        return "ok"
+
+    run_in_background(application)
+    assert wait_until(lambda: application.processor._in_flight)
+    assert application.processor.stop_processing(5) is True
+
+
+def test_queued_tests_are_released_without_a_retry_delay(control_plane, run_in_background):
+    fake = control_plane(tests_per_experiment=4)
+    started = threading.Event()
+    release = threading.Event()
+
+    @simlab_connect(control_plane_host=fake.url, max_workers=1, **POLL_OPTIONS)
+    def application(messages):
+        started.set()
+        release.wait(30)
+        return "ok"
+
+    run_in_background(application)
+    assert started.wait(10)
+    processor = application.processor
+    assert wait_until(lambda: processor._in_flight and processor.processing_queue.qsize() > 0)
+    (items,) = processor._in_flight.values()
+    running = processor._lease_key(items[0])[1]
+    # Keep the poll loop from queueing the released tests again
+    fake.stop()
+    try:
+        assert processor.stop_processing(0.2) is False
+    finally:
+        release.set()
+    # The hung test is held back; the ones that never started can be polled again at once
+    assert not processor.queued_tests.add(running)
+    assert all(processor.queued_tests.add(test_id) for test_id in fake.tests if test_id != running)
+
+
+class HungEvaluations(FakeControlPlane):
+    """Individual evaluation POSTs never answer until ``release`` is set"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.posted = threading.Event()
+        self.release = threading.Event()
+
+    def handle(self, method, path, query, body, headers=None):
+        if method == "POST" and path.endswith("/evaluations"):
+            self.posted.set()
+            self.release.wait(30)
+        return super().handle(method, path, query, body, headers)
+
+    def stop(self):
+        self.release.set()
+        super().stop()
+
+
+def test_stop_processing_does_not_wait_for_a_hung_submission(control_plane, run_in_background):
+    fake = control_plane(HungEvaluations, tests_per_experiment=1, answered=True, bulk_evaluations=False)
+
+    @custom_judge(risk_name="toxicity", control_plane_host=fake.url, **POLL_OPTIONS)
+    def judge(user_message, bot_response, messages):
+        return JudgeResult(triggered=False, justification="ok")
+
+    run_in_background(judge)
+    assert fake.posted.wait(10)
+    stopping = time.monotonic()
+    judge.processor.stop_processing(0.5)
+    assert time.monotonic() - stopping < 3
+
+
+def _run_until_sigterm(script: str) -> subprocess.CompletedProcess:
+    env = dict(os.environ, PYTHONPATH=str(REPO_ROOT))
+    return subprocess.run(
+        [sys.executable, "-c", textwrap.dedent(script)],
+        env=env,
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        timeout=20,
+    )
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_sigterm_exits_even_when_a_judge_hangs(executor):
+    started = time.monotonic()
+    completed = _run_until_sigterm(
+        f"""
+        import os, signal, threading, time
+        from guardrails_simlab_client import custom_judge
+        from guardrails_simlab_client.testing.fake_control_plane import FakeControlPlane
+
+        def hung(user_message, bot_response, messages):
+            time.sleep(100)
+
+        if __name__ == "__main__":
+            fake = FakeControlPlane(tests_per_experiment=2, risks=["toxicity"], answered=True).start()
+            judge = custom_judge(
+                risk_name="toxicity", control_plane_host=fake.url, executor={executor!r},
+                processes=1, min_poll_interval=0.05, drain_timeout=1,
+            )(hung)
+            threading.Timer(1.0, os.kill, (os.getpid(), signal.SIGTERM)).start()
+            judge()
+        """
+    )
+    # The drain gives up after drain_timeout instead of joining the hung call
+    assert time.monotonic() - started < 15, completed.stderr
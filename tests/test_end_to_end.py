@@ -0,0 +1,34 @@
+import pytest
+
+from guardrails_simlab_client import JudgeResult, custom_judge, simlab_connect
+
+from conftest import POLL_OPTIONS
+
+
+@pytest.mark.parametrize("options", [{}, {"error_rate": 0.05, "seed": 1}])
+def test_simlab_connect_answers_every_turn(control_plane, run_in_background, options):
+    fake = control_plane(experiments=2, tests_per_experiment=10, turns=3, **options)
+
+    @simlab_connect(control_plane_host=fake.url, max_workers=4, **POLL_OPTIONS)
+    def application(messages):
+        # Every turn sees the conversation so far, ending with its own prompt
+        assert messages[-1]["role"] == "user"
+        assert len(messages) % 2 == 1
+        return f"Answer to {messages[-1]['content']}"
+
+    run_in_background(application)
+    assert fake.wait_for(answered=60, timeout=20)
+    assert all(test["response"] for test in fake.tests.values())
+
+
+@pytest.mark.parametrize("options", [{}, {"bulk_evaluations": False}])
+def test_custom_judge_evaluates_every_test(control_plane, run_in_background, options):
+    fake = control_plane(experiments=2, tests_per_experiment=10, risks=["toxicity"], answered=True, **options)
+
+    @custom_judge(risk_name="toxicity", control_plane_host=fake.url, max_workers=4, **POLL_OPTIONS)
+    def judge(user_message, bot_response, messages):
+        return JudgeResult(triggered=False, justification=f"{bot_response} is fine")
+
+    run_in_background(judge)
+    assert fake.wait_for(evaluated=20, timeout=20)
+    assert {evaluation["test_id"] for evaluation in fake.evaluations} == set(fake.tests)
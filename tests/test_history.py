@@ -0,0 +1,96 @@
+import pytest
+
+from guardrails_simlab_client.history import ConversationHistoryResolver
+from guardrails_simlab_client.http_client import ControlPlaneClient
+from guardrails_simlab_client.testing.fake_control_plane import FakeControlPlane
+
+
+class MissingConversation(FakeControlPlane):
+    """Conversations work, except for one test that was deleted"""
+
+    def _dispatch(self, method, route, params, query, body):
+        if route == "conversations" and params["test_id"] == "experiment-0-1-2":
+            return 404, {"message": "Not found"}
+        return super()._dispatch(method, route, params, query, body)
+
+
+class ConversationsNotAllowed(FakeControlPlane):
+    def _dispatch(self, method, route, params, query, body):
+        if route == "conversations":
+            return 405, {"message": "Method not allowed"}
+        return super()._dispatch(method, route, params, query, body)
+
+
+def pending(fake, test_id):
+    """A test whose ancestors are answered but which has no response yet"""
+    test = fake.tests[test_id]
+    test["response"] = None
+    return test
+
+
+@pytest.fixture
+def client(control_plane):
+    clients = []
+
+    def connect(fake):
+        clients.append(ControlPlaneClient(fake.url))
+        return clients[-1]
+
+    yield connect
+    for http_client in clients:
+        http_client.close()
+
+
+def test_history_comes_from_the_conversations_endpoint(control_plane, client):
+    fake = control_plane(tests_per_experiment=2, turns=3, answered=True)
+    resolver = ConversationHistoryResolver()
+    test = pending(fake, "experiment-0-0-2")
+    assert resolver.resolve(client(fake), test) == fake._messages(test["id"])
+    assert resolver.conversations.supported is True
+    assert fake.requests[("GET", "test")] == 0
+
+
+def test_a_missing_conversation_only_falls_back_for_that_test(control_plane, client):
+    fake = control_plane(MissingConversation, tests_per_experiment=3, turns=3, answered=True)
+    resolver = ConversationHistoryResolver()
+    http_client = client(fake)
+    for test_id in ["experiment-0-0-2", "experiment-0-1-2", "experiment-0-2-2"]:
+        assert resolver.resolve(http_client, pending(fake, test_id)) == fake._messages(test_id)
+    assert resolver.conversations.supported is True
+    # Only the deleted test walked its parents
+    assert fake.requests[("GET", "test")] == 2
+    assert fake.requests[("GET", "conversations")] == 3
+
+
+def test_repeated_404s_switch_to_the_parent_walk(control_plane, client):
+    fake = control_plane(tests_per_experiment=5, turns=2, answered=True, conversations=False)
+    resolver = ConversationHistoryResolver()
+    http_client = client(fake)
+    for conversation in range(5):
+        test_id = f"experiment-0-{conversation}-1"
+        assert resolver.resolve(http_client, pending(fake, test_id)) == fake._messages(test_id)
+    assert resolver.conversations.supported is False
+    assert fake.requests[("GET", "conversations")] == resolver.conversations.not_found_limit
+
+
+def test_405_switches_to_the_parent_walk_at_once(control_plane, client):
+    fake = control_plane(ConversationsNotAllowed, tests_per_experiment=2, turns=2, answered=True)
+    resolver = ConversationHistoryResolver()
+    http_client = client(fake)
+    for test_id in ["experiment-0-0-1", "experiment-0-1-1"]:
+        assert resolver.resolve(http_client, pending(fake, test_id)) == fake._messages(test_id)
+    assert resolver.conversations.supported is False
+    assert fake.requests[("GET", "conversations")] == 1
+
+
+def test_parent_walk_reuses_cached_ancestors(control_plane, client):
+    fake = control_plane(tests_per_experiment=1, turns=4, answered=True, conversations=False)
+    resolver = ConversationHistoryResolver()
+    resolver.conversations.supported = False
+    http_client = client(fake)
+    for turn in range(1, 4):
+        test_id = f"experiment-0-0-{turn}"
+        assert resolver.resolve(http_client, pending(fake, test_id)) == fake._messages(test_id)
+        fake.tests[test_id]["response"] = f"Response 0.{turn}"
+    # Each turn fetched only its new parent instead of the whole chain
+    assert fake.requests[("GET", "test")] == 3
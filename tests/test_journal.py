@@ -0,0 +1,66 @@
+from guardrails_simlab_client import simlab_connect
+from guardrails_simlab_client.journal import CLAIMED, COMPLETED, SUBMITTED, Journal
+from guardrails_simlab_client.testing.fake_control_plane import FakeControlPlane
+
+from conftest import POLL_OPTIONS, wait_until
+
+
+class RejectedAnswers(FakeControlPlane):
+    """Answers are refused until accept_answers is set, as if the pod died before submitting"""
+
+    accept_answers = False
+
+    def _dispatch(self, method, route, params, query, body):
+        if route == "test" and method == "PUT" and not self.accept_answers:
+            return 503, {"message": "unavailable"}
+        return super()._dispatch(method, route, params, query, body)
+
+
+def test_entries_survive_reopening_the_journal(tmp_path):
+    path = str(tmp_path / "journal.db")
+    journal = Journal(path)
+    journal.claimed("experiment-0", "test-0", "response")
+    journal.claimed("experiment-0", "test-1", "response")
+    journal.completed("experiment-0", "test-1", "response", {"id": "test-1"}, "answer")
+    journal.claimed("experiment-0", "test-2", "response")
+    journal.completed("experiment-0", "test-2", "response", {"id": "test-2"}, "answer")
+    journal.submitted("experiment-0", "test-2", "response")
+    journal.close()
+
+    journal = Journal(path)
+    assert journal.get("response", "test-0").state == CLAIMED
+    assert journal.get("response", "test-2").state == SUBMITTED
+    (pending,) = journal.pending("response")
+    assert (pending.test_id, pending.state, pending.item, pending.result) == ("test-1", COMPLETED, {"id": "test-1"}, "answer")
+    assert list(journal.pending("toxicity")) == []
+    # Releasing keeps a stored result for resubmission
+    journal.released("experiment-0", "test-0", "response")
+    journal.released("experiment-0", "test-1", "response")
+    assert journal.get("response", "test-0") is None
+    assert journal.get("response", "test-1").result == "answer"
+    journal.close()
+
+
+def test_results_are_resubmitted_after_a_restart_without_calling_fn_again(control_plane, run_in_background, tmp_path):
+    fake = control_plane(RejectedAnswers, tests_per_experiment=3)
+    path = str(tmp_path / "journal.db")
+    calls = []
+
+    @simlab_connect(control_plane_host=fake.url, journal=Journal(path), **POLL_OPTIONS)
+    def application(messages):
+        calls.append(messages[-1]["content"])
+        return f"Answer to {messages[-1]['content']}"
+
+    run_in_background(application)
+    assert wait_until(lambda: len(set(calls)) == 3)
+    application.processor.stop_processing(0)
+
+    fake.accept_answers = True
+
+    @simlab_connect(control_plane_host=fake.url, journal=Journal(path), **POLL_OPTIONS)
+    def restarted(messages):
+        raise AssertionError("answered tests are not sent to fn again")
+
+    run_in_background(restarted)
+    assert fake.wait_for(answered=3, timeout=10)
+    assert {test["response"] for test in fake.tests.values()} == {f"Answer to {prompt}" for prompt in set(calls)}
@@ -0,0 +1,64 @@
+import threading
+
+import pytest
+
+from guardrails_simlab_client import JudgeResult, JudgeRunner
+
+from conftest import POLL_OPTIONS
+
+
+def runner_for(fake, **kwargs) -> JudgeRunner:
+    return JudgeRunner(control_plane_host=fake.url, max_workers=4, **POLL_OPTIONS, **kwargs)
+
+
+def test_each_test_is_fanned_out_to_every_judge(control_plane, run_in_background):
+    fake = control_plane(experiments=2, tests_per_experiment=5, risks=["toxicity", "pii"], answered=True)
+    runner = runner_for(fake)
+    calls = {"toxicity": [], "pii": []}
+    lock = threading.Lock()
+
+    for risk_name in calls:
+        def judge(user_message, bot_response, messages, risk_name=risk_name):
+            with lock:
+                calls[risk_name].append(bot_response)
+            return JudgeResult(triggered=False, justification=f"{risk_name} ok")
+
+        runner.judge(risk_name=risk_name)(judge)
+
+    run_in_background(runner.run)
+    assert fake.wait_for(evaluated=20, timeout=20)
+    assert {(e["test_id"], e["risk_type"]) for e in fake.evaluations} == {
+        (test_id, risk_name) for test_id in fake.tests for risk_name in calls
+    }
+    assert len(calls["toxicity"]) == len(calls["pii"]) == 10
+    # One conversation fetch per test however many judges evaluate it
+    assert fake.requests[("GET", "conversations")] == 10
+
+
+def test_judges_only_see_experiments_configured_for_their_risk(control_plane, run_in_background):
+    fake = control_plane(experiments=0, risks=["toxicity"])
+    fake.add_experiment(3, answered=True)
+    fake.risks = ["toxicity", "pii"]
+    fake.add_experiment(3, answered=True)
+    runner = runner_for(fake)
+    for risk_name in ("toxicity", "pii"):
+        runner.judge(risk_name=risk_name)(lambda user_message, bot_response, messages: JudgeResult(False, "ok"))
+
+    run_in_background(runner.run)
+    assert fake.wait_for(evaluated=9, timeout=20)
+    pii_experiments = {e["experiment_id"] for e in fake.evaluations if e["risk_type"] == "pii"}
+    assert pii_experiments == {"experiment-1"}
+
+
+def test_judges_share_one_submission_pipeline(control_plane):
+    fake = control_plane()
+    runner = runner_for(fake, submit_workers=2)
+    for risk_name in ("toxicity", "pii", "bias"):
+        runner.judge(risk_name=risk_name)(lambda user_message, bot_response, messages: JudgeResult(False, "ok"))
+    processors = [processor for processor, _ in runner.judges.values()]
+    assert all(processor.submission_pipeline is runner.submission_pipeline for processor in processors)
+    assert all(processor._submit_executor is runner.submit_executor for processor in processors)
+    assert all(processor.http_client is runner.http_client for processor in processors)
+    with pytest.raises(ValueError):
+        runner.judge(risk_name="pii")
+    runner.stop(0)
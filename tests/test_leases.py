@@ -0,0 +1,132 @@
+import threading
+import time
+
+import pytest
+
+from guardrails_simlab_client import simlab_connect
+from guardrails_simlab_client.http_client import ControlPlaneClient
+from guardrails_simlab_client.leases import ConsistentHashSharding, ServerLeaseBackend, SQLiteLeaseBackend
+from guardrails_simlab_client.testing.fake_control_plane import FakeControlPlane
+
+from conftest import POLL_OPTIONS
+
+
+class FailingClaims(FakeControlPlane):
+    def _dispatch(self, method, route, params, query, body):
+        if route == "claim":
+            return 500, {"message": "down"}
+        return super()._dispatch(method, route, params, query, body)
+
+
+class ClaimsNotAllowed(FakeControlPlane):
+    def _dispatch(self, method, route, params, query, body):
+        if route == "claim":
+            return 405, {"message": "Method not allowed"}
+        return super()._dispatch(method, route, params, query, body)
+
+
+@pytest.fixture
+def server_backend(control_plane):
+    clients = []
+
+    def bind(fake, owner, fallback=None):
+        clients.append(ControlPlaneClient(fake.url))
+        backend = ServerLeaseBackend(owner=owner, fallback=fallback)
+        backend.bind(clients[-1], "app")
+        return backend
+
+    yield bind
+    for http_client in clients:
+        http_client.close()
+
+
+def test_server_claims_are_exclusive_until_released(control_plane, server_backend):
+    fake = control_plane(claims=True)
+    first = server_backend(fake, "first")
+    second = server_backend(fake, "second")
+    assert first.claim("experiment-0", "experiment-0-0-0", "response")
+    assert not second.claim("experiment-0", "experiment-0-0-0", "response")
+    # Scopes are claimed independently
+    assert second.claim("experiment-0", "experiment-0-0-0", "toxicity")
+    first.release("experiment-0", "experiment-0-0-0", "response")
+    assert second.claim("experiment-0", "experiment-0-0-0", "response")
+
+
+def test_server_claims_fall_back_when_unsupported(control_plane, server_backend, tmp_path):
+    fake = control_plane(ClaimsNotAllowed)
+    fallback = SQLiteLeaseBackend(str(tmp_path / "leases.db"), owner="first")
+    backend = server_backend(fake, "first", fallback)
+    assert backend.claim("experiment-0", "experiment-0-0-0", "response")
+    assert backend.claims.supported is False
+    assert not SQLiteLeaseBackend(str(tmp_path / "leases.db"), owner="second").claim(
+        "experiment-0", "experiment-0-0-0", "response"
+    )
+    assert fake.requests[("POST", "claim")] == 1
+
+
+def test_sqlite_leases_are_shared_and_expire(tmp_path):
+    path = str(tmp_path / "leases.db")
+    first = SQLiteLeaseBackend(path, lease_seconds=0.2, owner="first")
+    second = SQLiteLeaseBackend(path, lease_seconds=0.2, owner="second")
+    assert first.claim("experiment-0", "test-0", "response")
+    assert first.claim("experiment-0", "test-0", "response")
+    assert not second.claim("experiment-0", "test-0", "response")
+    first.release("experiment-0", "test-0", "response")
+    assert second.claim("experiment-0", "test-0", "response")
+    # An owner that disappears loses its lease once it expires
+    time.sleep(0.25)
+    assert first.claim("experiment-0", "test-0", "response")
+
+
+def test_consistent_hashing_gives_each_test_one_replica():
+    replicas = [ConsistentHashSharding(index, 3) for index in range(3)]
+    test_ids = [f"test-{index}" for index in range(300)]
+    owners = {test_id: [r.replica for r in replicas if r.claim("e", test_id, "response")] for test_id in test_ids}
+    assert all(len(claimed) == 1 for claimed in owners.values())
+    assert {claimed[0] for claimed in owners.values()} == {"0", "1", "2"}
+    # Dropping replica 2 only moves the tests it owned
+    remaining = ConsistentHashSharding("0", ["0", "1"])
+    for test_id, (owner,) in owners.items():
+        if owner != "2":
+            assert remaining.owner_of(test_id) == owner
+    with pytest.raises(ValueError):
+        ConsistentHashSharding("3", 3)
+
+
+def test_replicas_sharing_leases_answer_each_test_once(control_plane, run_in_background, tmp_path):
+    fake = control_plane(tests_per_experiment=30)
+    calls = []
+    lock = threading.Lock()
+
+    def replica(owner):
+        @simlab_connect(
+            control_plane_host=fake.url,
+            lease_backend=SQLiteLeaseBackend(str(tmp_path / "leases.db"), owner=owner),
+            **POLL_OPTIONS,
+        )
+        def application(messages):
+            with lock:
+                calls.append(messages[-1]["content"])
+            time.sleep(0.01)
+            return "ok"
+
+        return application
+
+    run_in_background(replica("first"))
+    run_in_background(replica("second"))
+    assert fake.wait_for(answered=30, timeout=20)
+    assert len(calls) == len(set(calls)) == 30
+
+
+def test_claim_failures_are_retried_with_backoff(control_plane, run_in_background):
+    fake = control_plane(FailingClaims, tests_per_experiment=3)
+
+    @simlab_connect(control_plane_host=fake.url, lease_backend=ServerLeaseBackend(), **POLL_OPTIONS)
+    def application(messages):
+        return "ok"
+
+    run_in_background(application)
+    time.sleep(2)
+    # Each test is retried after 1s, then 2s; without backoff this is over a hundred claims
+    assert 3 <= fake.requests[("POST", "claim")] <= 9
+    assert application.poll_scheduler.current_interval > 0
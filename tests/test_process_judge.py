@@ -0,0 +1,50 @@
+import os
+
+import pytest
+
+from guardrails_simlab_client import JudgeResult, custom_judge
+from guardrails_simlab_client.processors.process_judge import ProcessJudge
+
+from conftest import POLL_OPTIONS
+
+
+def crashing_judge(user_message, bot_response, messages):
+    if user_message == "crash":
+        os._exit(1)
+    return JudgeResult(triggered=False, justification="ok")
+
+
+def pid_judge(user_message, bot_response, messages):
+    return JudgeResult(triggered=False, justification=str(os.getpid()))
+
+
+def test_process_judge_runs_outside_this_process():
+    judge = ProcessJudge(pid_judge, processes=1)
+    try:
+        assert judge("hello", "hi", []).justification != str(os.getpid())
+    finally:
+        judge.close()
+    with pytest.raises(RuntimeError):
+        judge("hello", "hi", [])
+
+
+def test_process_judge_recovers_from_a_dead_worker():
+    judge = ProcessJudge(crashing_judge, processes=1)
+    try:
+        assert judge("hello", "hi", []).justification == "ok"
+        with pytest.raises(Exception):
+            judge("crash", "hi", [])
+        assert judge("hello", "hi", []).justification == "ok"
+    finally:
+        judge.close()
+
+
+def test_custom_judge_evaluates_in_worker_processes(control_plane, run_in_background):
+    fake = control_plane(tests_per_experiment=10, risks=["toxicity"], answered=True)
+    judge = custom_judge(
+        risk_name="toxicity", control_plane_host=fake.url, executor="process", processes=2, **POLL_OPTIONS
+    )(pid_judge)
+
+    run_in_background(judge)
+    assert fake.wait_for(evaluated=10, timeout=20)
+    assert str(os.getpid()) not in {evaluation["judge_response"] for evaluation in fake.evaluations}
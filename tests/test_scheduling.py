@@ -0,0 +1,71 @@
+from queue import Empty, Full
+
+import pytest
+
+from guardrails_simlab_client.scheduling import FairScheduler
+
+
+def queued(experiment_id, index, parent_test_id=None):
+    return {"id": f"{experiment_id}-{index}", "experiment_id": experiment_id, "parent_test_id": parent_test_id}
+
+
+def drain(scheduler):
+    items = []
+    while not scheduler.empty():
+        items.append(scheduler.get_nowait()["id"])
+    return items
+
+
+def test_experiments_are_served_round_robin():
+    scheduler = FairScheduler()
+    for index in range(3):
+        scheduler.put(queued("big", index))
+    scheduler.put(queued("small", 0))
+    assert drain(scheduler) == ["big-0", "small-0", "big-1", "big-2"]
+
+
+def test_weights_serve_several_items_per_turn():
+    scheduler = FairScheduler()
+    scheduler.set_weight("heavy", 2)
+    for index in range(4):
+        scheduler.put(queued("heavy", index))
+        scheduler.put(queued("light", index))
+    assert drain(scheduler) == [
+        "heavy-0", "heavy-1", "light-0", "heavy-2", "heavy-3", "light-1", "light-2", "light-3",
+    ]
+    with pytest.raises(ValueError):
+        scheduler.set_weight("heavy", 0)
+
+
+def test_follow_up_turns_are_served_first():
+    scheduler = FairScheduler()
+    scheduler.put(queued("a", 0))
+    scheduler.put(queued("b", 0))
+    scheduler.put(queued("b", 1, parent_test_id="b-0"))
+    assert drain(scheduler) == ["b-1", "a-0", "b-0"]
+
+
+def test_maxsize_bounds_all_experiments_together():
+    scheduler = FairScheduler(maxsize=2)
+    scheduler.put(queued("a", 0))
+    scheduler.put(queued("b", 0))
+    with pytest.raises(Full):
+        scheduler.put(queued("c", 0), timeout=0.01)
+    scheduler.get()
+    scheduler.put_nowait(queued("c", 0))
+    drain(scheduler)
+    with pytest.raises(Empty):
+        scheduler.get(timeout=0.01)
+
+
+def test_wait_stats_are_kept_per_experiment():
+    waits = []
+    scheduler = FairScheduler(on_wait=waits.append)
+    scheduler.put(queued("a", 0))
+    scheduler.put(queued("a", 1))
+    scheduler.put(queued("b", 0))
+    drain(scheduler)
+    stats = scheduler.wait_stats()
+    assert stats["a"].count == 2
+    assert stats["b"].count == 1
+    assert len(waits) == 3
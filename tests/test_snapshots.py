@@ -0,0 +1,76 @@
+import pytest
+import requests
+
+from guardrails_simlab_client.http_client import ControlPlaneClient, error_message
+from guardrails_simlab_client.protocols import HttpError
+from guardrails_simlab_client.snapshots import PollSnapshots
+
+TESTS_PATH = "/api/experiments/experiment-0/tests"
+
+
+def response(status_code, content):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = content
+    return response
+
+
+@pytest.fixture
+def client(control_plane):
+    clients = []
+
+    def connect(fake):
+        clients.append(ControlPlaneClient(fake.url))
+        return clients[-1]
+
+    yield connect
+    for http_client in clients:
+        http_client.close()
+
+
+def test_error_message_reads_json_and_html_bodies():
+    assert error_message(response(400, b'{"message": "Bad experiment"}')) == "Bad experiment"
+    assert error_message(response(500, b'{"detail": "Oops"}')) == '{"detail": "Oops"}'
+    assert error_message(response(502, b"<html>Bad gateway</html>")) == "<html>Bad gateway</html>"
+
+
+def test_non_json_error_body_raises_http_error():
+    class Client:
+        def get(self, path, headers=None):
+            return response(502, b"<html>Bad gateway</html>")
+
+    with pytest.raises(HttpError) as raised:
+        PollSnapshots().get_json(Client(), "/api/experiments")
+    assert raised.value.status_code == 502
+    assert "Bad gateway" in raised.value.message
+
+
+def test_unchanged_list_is_served_from_the_snapshot_on_a_304(control_plane, client):
+    fake = control_plane(tests_per_experiment=3)
+    snapshots = PollSnapshots()
+    http_client = client(fake)
+    first, changed = snapshots.get_json(http_client, TESTS_PATH)
+    assert changed and len(first) == 3
+    second, changed = snapshots.get_json(http_client, TESTS_PATH)
+    assert not changed
+    assert second is first
+    assert fake.not_modified == 1
+    assert snapshots.not_modified == 1
+
+
+def test_cursor_fetches_only_updated_tests_and_merges_them(control_plane, client):
+    fake = control_plane(tests_per_experiment=3, cursors=True)
+    snapshots = PollSnapshots()
+    http_client = client(fake)
+    tests, _ = snapshots.get_json(http_client, TESTS_PATH, merge_by="id")
+    assert all(test["response"] is None for test in tests)
+
+    http_client.put(f"{TESTS_PATH}/experiment-0-1-0", json_body={"response": "Answer"})
+    tests, changed = snapshots.get_json(http_client, TESTS_PATH, merge_by="id")
+    assert changed
+    assert snapshots.delta_requests == 1
+    assert [test["id"] for test in tests] == ["experiment-0-0-0", "experiment-0-1-0", "experiment-0-2-0"]
+    assert {test["id"]: test["response"] for test in tests}["experiment-0-1-0"] == "Answer"
+
+    _, changed = snapshots.get_json(http_client, TESTS_PATH, merge_by="id")
+    assert not changed
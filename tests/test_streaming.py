@@ -0,0 +1,84 @@
+import asyncio
+import logging
+import time
+
+from guardrails_simlab_client import simlab_connect
+from guardrails_simlab_client.streaming import collect
+
+from conftest import POLL_OPTIONS
+
+
+def test_stream_filling_the_limit_exactly_is_truncated_only_if_more_follows():
+    exact = collect(iter(["ab", "cd"]), time.monotonic(), max_chars=4)
+    assert exact.text == "abcd"
+    assert not exact.truncated
+
+    longer = collect(iter(["ab", "cd", "ef"]), time.monotonic(), max_chars=4)
+    assert longer.text == "abcd"
+    assert longer.truncated
+
+
+def test_async_streams_share_one_event_loop():
+    loops = []
+
+    async def chunks():
+        loops.append(asyncio.get_running_loop())
+        yield "hello"
+
+    for _ in range(3):
+        assert collect(chunks(), time.monotonic()).text == "hello"
+    assert len(set(map(id, loops))) == 1
+
+
+def test_slow_async_stream_is_cut_off_at_max_seconds():
+    closed = []
+
+    async def chunks():
+        try:
+            yield "first"
+            await asyncio.sleep(10)
+            yield "never"
+        finally:
+            closed.append(True)
+
+    started = time.monotonic()
+    generation = collect(chunks(), started, max_seconds=0.2)
+    assert generation.text == "first"
+    assert generation.truncated
+    assert generation.total_seconds < 2
+    assert closed
+
+
+def _logged_tests(caplog):
+    return {
+        record.getMessage().split(":")[0].removeprefix("Test ")
+        for record in caplog.records
+        if "first token after" in record.getMessage()
+    }
+
+
+def test_streamed_timings_are_logged_per_test(control_plane, run_in_background, caplog):
+    caplog.set_level(logging.DEBUG, logger="guardrails_simlab_client.processors.test_processor")
+    fake = control_plane(tests_per_experiment=3)
+
+    @simlab_connect(control_plane_host=fake.url, max_workers=2, **POLL_OPTIONS)
+    def application(messages):
+        yield "Answer to "
+        yield messages[-1]["content"]
+
+    run_in_background(application)
+    assert fake.wait_for(answered=3, timeout=10)
+    assert _logged_tests(caplog) == set(fake.tests)
+
+
+def test_batched_stream_timings_are_logged_per_test(control_plane, run_in_background, caplog):
+    caplog.set_level(logging.DEBUG, logger="guardrails_simlab_client.processors.test_processor")
+    fake = control_plane(tests_per_experiment=4)
+
+    @simlab_connect(control_plane_host=fake.url, max_workers=1, batch_size=4, **POLL_OPTIONS)
+    def application(histories):
+        return [iter(["Answer to ", messages[-1]["content"]]) for messages in histories]
+
+    run_in_background(application)
+    assert fake.wait_for(answered=4, timeout=10)
+    assert _logged_tests(caplog) == set(fake.tests)
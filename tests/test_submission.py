@@ -0,0 +1,99 @@
+import json
+import threading
+
+from guardrails_simlab_client.submission import SubmissionPipeline
+
+from conftest import wait_until
+
+
+class Recorder:
+    """send/on_success/on_failure for a pipeline, failing each item ``failures`` times first"""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.attempts = {}
+        self.batches = []
+        self.succeeded = []
+        self.failed = []
+        self.lock = threading.Lock()
+
+    def send(self, submissions):
+        errors = []
+        with self.lock:
+            self.batches.append(len(submissions))
+            for item, _ in submissions:
+                self.attempts[item] = self.attempts.get(item, 0) + 1
+                errors.append(RuntimeError("down") if self.attempts[item] <= self.failures else None)
+        return errors
+
+    def pipeline(self, **kwargs) -> SubmissionPipeline:
+        kwargs.setdefault("retry_base_delay", 0.01)
+        return SubmissionPipeline(self.send, self.succeeded.append, self.failed.append, **kwargs)
+
+
+def test_failed_submissions_are_retried():
+    recorder = Recorder(failures=2)
+    pipeline = recorder.pipeline(max_attempts=3)
+    pipeline.start()
+    pipeline.put("test-0", "answer")
+    assert pipeline.flush(5)
+    pipeline.close()
+    assert recorder.succeeded == ["test-0"]
+    assert pipeline.retries == 2
+
+
+def test_submissions_out_of_attempts_are_handed_back():
+    recorder = Recorder(failures=10)
+    pipeline = recorder.pipeline(max_attempts=2)
+    pipeline.start()
+    pipeline.put("test-0", "answer")
+    assert pipeline.flush(5)
+    pipeline.close()
+    assert recorder.failed == ["test-0"]
+    assert recorder.attempts["test-0"] == 2
+
+
+def test_ready_submissions_are_sent_in_batches():
+    recorder = Recorder()
+    pipeline = recorder.pipeline(workers=1, max_batch=3)
+    for index in range(7):
+        pipeline.put(f"test-{index}", "answer")
+    pipeline.start()
+    assert pipeline.flush(5)
+    pipeline.close()
+    assert recorder.batches == [3, 3, 1]
+    assert len(recorder.succeeded) == 7
+
+
+def test_failures_are_spilled_and_retried_by_the_next_run(tmp_path):
+    spill_path = str(tmp_path / "spill.jsonl")
+    failing = Recorder(failures=10)
+    pipeline = failing.pipeline(max_attempts=1, spill_path=spill_path)
+    pipeline.start()
+    pipeline.put("test-0", {"response": "answer"})
+    assert pipeline.flush(5)
+    pipeline.close()
+    assert failing.failed == []
+    with open(spill_path) as spill_file:
+        assert [json.loads(line) for line in spill_file] == [["test-0", {"response": "answer"}]]
+
+    healthy = Recorder()
+    restarted = healthy.pipeline(spill_path=spill_path)
+    restarted.start()
+    assert wait_until(lambda: healthy.succeeded == ["test-0"], timeout=5)
+    restarted.close()
+
+
+def test_full_pipeline_spills_instead_of_blocking(tmp_path):
+    spill_path = str(tmp_path / "spill.jsonl")
+    recorder = Recorder()
+    pipeline = recorder.pipeline(max_pending=1, spill_path=spill_path)
+    # Not started, so nothing drains the buffer
+    pipeline.put("test-0", "answer")
+    pipeline.put("test-1", "answer")
+    assert pipeline.spilled == 1
+    pipeline.start()
+    assert pipeline.flush(5)
+    pipeline.close()
+    # The spilled submission was picked up again on start
+    assert sorted(recorder.succeeded) == ["test-0", "test-1"]